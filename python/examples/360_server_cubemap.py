@@ -0,0 +1,95 @@
+import os
+from pathlib import Path
+
+from aiortc import MediaStreamTrack
+from av import VideoFrame
+from fastapi.responses import JSONResponse
+
+from xr_360_camera_streamer import configure_logging
+from xr_360_camera_streamer.sources import FFmpegFileSource
+from xr_360_camera_streamer.streaming import WebRTCServer
+from xr_360_camera_streamer.transforms import Equi2EAC, TransformPipeline
+
+# Params
+VIDEO_SOURCE = FFmpegFileSource
+# VIDEO_SOURCE = OpenCVFileSource
+
+# Size of each cube face. The 3x2 layout is 3 * FACE_SIZE wide and 2 * FACE_SIZE tall.
+FACE_SIZE = 640
+
+# LOG_LEVEL = "INFO"
+LOG_LEVEL = "DEBUG"
+
+# The packing is the same for every peer, so it is built once and shared.
+TRANSFORM = TransformPipeline([Equi2EAC(face_size=FACE_SIZE, layout="3x2")])
+
+
+# Define a video track that streams the full sphere as an equi-angular cubemap.
+# The headset reprojects it locally, so no head pose is needed on the server.
+class CubemapTrack(MediaStreamTrack):
+    kind = "video"
+
+    def __init__(self, source: VIDEO_SOURCE, transform: TransformPipeline):
+        super().__init__()
+        self.source = source
+        self.transform = transform
+        self._timestamp = 0
+
+    async def recv(self):
+        try:
+            equi_frame_rgb = next(self.source)
+        except StopIteration:
+            # Loop the video
+            print("Restarting video source...")
+            self.source.release()
+            self.source = VIDEO_SOURCE(self.source.filepath)
+            equi_frame_rgb = next(self.source)
+
+        cubemap_frame = self.transform.transform(equi_frame_rgb)
+
+        # Create a VideoFrame for aiortc
+        frame = VideoFrame.from_ndarray(cubemap_frame, format="rgb24")
+
+        # Set timestamp
+        time_base = 90000
+        frame.pts = self._timestamp
+        frame.time_base = time_base
+        self._timestamp += int(time_base / self.source.fps)
+
+        return frame
+
+
+# Factory for creating the video track
+def create_video_track():
+    # NOTE: Update this path to your 360 video file.
+    # The asset directory is expected to be at the root of the repository.
+    video_path = os.path.join(
+        Path(__file__).parents[2],
+        "xr-360-streamer-assets",
+        "videos",
+        "test_video.mp4",
+    )
+
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(
+            f"Video asset not found at {video_path}. "
+            "Please download the assets from the repository "
+            "and place them in `xr-360-streamer-assets` at the project root."
+        )
+
+    return CubemapTrack(VIDEO_SOURCE(video_path), TRANSFORM)
+
+
+# Start server
+if __name__ == "__main__":
+    # Configure logging
+    configure_logging(level=LOG_LEVEL)
+
+    server = WebRTCServer(video_track_factory=create_video_track)
+
+    # Describe the packing so the client can set up its reprojection.
+    @server.app.get("/layout")
+    async def read_layout():
+        return JSONResponse(content=TRANSFORM.transforms[0].layout_info())
+
+    server.run()
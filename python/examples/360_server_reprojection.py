@@ -1,9 +1,7 @@
 import asyncio
 import json
 import os
-import time
-import cProfile
-import pstats
+import threading
 from pathlib import Path
 
 import numpy as np
@@ -11,15 +9,72 @@ from aiortc import MediaStreamTrack
 from av import VideoFrame
 from fastapi.responses import FileResponse
 
-from xr_360_camera_streamer import configure_logging
-from xr_360_camera_streamer.sources import FFmpegFileSource, OpenCVFileSource
-from xr_360_camera_streamer.streaming import WebRTCServer
-from xr_360_camera_streamer.transforms import EquilibEqui2Pers
+from xr_360_camera_streamer import configure_logging, get_metrics
+from xr_360_camera_streamer.sources import (
+    FFmpegFileSource,
+    OpenCVFileSource,
+    OrientationTrack,
+    SharedSource,
+    get_source_pool,
+)
+from xr_360_camera_streamer.streaming import (
+    AdmissionController,
+    LatestValue,
+    PipelineSpec,
+    PoseBucketHub,
+    PoseBucketTrack,
+    WebRTCServer,
+)
+from xr_360_camera_streamer.transforms import (
+    EquilibEqui2Pers,
+    FoveationWarp,
+    TransformPipeline,
+    get_transform_registry,
+)
 
 # Params
 VIDEO_SOURCE = FFmpegFileSource
 # VIDEO_SOURCE = OpenCVFileSource
 
+# Foveated output: reproject at DISPLAY_SIZE, but encode and send the smaller
+# ENCODED_SIZE with more pixels in the centre. The client must undo the warp using
+# the parameters sent on the "foveation" data channel.
+FOVEATED = False
+# FOVEATED = True
+DISPLAY_SIZE = (1280, 720)
+ENCODED_SIZE = (854, 480)
+FOVEATION_STRENGTH = 0.5
+
+# Leveling/stabilization from a sidecar IMU track (CSV/JSON) or the GoPro GPMF
+# metadata embedded in the video itself (pass the video path). The correction is
+# folded into the reprojection, so it costs no extra sampling pass.
+ORIENTATION_TRACK = None
+# ORIENTATION_TRACK = "test_video.json"
+STABILIZATION = "level"  # "level" (keep heading) or "full"
+
+# Spectator mode: viewers whose head poses fall into the same angular bucket share
+# one decode and one rendered stream (at the bucket's centre pose, with the FOV of
+# `AppState`'s default), so server cost grows with the number of distinct views.
+POSE_BUCKETS = None
+# POSE_BUCKETS = PoseBuckets(yaw_step=10.0, pitch_step=10.0)
+
+# Decoders and transforms kept after a viewer leaves, for the next viewer with the same
+# video and FOV (so reconnects skip opening the file and building remap tables).
+POOL_SIZE = 2
+
+# Seconds a disconnected headset's session (video position, transform, pose) is kept, so
+# a client that reconnects after a Wi-Fi blip resumes it with the `session` it was given.
+SESSION_GRACE = 10.0
+
+# Admission control: each viewer's pipeline gets the first of PIPELINE_SPECS the server
+# has room for (by the cost model and the live CPU use), and viewers beyond that are
+# turned away, so the ones already watching keep their frame rate.
+PIPELINE_SPECS = [
+    PipelineSpec(*DISPLAY_SIZE, fps=30, reprojection=True),
+    PipelineSpec(854, 480, fps=30, reprojection=True),
+]
+ADMISSION = AdmissionController(capacity=400, max_cpu=0.85)
+
 # LOG_LEVEL = "INFO"
 LOG_LEVEL = "DEBUG"
 
@@ -31,6 +86,7 @@ class AppState:
         self.yaw = 0.0
         self.roll = 0.0
         self.fov_x = 90.0  # Horizontal FOV in degrees
+        self.unwarp_params = None  # Set when the output is foveated
 
     def __repr__(self):
         return (
@@ -45,23 +101,31 @@ class AppState:
 class ReprojectionTrack(MediaStreamTrack):
     kind = "video"
 
-    def __init__(self, state: AppState, source: VIDEO_SOURCE, transform: EquilibEqui2Pers):
+    def __init__(
+        self,
+        state: AppState,
+        source: VIDEO_SOURCE,
+        transform: TransformPipeline,
+        orientation: OrientationTrack | None = None,
+    ):
         super().__init__()
         self.state = state
         self.source = source
         self.transform = transform
+        self.orientation = orientation
         self._timestamp = 0
-        # Profiling attributes
-        self.profiler = cProfile.Profile()
-        self.frame_count = 0
-        self.profiled_frames = 300  # Number of frames to profile before printing stats
-        self.profile_output_dir = "profiles"
-        os.makedirs(self.profile_output_dir, exist_ok=True)
+        # Stage timings, served by the server at /metrics and /stats.
+        self.metrics = get_metrics()
 
-    async def recv(self):
-        self.profiler.enable()
+    def on_close(self):
+        # Called by the server when the viewer leaves. The transform is shared with
+        # other peers; just drop our reference.
+        get_transform_registry().release(self.transform)
+        get_source_pool().release(self.source)
 
-        equi_frame_rgb = next(self.source)  # ALT
+    async def recv(self):
+        with self.metrics.stage("decode"):
+            equi_frame_rgb = next(self.source)  # ALT
 
         # ORIG
         # try:
@@ -79,43 +143,27 @@ class ReprojectionTrack(MediaStreamTrack):
         rot = self.state.get_rot()
         # fov_x = self.state.fov_x
 
+        # Undo the camera's own motion at this frame's timestamp
+        time_base = 90000
+        world_rot = None
+        if self.orientation is not None:
+            world_rot = self.orientation.correction(self._timestamp / time_base, STABILIZATION)
+
         # # Apply the equirectangular-to-perspective transform
-        perspective_frame = self.transform.transform(frame=equi_frame_rgb, rot=rot)
+        with self.metrics.stage("transform"):
+            perspective_frame = self.transform.transform(
+                frame=equi_frame_rgb, rot=rot, world_rot=world_rot
+            )
         # perspective_frame = equi_frame_rgb  # DEBUG
 
         # Create a VideoFrame for aiortc
-        frame = VideoFrame.from_ndarray(perspective_frame, format="rgb24")
+        with self.metrics.stage("convert"):
+            frame = VideoFrame.from_ndarray(perspective_frame, format="rgb24")
 
         # Set timestamp
-        time_base = 90000
         frame.pts = self._timestamp
         frame.time_base = time_base
         self._timestamp += int(time_base / self.source.fps)
-
-        self.profiler.disable()
-        self.frame_count += 1
-
-        if self.frame_count >= self.profiled_frames:
-            timestamp_ns = time.time_ns()
-
-            # Save human-readable stats
-            stats_file = os.path.join(self.profile_output_dir, f"profile_stats_{timestamp_ns}.txt")
-            with open(stats_file, "w") as f:
-                sortby = pstats.SortKey.CUMULATIVE
-                ps = pstats.Stats(self.profiler, stream=f).sort_stats(sortby)
-                ps.print_stats(50)
-
-            # Save raw profile data for visualization tools
-            raw_profile_file = os.path.join(
-                self.profile_output_dir, f"profile_stats_{timestamp_ns}.prof"
-            )
-            self.profiler.dump_stats(raw_profile_file)
-
-            print(f"--- Profiling stats saved to {stats_file} and {raw_profile_file} ---")
-
-            self.frame_count = 0
-            self.profiler.clear()
-
         return frame
 
 
@@ -132,8 +180,26 @@ def on_control_message(message: str, state: AppState):
         print(f"Could not process control command: {e}")
 
 
-# Factory for creating the video track
-def create_video_track(state: AppState):
+# Data channel handler that tells the client how to undo the foveation warp.
+# The client sends any message (e.g. "get") and receives the parameters as JSON.
+def on_foveation_message(message: str, state: AppState, channel):
+    channel.send(json.dumps(state.unwarp_params or {"type": "uniform"}))
+
+
+# Builds the transform for a given FOV and output size. Peers with the same FOV and size
+# share one instance (and its remap tables) through the transform registry.
+def build_transform(fov_x: float, size: tuple[int, int] = DISPLAY_SIZE) -> TransformPipeline:
+    # NOTE: Wrapping the reprojection in a `TransformPipeline` samples it through a cached
+    #       `cv2.remap` table; append e.g. `Resize(...)` to fold scaling into the same pass.
+    width, height = size
+    stages = [EquilibEqui2Pers(output_width=width, output_height=height, fov_x=fov_x)]
+    if FOVEATED:
+        # Fused into the reprojection: only ENCODED_SIZE pixels are ever sampled.
+        stages.append(FoveationWarp(*ENCODED_SIZE, strength=FOVEATION_STRENGTH))
+    return TransformPipeline(stages)
+
+
+def get_video_path() -> str:
     # NOTE: Update this path to your 360 video file.
     # The asset directory is expected to be at the root of the repository.
     video_path = os.path.join(
@@ -149,27 +215,85 @@ def create_video_track(state: AppState):
             "Please download the assets from the repository "
             "and place them in `xr-360-streamer-assets` at the project root."
         )
+    return video_path
+
+
+def load_orientation(video_path: str) -> OrientationTrack | None:
+    if ORIENTATION_TRACK is None:
+        return None
+    return OrientationTrack.load(os.path.join(os.path.dirname(video_path), ORIENTATION_TRACK))
+
+
+# Shared by all peers in spectator mode; created with the first peer.
+pose_bucket_hub = None
+pose_bucket_hub_lock = threading.Lock()  # Track factories run in worker threads
+
+
+def get_pose_bucket_hub(state: AppState) -> PoseBucketHub:
+    global pose_bucket_hub
+    with pose_bucket_hub_lock:
+        if pose_bucket_hub is None:
+            video_path = get_video_path()
+            orientation = load_orientation(video_path)
+            frame_kwargs = None
+            if orientation is not None:
+
+                def frame_kwargs(t: float) -> dict:
+                    return {"world_rot": orientation.correction(t, STABILIZATION)}
+
+            pose_bucket_hub = PoseBucketHub(
+                SharedSource(VIDEO_SOURCE(video_path)),
+                build_transform(fov_x=state.fov_x),
+                POSE_BUCKETS,
+                frame_kwargs=frame_kwargs,
+            )
+    return pose_bucket_hub
+
+
+# Factory for creating the video track
+def create_video_track(state: AppState, spec: PipelineSpec | None = None):
+    # The output size admission control allowed for this viewer.
+    size = (spec.width, spec.height) if spec is not None else DISPLAY_SIZE
+
+    if FOVEATED:
+        width, height = size
+        warp = FoveationWarp(*ENCODED_SIZE, strength=FOVEATION_STRENGTH)
+        state.unwarp_params = warp.unwarp_params(display_width=width, display_height=height)
+
+    if POSE_BUCKETS is not None:
+        return PoseBucketTrack(get_pose_bucket_hub(state), state.get_rot)
 
     # Initialize the video source and transform
-    video_source = VIDEO_SOURCE(video_path)
-    video_transform = EquilibEqui2Pers(output_width=1280, output_height=720, fov_x=state.fov_x)
+    video_path = get_video_path()
+    video_source = get_source_pool().acquire(VIDEO_SOURCE, video_path)
+    video_transform = get_transform_registry().acquire(
+        build_transform, fov_x=state.fov_x, size=size
+    )
 
-    return ReprojectionTrack(state, video_source, video_transform)
+    return ReprojectionTrack(state, video_source, video_transform, load_orientation(video_path))
 
 
 # Start server
 if __name__ == "__main__":
     # Configure logging
     configure_logging(level=LOG_LEVEL)
+    get_source_pool().max_idle = POOL_SIZE
+    get_transform_registry().max_idle = POOL_SIZE
 
     data_handlers = {
         "control": on_control_message,
+        "foveation": on_foveation_message,
     }
 
     server = WebRTCServer(
         video_track_factory=create_video_track,
         datachannel_handlers=data_handlers,
         state_factory=AppState,
+        session_grace=SESSION_GRACE,
+        admission=ADMISSION,
+        pipeline_specs=PIPELINE_SPECS,
+        # Only the newest pose matters; older ones queued behind a slow frame are dropped.
+        datachannel_policies={"control": LatestValue(), "foveation": LatestValue()},
     )
 
     # Serve frontend HTML file
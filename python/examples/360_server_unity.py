@@ -1,7 +1,6 @@
 import argparse  # noqa: I001
 import json
 import os
-import struct
 import time
 from functools import partial
 from pathlib import Path
@@ -11,15 +10,22 @@ import numpy as np
 from aiortc import MediaStreamTrack
 from av import VideoFrame
 
-from xr_360_camera_streamer.sources import FFmpegFileSource, OpenCVFileSource
-from xr_360_camera_streamer.streaming import WebRTCServer
-from xr_360_camera_streamer.transforms import EquilibEqui2Pers
+from xr_360_camera_streamer.pose import (
+    PoseHistory,
+    PoseKind,
+    VisualizationSink,
+    convert_unity,
+    decode_pose,
+    unity_head_rotation,
+)
+from xr_360_camera_streamer.sources import FFmpegFileSource, OpenCVFileSource, get_source_pool
+from xr_360_camera_streamer.streaming import LatestValue, WebRTCServer
+from xr_360_camera_streamer.transforms import EquilibEqui2Pers, get_transform_registry
 
 from ovr_skeleton_utils import (
     FULL_BODY_SKELETON_CONNECTIONS,
     FullBodyBoneId,
     SkeletonType,
-    get_bone_label,
 )
 
 # Params
@@ -32,37 +38,31 @@ VISUALIZE = True
 # VISUALIZE = False
 
 VIZ_POINT_RADIUS = 0.01
+VIZ_RATE = 15.0  # Poses logged per second; rerun logs in a thread of its own
 
 # Coordinate system conversion for Unity data
 CONVERT_UNITY_COORDS = True
 
-
-def convert_unity_to_right_handed_z_up(
-    position: tuple[float, float, float],
-    rotation: tuple[float, float, float, float],
-) -> tuple[tuple[float, float, float], tuple[float, float, float, float]]:
-    """
-    Converts position and rotation from Unity's left-handed, Y-up coordinate system
-    to a right-handed, Z-up coordinate system (+X Forward, +Y Left, +Z Up).
-    """
-    # Position conversion: Unity (x,y,z) -> (z, -x, y)
-    new_position = (position[2], -position[0], position[1])
-
-    # Rotation quaternion conversion: Unity (qx,qy,qz,qw) -> (-qz, qx, -qy, qw)
-    qx, qy, qz, qw = rotation
-    new_rotation = (-qz, qx, -qy, qw)
-
-    return new_position, new_rotation
+# Pose samples kept per peer (about 2s of body tracking at 72Hz)
+POSE_HISTORY = 144
+# A pose this many seconds older than the last one is a client whose clock restarted
+POSE_CLOCK_RESET = 1.0
+BONE_IDS = np.arange(FullBodyBoneId.FullBody_End)
 
 
 # Define a state object for orientation
 class AppState:
-    def __init__(self, visualizer: Optional[Any] = None):
+    def __init__(self, visualizer: Optional[VisualizationSink] = None):
         self.pitch = 0.0
         self.yaw = 0.0
         self.roll = 0.0
         self.fov_x = 90.0  # Horizontal FOV in degrees
         self.visualizer = visualizer
+        # Recent poses, by capture time, as sent by the client (Unity's frame)
+        self.head = PoseHistory(capacity=POSE_HISTORY, reset_after=POSE_CLOCK_RESET)
+        self.body = PoseHistory(
+            capacity=POSE_HISTORY, bones=len(BONE_IDS), reset_after=POSE_CLOCK_RESET
+        )
 
     def __repr__(self):
         return (
@@ -73,69 +73,6 @@ class AppState:
         return {"pitch": self.pitch, "yaw": self.yaw, "roll": self.roll}
 
 
-# Define a simple data structure to hold the bone data
-class Bone:
-    def __init__(
-        self,
-        id: int,
-        position: tuple[float, float, float],
-        rotation: tuple[float, float, float, float],
-    ):
-        self.id = id
-        self.position = position
-        self.rotation = rotation
-
-    def __repr__(self):
-        return f"Bone(pos={self.position}, rot={self.rotation})"
-
-
-def deserialize_pose_data(data: bytes) -> list[Bone]:
-    """
-    Deserializes the binary pose data stream from the Unity client.
-
-    Args:
-        data: The raw byte string received from the data channel.
-
-    Returns:
-        A list of Bone objects.
-    """
-    bones = []
-    offset = 0
-
-    # The C# BinaryWriter is little-endian by default. The format string '<' specifies this.
-    # Format: 1 int (id) + 7 floats (pos/rot) = 8 values
-    # '<i' = little-endian integer (4 bytes)
-    # '<7f' = 7 little-endian floats (7 * 4 = 28 bytes)
-    # Total size per bone: 32 bytes
-
-    try:
-        # 1. Read the number of bones (an integer)
-        (bone_count,) = struct.unpack_from("<i", data, offset)
-        offset += 4
-
-        # 2. Loop for each bone to read its data
-        for _ in range(bone_count):
-            # Ensure there is enough data left in the buffer
-            if offset + 32 > len(data):
-                print("Error: Incomplete data buffer for a bone.")
-                break
-
-            # 3. Unpack 8 values: id, pos(x,y,z), rot(x,y,z,w)
-            bone_data = struct.unpack_from("<i7f", data, offset)
-            offset += 32
-
-            bone_id = bone_data[0]
-            position = (bone_data[1], bone_data[2], bone_data[3])
-            rotation = (bone_data[4], bone_data[5], bone_data[6], bone_data[7])
-
-            bones.append(Bone(bone_id, position, rotation))
-
-    except struct.error as e:
-        print(f"Error deserializing pose data: {e}")
-
-    return bones
-
-
 # Define a custom video track that applies reprojection
 class ReprojectionTrack(MediaStreamTrack):
     kind = "video"
@@ -147,6 +84,12 @@ class ReprojectionTrack(MediaStreamTrack):
         self.transform = transform
         self._timestamp = 0
 
+    def on_close(self):
+        # Called by the server when the peer leaves. The transform is shared with
+        # other peers; just drop our reference.
+        get_transform_registry().release(self.transform)
+        get_source_pool().release(self.source)
+
     async def recv(self):
         equi_frame_rgb = next(self.source)  # ALT
 
@@ -169,7 +112,21 @@ class ReprojectionTrack(MediaStreamTrack):
 
 
 # Data channel handler to update orientation state
-def on_camera_message(message: str, state: AppState):
+def on_camera_message(message: str | bytes, state: AppState):
+    if isinstance(message, bytes):
+        try:
+            pose = decode_pose(message)
+        except ValueError as e:
+            print(f"Could not process camera data: {e}")
+            return
+        # Out-of-order messages are older than the latest sample and not added (unless
+        # far older: see `POSE_CLOCK_RESET`).
+        if pose.kind is PoseKind.HEAD and state.head.add_message(pose):
+            rot = unity_head_rotation(pose)
+            state.pitch, state.yaw, state.roll = rot["pitch"], rot["yaw"], rot["roll"]
+            state.fov_x = pose.fov_x
+        return
+
     try:
         data = json.loads(message)
         # print(f"Received camera data: {data}")
@@ -184,44 +141,43 @@ def on_camera_message(message: str, state: AppState):
 def on_body_pose_message(message: bytes, state: AppState):
     try:
         if isinstance(message, bytes):
-            pose_data = deserialize_pose_data(message)
-            # print(f"Received {len(pose_data)} bones")
-
-            if CONVERT_UNITY_COORDS:
-                for bone in pose_data:
-                    bone.position, bone.rotation = convert_unity_to_right_handed_z_up(
-                        bone.position, bone.rotation
-                    )
-
-            # Log to rerun
-            if state.visualizer:
-                rr = state.visualizer
-                # Arbitrary timestamp for visualization timeline
-                rr.set_time_sequence("body_pose_timestamp", int(time.time() * 1000))
-
-                positions = []
-                keypoint_ids = []
-                for bone in pose_data:
-                    # NOTE: not all bones are being tracked, so we need to filter
-                    bone_label = get_bone_label(SkeletonType.FullBody, bone.id)
-                    if bone_label and "Unknown" not in bone_label:
-                        positions.append(bone.position)
-                        keypoint_ids.append(bone.id)
-
-                rr.log(
-                    "world/user/bones",
-                    rr.Points3D(
-                        positions=positions,
-                        keypoint_ids=keypoint_ids,
-                        class_ids=SkeletonType.FullBody.value,
-                        radii=VIZ_POINT_RADIUS,
-                    ),
-                )
+            pose = decode_pose(message)
+            # Out-of-order messages are older than the latest sample and not added (unless
+            # far older: see `POSE_CLOCK_RESET`).
+            if not state.body.add_message(pose):
+                return
+            # print(f"Received {len(pose)} bones")
+
+            # Log to rerun, off the event loop (see `log_body_pose()`)
+            if state.visualizer and state.visualizer.due():
+                state.visualizer.submit((time.time(), *state.body.latest()))
 
     except Exception as e:
         print(f"Could not process body pose data: {e}")
 
 
+def log_body_pose(rr: Any, snapshot: tuple):
+    """Logs a body pose snapshot to rerun; runs in the visualization sink's thread."""
+    timestamp, positions, rotations, tracked = snapshot
+    # Arbitrary timestamp for visualization timeline
+    rr.set_time_sequence("body_pose_timestamp", int(timestamp * 1000))
+
+    # NOTE: not all bones are being tracked; `tracked` masks those sent.
+    if CONVERT_UNITY_COORDS:
+        # Right-handed, Z-up (+X forward, +Y left, +Z up).
+        positions, _ = convert_unity(positions, rotations)
+
+    rr.log(
+        "world/user/bones",
+        rr.Points3D(
+            positions=positions[tracked],
+            keypoint_ids=BONE_IDS[tracked],
+            class_ids=SkeletonType.FullBody.value,
+            radii=VIZ_POINT_RADIUS,
+        ),
+    )
+
+
 # Factory for creating the video track
 def create_video_track(state: AppState):
     video_path = os.path.join(
@@ -239,8 +195,10 @@ def create_video_track(state: AppState):
         )
 
     # Initialize the video source and transform
-    video_source = VIDEO_SOURCE(video_path)
-    video_transform = EquilibEqui2Pers(output_width=1280, output_height=720, fov_x=state.fov_x)
+    video_source = get_source_pool().acquire(VIDEO_SOURCE, video_path)
+    video_transform = get_transform_registry().acquire(
+        EquilibEqui2Pers, output_width=1280, output_height=720, fov_x=state.fov_x
+    )
 
     return ReprojectionTrack(state, video_source, video_transform)
 
@@ -303,7 +261,8 @@ if __name__ == "__main__":
             static=True,
         )
 
-        state_factory = partial(AppState, visualizer=rr)
+        sink = VisualizationSink(partial(log_body_pose, rr), rate=VIZ_RATE, name="rerun")
+        state_factory = partial(AppState, visualizer=sink)
 
     data_handlers = {
         "camera": on_camera_message,
@@ -314,6 +273,8 @@ if __name__ == "__main__":
         video_track_factory=create_video_track,
         datachannel_handlers=data_handlers,
         state_factory=state_factory,
+        # Only the newest pose matters; older ones queued behind a slow handler are dropped.
+        datachannel_policies={"camera": LatestValue(), "body_pose": LatestValue(max_rate=30)},
     )
 
     server.run()
@@ -1,6 +1,7 @@
 import asyncio
 import os
 import time
+from fractions import Fraction
 from pathlib import Path
 
 from aiortc import MediaStreamTrack
@@ -8,14 +9,63 @@ from av import VideoFrame
 from fastapi.responses import FileResponse
 
 from xr_360_camera_streamer import configure_logging
-from xr_360_camera_streamer.sources import FFmpegFileSource
-from xr_360_camera_streamer.streaming import WebRTCServer
+from xr_360_camera_streamer.sources import FFmpegFileSource, get_source_pool
+from xr_360_camera_streamer.streaming import (
+    PassthroughTrack,
+    RenditionLadder,
+    RenditionTrack,
+    WebRTCServer,
+)
 from xr_360_camera_streamer.utils.codecs import maybe_enable_hardware_acceleration
 
 # Params
 VIDEO_SOURCE = FFmpegFileSource
 # VIDEO_SOURCE = OpenCVFileSource
 
+# Encode the video once and relay the packets to every viewer, instead of one encoder
+# per viewer. All viewers see the same stream, so enable it for broadcasts.
+BROADCAST = False
+
+# Send the file's H.264/VP8 packets as they are, without decoding or re-encoding (falls
+# back to transcoding if the file or the viewer's codec does not allow it). Nearly free
+# per viewer, so it is used instead of BROADCAST when enabled (as is RENDITIONS).
+PASSTHROUGH = False
+
+# Stream the rendition (resolution/bitrate) that fits each viewer's bandwidth, switching
+# as it changes. Build the renditions first with `xr-streamer build <video>`.
+RENDITIONS = False
+
+# Encoder tuning profile ("ultra-low-latency", "balanced" or "quality"), or None for
+# aiortc's own encoders (hardware accelerated where available). Run `xr-streamer
+# benchmark` to see which encoders and profiles are fast enough on this machine, and set
+# ENCODERS to e.g. {"h264": "h264_nvenc"}.
+ENCODER_PROFILE = None
+# ENCODER_PROFILE = "ultra-low-latency"
+ENCODERS = {}
+
+# Seconds between keyframes, for the tuned encoders (ENCODER_PROFILE). Viewers that lose
+# packets or join get a keyframe on request anyway, so this only bounds recovery when
+# requests are lost. With INTRA_REFRESH, the periodic keyframes are replaced by a rolling
+# refresh, which avoids bitrate spikes.
+KEYFRAME_INTERVAL = 2.0
+INTRA_REFRESH = False
+
+# Video codecs in order of preference; each viewer gets the first one it supports. H.264
+# is the cheapest to encode here (and hardware encoders exist for it).
+CODEC_PREFERENCES = ["h264", "vp8"]
+
+# Build this many video pipelines (or the broadcast relay) ahead of time, so a viewer's
+# video starts without waiting for the file to open. With TRICKLE_ICE, the page sends
+# its ICE candidates as it finds them instead of waiting for all of them.
+PREWARM = 1
+TRICKLE_ICE = True
+
+# Decoders kept open after a viewer leaves, for the next viewer of the same file.
+POOL_SIZE = 2
+
+# Seconds a disconnected viewer's stream is kept, so the page can reconnect and resume it.
+SESSION_GRACE = 10.0
+
 # LOG_LEVEL = "INFO"
 LOG_LEVEL = "DEBUG"
 
@@ -36,21 +86,24 @@ class VideoFileTrack(MediaStreamTrack):
         except StopIteration:
             # Loop the video
             print("Restarting video source...")
-            self.source.release()
-            self.source = FFmpegFileSource(self.source.filepath)
+            self.source.reset()
             frame_rgb = next(self.source)
 
         # Create a VideoFrame for aiortc
         frame = VideoFrame.from_ndarray(frame_rgb, format="rgb24")
 
         # Set timestamp
-        time_base = 90000
+        clock_rate = 90000
         frame.pts = self._timestamp
-        frame.time_base = time_base
-        self._timestamp += int(time_base / self.source.fps)
+        frame.time_base = Fraction(1, clock_rate)
+        self._timestamp += int(clock_rate / self.source.fps)
 
         return frame
 
+    def on_close(self):
+        # Called by the server when the viewer leaves; keeps the decoder for the next one.
+        get_source_pool().release(self.source)
+
 
 # Factory for creating the video track
 def create_video_track():
@@ -70,8 +123,13 @@ def create_video_track():
             "and place them in `xr-360-streamer-assets` at the project root."
         )
 
+    if RENDITIONS:
+        return RenditionTrack(RenditionLadder.load(video_path))
+    if PASSTHROUGH:
+        return PassthroughTrack(video_path)
+
     # Initialize the video source
-    video_source = FFmpegFileSource(video_path, hw_accel_enabled=True)
+    video_source = get_source_pool().acquire(FFmpegFileSource, video_path, hw_accel_enabled=True)
     return VideoFileTrack(video_source)
 
 
@@ -79,13 +137,30 @@ def create_video_track():
 if __name__ == "__main__":
     # Configure logging
     configure_logging(level=LOG_LEVEL)
-
-    # Attempt to enable hardware acceleration by monkey-patching the encoder
-    maybe_enable_hardware_acceleration()
+    get_source_pool().max_idle = POOL_SIZE
+
+    encoder_options = None
+    if ENCODER_PROFILE is None:
+        # Attempt to enable hardware acceleration by monkey-patching the encoder
+        maybe_enable_hardware_acceleration()
+    else:
+        encoder_options = {
+            "profile": ENCODER_PROFILE,
+            "encoders": ENCODERS,
+            "keyframe_interval": KEYFRAME_INTERVAL,
+            "intra_refresh": INTRA_REFRESH,
+        }
 
     # No state or data channels needed for this simple example
     server = WebRTCServer(
         video_track_factory=create_video_track,
+        broadcast=BROADCAST and not (PASSTHROUGH or RENDITIONS),
+        relay_options=encoder_options,
+        encoder_options=encoder_options,
+        codec_preferences=CODEC_PREFERENCES,
+        prewarm=PREWARM,
+        trickle_ice=TRICKLE_ICE,
+        session_grace=SESSION_GRACE,
     )
 
     # Serve frontend HTML file
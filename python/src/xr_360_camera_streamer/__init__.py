@@ -4,6 +4,7 @@ from loguru import logger
 
 from . import __about__
 from .logging import configure_logging
+from .metrics import get_metrics
 from .sources.base import VideoSource
 from .transforms.base import VideoTransform
 
@@ -11,6 +12,7 @@ __all__ = [
     "__version__",
     "logger",
     "configure_logging",
+    "get_metrics",
     "VideoSource",
     "VideoTransform",
 ]
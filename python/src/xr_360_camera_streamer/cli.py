@@ -1,15 +1,230 @@
 """Command-line interface for xr-360-camera-streamer."""
 
+import argparse
 import sys
+import urllib.error
+import urllib.parse
+import urllib.request
 
 from . import logger
+from .profiling import FORMATS, MAX_DURATION, MIN_INTERVAL
+from .streaming.renditions import DEFAULT_BITS_PER_PIXEL, DEFAULT_HEIGHTS, build_renditions
+from .utils.codecs import ENCODER_NAMES, ENCODER_PROFILES, benchmark_encoders, select_encoder
 
 
-def main() -> int:
+def _build(args: argparse.Namespace) -> int:
+    """Builds the rendition ladder of a video."""
+    try:
+        build_renditions(
+            args.video,
+            heights=tuple(args.heights),
+            codecs=tuple(args.codecs),
+            keyframe_interval=args.keyframe_interval,
+            bits_per_pixel=args.bits_per_pixel,
+            output_dir=args.output_dir,
+        )
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not build renditions of {args.video}: {e}")
+        return 1
+    return 0
+
+
+def _benchmark(args: argparse.Namespace) -> int:
+    """Benchmarks the encoders and profiles available on this machine."""
+    results = benchmark_encoders(
+        width=args.width,
+        height=args.height,
+        frames=args.frames,
+        codecs=tuple(args.codecs),
+        profiles=tuple(args.profiles),
+    )
+    print(f"{'encoder':18} {'profile':18} {'mean':>8} {'p95':>8}")
+    for result in results:
+        if result.error is None:
+            print(
+                f"{result.encoder:18} {result.profile:18} "
+                f"{result.mean_ms:6.1f}ms {result.p95_ms:6.1f}ms"
+            )
+        else:
+            print(f"{result.encoder:18} {result.profile:18} {result.error}")
+
+    choices = []
+    print(f"\nFastest within a {args.budget_ms:g}ms budget:")
+    for codec in args.codecs:
+        choice = select_encoder(results, args.budget_ms, codec)
+        if choice is None:
+            print(f"  {codec}: no encoder works on this machine")
+            continue
+        print(f"  {codec}: {choice.encoder} with the '{choice.profile}' profile")
+        choices.append(choice)
+    if not choices:
+        logger.error("No encoder works on this machine.")
+        return 1
+
+    # One profile applies to every codec: the fastest (lowest-quality) one chosen, so no
+    # codec ends up slower than its choice.
+    quality = list(ENCODER_PROFILES)
+    profile = min((choice.profile for choice in choices), key=quality.index)
+    options = {"profile": profile}
+    # The software encoders are the default; only hardware ones need naming.
+    encoders = {c.codec: c.encoder for c in choices if c.encoder != ENCODER_NAMES[c.codec]}
+    if encoders:
+        options["encoders"] = encoders
+    print(f"i.e. encoder_options={options}")
+    return 0
+
+
+def _profile(args: argparse.Namespace) -> int:
+    """Takes a sampling profile of a running server (see `WebRTCServer(profiling=True)`)."""
+    query = urllib.parse.urlencode(
+        {
+            "duration": args.duration,
+            "interval": args.interval,
+            "format": args.format,
+            "idle": str(args.idle).lower(),
+        }
+    )
+    url = f"{args.server.rstrip('/')}/profile?{query}"
+    extension = "speedscope.json" if args.format == "speedscope" else "txt"
+    output = args.output or f"profile.{extension}"
+    logger.info(f"Profiling {args.server} for {args.duration:g}s...")
+    try:
+        with urllib.request.urlopen(url, timeout=args.duration + 30) as response:
+            data = response.read()
+    except urllib.error.HTTPError as e:
+        logger.error(f"Could not profile {args.server}: {e.code} {e.read().decode()}")
+        return 1
+    except (urllib.error.URLError, OSError) as e:
+        logger.error(f"Could not profile {args.server}: {e}")
+        return 1
+    with open(output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {output}")
+    if args.format == "speedscope":
+        print("Open it in https://www.speedscope.app")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
     """The main function of the command-line interface."""
+    parser = argparse.ArgumentParser(
+        prog="xr-streamer", description="Streams 360 panoramic videos to XR headsets."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    build = subparsers.add_parser(
+        "build",
+        help="Pre-transcode a video into renditions for adaptive streaming.",
+        description=(
+            "Transcodes a video into a ladder of resolutions/bitrates with aligned "
+            "keyframes, and writes a manifest next to them (in <name>.renditions/)."
+        ),
+    )
+    build.add_argument("video", help="The video to transcode.")
+    build.add_argument(
+        "--heights",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_HEIGHTS),
+        help="Output heights (default: %(default)s).",
+    )
+    build.add_argument(
+        "--codecs",
+        nargs="+",
+        choices=["h264", "vp8"],
+        default=["h264"],
+        help="Codecs to encode every height in (default: %(default)s).",
+    )
+    build.add_argument(
+        "--keyframe-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between keyframes (default: %(default)s).",
+    )
+    build.add_argument(
+        "--bits-per-pixel",
+        type=float,
+        default=DEFAULT_BITS_PER_PIXEL,
+        help="Bitrate per pixel per frame (default: %(default)s).",
+    )
+    build.add_argument("--output-dir", help="Where to write the renditions.")
+    build.set_defaults(func=_build)
+
+    benchmark = subparsers.add_parser(
+        "benchmark",
+        help="Measure the encode time of the available encoders and profiles.",
+        description=(
+            "Encodes a synthetic video with every encoder and tuning profile that works "
+            "on this machine, and picks the best one within a latency budget."
+        ),
+    )
+    benchmark.add_argument("--width", type=int, default=1280, help="Default: %(default)s.")
+    benchmark.add_argument("--height", type=int, default=720, help="Default: %(default)s.")
+    benchmark.add_argument(
+        "--frames", type=int, default=60, help="Frames per encoder (default: %(default)s)."
+    )
+    benchmark.add_argument(
+        "--codecs",
+        nargs="+",
+        choices=["h264", "vp8"],
+        default=["h264", "vp8"],
+        help="Codecs to benchmark (default: %(default)s).",
+    )
+    benchmark.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=list(ENCODER_PROFILES),
+        default=list(ENCODER_PROFILES),
+        help="Profiles to benchmark (default: all).",
+    )
+    benchmark.add_argument(
+        "--budget-ms",
+        type=float,
+        default=1000 / 60,
+        help="Encode time per frame to stay within (95th percentile; default: one frame "
+        "at 60 fps).",
+    )
+    benchmark.set_defaults(func=_benchmark)
+
+    profile = subparsers.add_parser(
+        "profile",
+        help="Take a sampling profile of a running server.",
+        description=(
+            "Samples the stacks of all threads of a running server (started with "
+            "WebRTCServer(profiling=True)) for a while, tagged by pipeline stage and "
+            "peer, and writes them as speedscope JSON or collapsed stacks."
+        ),
+    )
+    profile.add_argument("server", help="The server's URL, e.g. http://localhost:8080.")
+    profile.add_argument(
+        "--duration",
+        type=float,
+        default=10.0,
+        help=f"Seconds to sample, at most {MAX_DURATION:g} (default: %(default)s).",
+    )
+    profile.add_argument(
+        "--interval",
+        type=float,
+        default=0.01,
+        help=f"Seconds between samples, at least {MIN_INTERVAL:g} (default: %(default)s).",
+    )
+    profile.add_argument(
+        "--format", choices=list(FORMATS), default="speedscope", help="Default: %(default)s."
+    )
+    profile.add_argument(
+        "--idle", action="store_true", help="Keep samples of threads that are waiting."
+    )
+    profile.add_argument(
+        "-o", "--output", help="Where to write the profile (default: profile.<format extension>)."
+    )
+    profile.set_defaults(func=_profile)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 0
     logger.info("Starting XR 360 Camera Streamer...")
-    # Your application logic will go here
-    return 0
+    return args.func(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,338 @@
+"""
+Low-overhead pipeline metrics: how long each stage of producing a peer's video takes
+(decode, transform, convert, encode, send), as latency histograms, plus counters
+(e.g. dropped frames and messages) and gauges (e.g. queue depths).
+
+Library components record into the process-wide registry (see `get_metrics()`), and
+`WebRTCServer` serves it at `/metrics` (Prometheus text format) and `/stats` (JSON).
+Applications time their own stages the same way:
+
+    metrics = get_metrics()
+    with metrics.stage("transform"):
+        frame = transform(frame)
+
+Stage timings are labelled with the peer they were recorded for: the server sets
+`current_peer` while it sets up a connection, so the connection's tasks (e.g. the
+sender pulling frames through the peer's tracks) and the worker threads they start
+with `asyncio.to_thread()` inherit it.
+"""
+
+import bisect
+import math
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from contextvars import ContextVar
+
+# The peer whose video is being produced, for labelling stage timings.
+current_peer: ContextVar[str] = ContextVar("current_peer", default="")
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+Labels = tuple[tuple[str, str], ...]
+# A collector returns (name, labels, value) gauges when metrics are read.
+Collector = Callable[[], Iterable[tuple[str, dict[str, str], float]]]
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets, with their sum and maximum.
+
+    Args:
+        buckets (tuple): Upper bounds of the buckets, ascending. Observations above
+            the last one are counted in an implicit +Inf bucket.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def __repr__(self) -> str:
+        return f"<Histogram count={self.count} mean={self.mean:.4f} max={self.max:.4f}>"
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        """Adds another histogram's observations (with the same buckets) to this one."""
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile, interpolating within its bucket (as Prometheus does)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def to_dict(self) -> dict:
+        """A summary in seconds: count, mean, p50, p95, p99 and max."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "name", "peer", "start", "frame")
+
+    def __init__(self, metrics: "Metrics", name: str, peer: str | None):
+        self.metrics = metrics
+        self.name = name
+        self.peer = peer
+        self.frame = None  # The timed code's frame, while a profiler tags samples
+
+    def __enter__(self):
+        if self.metrics.tracking:
+            if self.peer is None:
+                self.peer = current_peer.get()
+            self.frame = sys._getframe(1)
+            self.metrics._enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.metrics.observe_stage(self.name, time.perf_counter() - self.start, self.peer)
+        if self.frame is not None:
+            self.metrics._exit(self)
+            self.frame = None
+
+
+class Metrics:
+    """
+    A registry of stage latency histograms, counters and gauges, each series keyed
+    by a name and labels.
+
+    Args:
+        prefix (str): Prefix of the metric names in the Prometheus output. Defaults
+            to "xr_streamer".
+        buckets (tuple): Upper bounds of the latency buckets, in seconds.
+    """
+
+    def __init__(self, prefix: str = "xr_streamer", buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.enabled = True
+        self._stages: dict[tuple[str, str], Histogram] = {}  # By (stage, peer)
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._gauges: dict[tuple[str, Labels], float] = {}
+        self._collectors: list[Collector] = []
+        # NOTE: stages are timed on the event loop and in worker threads.
+        self._lock = threading.Lock()
+        # Stages in progress per thread, while `tracking` (see `active_stage()`).
+        self.tracking = 0
+        self._active: dict[int, list[_StageTimer]] = {}
+
+    def __repr__(self) -> str:
+        return f"<Metrics stages={len(self._stages)} counters={len(self._counters)}>"
+
+    def stage(self, name: str, peer: str | None = None) -> _StageTimer:
+        """
+        Times a stage, as a context manager (see `observe_stage()`).
+
+        Args:
+            name (str): The stage, e.g. "decode", "transform", "convert", "encode".
+            peer (str, optional): The peer it is for. Defaults to `current_peer`.
+        """
+        return _StageTimer(self, name, peer)
+
+    def observe_stage(self, name: str, seconds: float, peer: str | None = None):
+        """Records how long a stage took, in seconds."""
+        if not self.enabled:
+            return
+        key = (name, current_peer.get() if peer is None else peer)
+        with self._lock:
+            histogram = self._stages.get(key)
+            if histogram is None:
+                histogram = self._stages[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        """Adds to a counter, e.g. `inc("frames_dropped_total", reason="rate_control")`."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str):
+        """Sets a gauge, e.g. `set("queue_depth", 3, queue="relay")`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def active_stage(self, thread_id: int, frame) -> tuple[str, str] | None:
+        """
+        The innermost stage that thread `thread_id` is in, as (stage, peer), given its
+        current frame; for profilers (see `SamplingProfiler`). Only stages entered
+        while `tracking` is non-zero are known. A stage timed across an `await` only
+        counts while its coroutine runs, i.e. while its frame is on the stack.
+        """
+        timers = self._active.get(thread_id)
+        if not timers:
+            return None
+        stack = set()
+        while frame is not None:
+            stack.add(id(frame))
+            frame = frame.f_back
+        for timer in reversed(list(timers)):
+            if id(timer.frame) in stack:
+                return timer.name, timer.peer or ""
+        return None
+
+    def _enter(self, timer: _StageTimer):
+        self._active.setdefault(threading.get_ident(), []).append(timer)
+
+    def _exit(self, timer: _StageTimer):
+        timers = self._active.get(threading.get_ident())
+        if timers and timer in timers:
+            timers.remove(timer)
+
+    def add_collector(self, collector: Collector):
+        """Adds a function that returns gauges to report whenever metrics are read."""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Collector):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def remove_peer(self, peer: str):
+        """Forgets a peer's series, e.g. once it has gone away."""
+        with self._lock:
+            for key in [k for k in self._stages if k[1] == peer]:
+                del self._stages[key]
+            for series in (self._counters, self._gauges):
+                for key in [k for k in series if ("peer", peer) in k[1]]:
+                    del series[key]
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def stages(self, peer: str | None = None) -> dict[str, Histogram]:
+        """Each stage's histogram, over all peers or for one."""
+        merged: dict[str, Histogram] = {}
+        with self._lock:
+            for (name, stage_peer), histogram in self._stages.items():
+                if peer is None or stage_peer == peer:
+                    merged.setdefault(name, Histogram(self.buckets)).merge(histogram)
+        return merged
+
+    def to_dict(self) -> dict:
+        """
+        A JSON-serializable summary: each stage's latency over all peers and per peer
+        (see `Histogram.to_dict()`), the counters and the gauges.
+        """
+        stages = {name: h.to_dict() for name, h in self.stages().items()}
+        by_peer: dict[str, dict] = {}
+        with self._lock:
+            for (name, peer), histogram in self._stages.items():
+                if peer:
+                    by_peer.setdefault(peer, {})[name] = histogram.to_dict()
+            counters = [self._series(key, value) for key, value in self._counters.items()]
+        return {
+            "stages": stages,
+            "by_peer": by_peer,
+            "counters": counters,
+            "gauges": [self._series(key, value) for key, value in self._read_gauges()],
+        }
+
+    def render_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        name = f"{self.prefix}_stage_seconds"
+        lines.append(f"# TYPE {name} histogram")
+        with self._lock:
+            stages = [(k, h.counts[:], h.sum, h.count) for k, h in self._stages.items()]
+            counters = list(self._counters.items())
+        for (stage, peer), counts, total, count in sorted(stages):
+            labels = f'stage="{_escape(stage)}",peer="{_escape(peer)}"'
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {total}")
+            lines.append(f"{name}_count{{{labels}}} {count}")
+
+        for kind, series in (("counter", counters), ("gauge", self._read_gauges())):
+            typed = set()
+            for (metric, labels), value in sorted(series):
+                full_name = f"{self.prefix}_{metric}"
+                if full_name not in typed:
+                    typed.add(full_name)
+                    lines.append(f"# TYPE {full_name} {kind}")
+                text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                series_name = f"{full_name}{{{text}}}" if text else full_name
+                lines.append(f"{series_name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def _read_gauges(self) -> list[tuple[tuple[str, Labels], float]]:
+        with self._lock:
+            gauges = dict(self._gauges)
+        for collector in list(self._collectors):
+            for metric, labels, value in collector():
+                gauges[(metric, tuple(sorted(labels.items())))] = value
+        return list(gauges.items())
+
+    @staticmethod
+    def _series(key: tuple[str, Labels], value: float) -> dict:
+        name, labels = key
+        return {"name": name, "labels": dict(labels), "value": value}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Returns the process-wide `Metrics`."""
+    return _metrics
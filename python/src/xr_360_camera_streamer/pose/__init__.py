@@ -0,0 +1,29 @@
+from .history import PoseHistory
+from .protocol import (
+    BONE_DTYPE,
+    HEAD_DTYPE,
+    UNITY_TO_FLU,
+    UNITY_TO_FRD,
+    PoseKind,
+    PoseMessage,
+    convert_unity,
+    decode_pose,
+    encode_pose,
+    unity_head_rotation,
+)
+from .sink import VisualizationSink
+
+__all__ = [
+    "PoseKind",
+    "PoseMessage",
+    "PoseHistory",
+    "VisualizationSink",
+    "decode_pose",
+    "encode_pose",
+    "convert_unity",
+    "unity_head_rotation",
+    "HEAD_DTYPE",
+    "BONE_DTYPE",
+    "UNITY_TO_FLU",
+    "UNITY_TO_FRD",
+]
@@ -0,0 +1,195 @@
+import threading
+import time
+
+import numpy as np
+
+from ..transforms.rotation import quat_slerp
+from .protocol import PoseMessage
+
+
+class PoseHistory:
+    """
+    The recent poses of a peer's head or skeleton, for looking up the pose at any time
+    (rendering, prediction, recording).
+
+    Samples are kept in preallocated arrays used as a ring buffer: adding one copies it
+    into the oldest slot, and looking one up is a binary search. Between samples,
+    positions are interpolated linearly and rotations with slerp; outside the history
+    the first/last sample is held.
+
+    Each sample holds `bones` poses, indexed by bone id, with a mask of the bones it
+    contains (e.g. the tracked bones of a skeleton message). Rotations are
+    (x, y, z, w) quaternions, as in `PoseMessage`.
+
+    Args:
+        capacity (int): Number of samples kept; the oldest is overwritten first.
+            Defaults to 256.
+        bones (int): Poses per sample, e.g. 1 for a head or the number of bone ids
+            of a skeleton type. Defaults to 1.
+        reset_after (float, optional): A sample this many seconds older than the
+            newest one means the client's clock restarted (e.g. the app was
+            restarted): the history is cleared and the sample added. Defaults to
+            None (older samples are always ignored).
+    """
+
+    def __init__(self, capacity: int = 256, bones: int = 1, reset_after: float | None = None):
+        if capacity < 1 or bones < 1:
+            raise ValueError(f"PoseHistory needs capacity and bones >= 1, got {capacity}, {bones}")
+        self.capacity = capacity
+        self.bones = bones
+        self.reset_after = reset_after
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.positions = np.zeros((capacity, bones, 3), dtype=np.float32)
+        self.rotations = np.zeros((capacity, bones, 4), dtype=np.float32)
+        self.rotations[..., 3] = 1.0
+        self.valid = np.zeros((capacity, bones), dtype=bool)
+        self._next = 0  # Slot the next sample is written to
+        self._count = 0
+        # NOTE: handlers add samples on the event loop while tracks may read them
+        # from worker threads.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __repr__(self) -> str:
+        if not self._count:
+            return f"<PoseHistory bones={self.bones} samples=0/{self.capacity}>"
+        first, last = self.timestamps[self._slot(0)], self.timestamps[self._slot(-1)]
+        return (
+            f"<PoseHistory bones={self.bones} samples={self._count}/{self.capacity} "
+            f"range=[{first:.3f}, {last:.3f}]s>"
+        )
+
+    @property
+    def latest_timestamp(self) -> float | None:
+        """Timestamp of the newest sample, or None if there is none."""
+        return float(self.timestamps[self._slot(-1)]) if self._count else None
+
+    def clear(self):
+        """Drops all samples."""
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    def add(
+        self,
+        timestamp: float,
+        positions: np.ndarray,
+        rotations: np.ndarray,
+        ids: np.ndarray | None = None,
+    ) -> bool:
+        """
+        Adds a sample. Samples must arrive in time order; older ones are ignored,
+        unless they are older by more than `reset_after`, which starts a new history.
+
+        Args:
+            timestamp (float): When the pose was sampled, in seconds.
+            positions (np.ndarray): Positions (N, 3).
+            rotations (np.ndarray): Rotations (N, 4) as (x, y, z, w) quaternions.
+            ids (np.ndarray, optional): Bone id of each pose (N,). Poses whose id is
+                outside [0, bones) are skipped. Defaults to 0..N-1.
+
+        Returns:
+            bool: Whether the sample was added.
+        """
+        with self._lock:
+            if self._count and timestamp <= self.timestamps[self._slot(-1)]:
+                last = self.timestamps[self._slot(-1)]
+                if self.reset_after is None or last - timestamp <= self.reset_after:
+                    return False
+                self._next = 0
+                self._count = 0
+            slot = self._next
+            self.timestamps[slot] = timestamp
+            self.positions[slot] = 0.0
+            self.rotations[slot] = (0.0, 0.0, 0.0, 1.0)
+            self.valid[slot] = False
+            if ids is None:
+                count = min(len(positions), self.bones)
+                self.positions[slot, :count] = positions[:count]
+                self.rotations[slot, :count] = rotations[:count]
+                self.valid[slot, :count] = True
+            else:
+                known = (ids >= 0) & (ids < self.bones)
+                rows = ids[known]
+                self.positions[slot, rows] = positions[known]
+                self.rotations[slot, rows] = rotations[known]
+                self.valid[slot, rows] = True
+            self._next = (slot + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+        return True
+
+    def add_message(self, message: PoseMessage, timestamp: float | None = None) -> bool:
+        """
+        Adds the poses of a decoded message (see `add()`).
+
+        Args:
+            message (PoseMessage): A head or skeleton message.
+            timestamp (float, optional): The sample's timestamp. Defaults to the
+                message's capture timestamp, or to the time of arrival
+                (`time.monotonic()`) for unversioned messages, which have none.
+        """
+        if timestamp is None:
+            timestamp = message.timestamp if message.version else time.monotonic()
+        ids = message.ids if "id" in message.records.dtype.names else None
+        return self.add(timestamp, message.positions, message.rotations, ids)
+
+    def at(self, t: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the poses at time `t`, interpolated between the samples around it.
+
+        Returns:
+            tuple: Positions (bones, 3), (x, y, z, w) rotations (bones, 4), and which
+                bones are valid (bones,): those in both samples interpolated between.
+
+        Raises:
+            LookupError: If the history is empty.
+        """
+        with self._lock:
+            if not self._count:
+                raise LookupError("PoseHistory is empty")
+            i = self._search(t)
+            if i == 0 or i == self._count:
+                slot = self._slot(max(i - 1, 0))
+                return (
+                    self.positions[slot].copy(),
+                    self.rotations[slot].copy(),
+                    self.valid[slot].copy(),
+                )
+            a, b = self._slot(i - 1), self._slot(i)
+            t0, t1 = self.timestamps[a], self.timestamps[b]
+            alpha = (t - t0) / (t1 - t0)
+            positions = self.positions[a] + alpha * (self.positions[b] - self.positions[a])
+            rotations = quat_slerp(self.rotations[a], self.rotations[b], alpha)
+            valid = self.valid[a] & self.valid[b]
+        return positions.astype(np.float32), rotations.astype(np.float32), valid
+
+    def latest(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the newest sample's poses, in the format of `at()`."""
+        with self._lock:
+            if not self._count:
+                raise LookupError("PoseHistory is empty")
+            slot = self._slot(-1)
+            return (
+                self.positions[slot].copy(),
+                self.rotations[slot].copy(),
+                self.valid[slot].copy(),
+            )
+
+    def _slot(self, i: int) -> int:
+        """Slot of the i-th oldest sample (negative counts from the newest)."""
+        return (self._next - self._count + i % self._count) % self.capacity
+
+    def _search(self, t: float) -> int:
+        """Number of samples with a timestamp <= `t`."""
+        # The samples are sorted in two runs: from the oldest slot to the end of the
+        # arrays, then (once the buffer has wrapped) from its start.
+        start = (self._next - self._count) % self.capacity
+        if start + self._count <= self.capacity:
+            run = self.timestamps[start : start + self._count]
+            return int(np.searchsorted(run, t, side="right"))
+        older, newer = self.timestamps[start:], self.timestamps[: self._next]
+        if t < newer[0]:
+            return int(np.searchsorted(older, t, side="right"))
+        return len(older) + int(np.searchsorted(newer, t, side="right"))
@@ -0,0 +1,244 @@
+"""
+Binary wire protocol for poses sent by XR clients over data channels.
+
+All values are little-endian. A message is a 20-byte header followed by `count`
+fixed-size records:
+
+    header:   magic "XP" (2s), version (u1), kind (u1), skeleton type (i2),
+              count (u2), sequence number (u4), capture timestamp (f8, seconds)
+    HEAD:     position (3 x f4), rotation (4 x f4), horizontal FOV (f4, degrees)
+    SKELETON: bone id (i4), position (3 x f4), rotation (4 x f4)
+
+Positions and rotations are in the client's frame; for Unity clients that is
+left-handed and Y-up, with rotations as (x, y, z, w) quaternions (see
+`convert_unity()`). The skeleton type is the client's (e.g. Unity's
+`OVRSkeleton.SkeletonType`), or -1 for head messages. The sequence number counts
+messages per channel, so receivers can drop out-of-order ones. The capture
+timestamp is when the client sampled the pose, on its own clock.
+
+Bone records have the layout of the original unversioned skeleton messages (a
+little-endian i4 bone count followed by the bone records), which `decode_pose()`
+still accepts.
+
+Decoding does not copy: the records of a `PoseMessage` are a structured array
+viewing the message bytes.
+"""
+
+import enum
+
+import numpy as np
+
+from ..transforms.rotation import matrix_to_rotation, quat_to_matrix
+
+MAGIC = b"XP"
+VERSION = 1
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S2"),
+        ("version", "u1"),
+        ("kind", "u1"),
+        ("skeleton_type", "<i2"),
+        ("count", "<u2"),
+        ("sequence", "<u4"),
+        ("timestamp", "<f8"),
+    ]
+)
+HEAD_DTYPE = np.dtype([("position", "<f4", (3,)), ("rotation", "<f4", (4,)), ("fov_x", "<f4")])
+BONE_DTYPE = np.dtype([("id", "<i4"), ("position", "<f4", (3,)), ("rotation", "<f4", (4,))])
+
+# Unity's axes (+X right, +Y up, +Z forward, left-handed) in right-handed frames:
+# +X forward, +Y left, +Z up (e.g. rerun's RIGHT_HAND_Z_UP) ...
+UNITY_TO_FLU = np.array([[0, 0, 1], [-1, 0, 0], [0, 1, 0]], dtype=np.float32)
+# ... and the library's ray frame, +X forward, +Y right, +Z down (see `spherical.py`).
+UNITY_TO_FRD = np.array([[0, 0, 1], [1, 0, 0], [0, -1, 0]], dtype=np.float32)
+
+
+class PoseKind(enum.IntEnum):
+    """What a pose message holds."""
+
+    HEAD = 1
+    SKELETON = 2
+
+
+_RECORD_DTYPES = {PoseKind.HEAD: HEAD_DTYPE, PoseKind.SKELETON: BONE_DTYPE}
+
+
+class PoseMessage:
+    """
+    A decoded pose message.
+
+    Args:
+        kind (PoseKind): What the message holds.
+        records (np.ndarray): The head (one record of `HEAD_DTYPE`) or the bones
+            (records of `BONE_DTYPE`).
+        sequence (int): The client's message sequence number.
+        timestamp (float): When the client sampled the pose, in seconds on its clock.
+        skeleton_type (int): The client's skeleton type, or -1.
+        version (int): The protocol version; 0 for unversioned skeleton messages.
+    """
+
+    def __init__(
+        self,
+        kind: PoseKind,
+        records: np.ndarray,
+        sequence: int = 0,
+        timestamp: float = 0.0,
+        skeleton_type: int = -1,
+        version: int = VERSION,
+    ):
+        self.kind = kind
+        self.records = records
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.skeleton_type = skeleton_type
+        self.version = version
+
+    def __repr__(self) -> str:
+        return (
+            f"<PoseMessage {self.kind.name} v{self.version} seq={self.sequence} "
+            f"t={self.timestamp:.3f} records={len(self.records)}>"
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """Positions (N, 3), in the client's frame."""
+        return self.records["position"]
+
+    @property
+    def rotations(self) -> np.ndarray:
+        """Rotations (N, 4) as (x, y, z, w) quaternions, in the client's frame."""
+        return self.records["rotation"]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Bone ids (N,) of a skeleton message."""
+        return self.records["id"]
+
+    @property
+    def fov_x(self) -> float:
+        """Horizontal field of view of a head message, in degrees."""
+        return float(self.records["fov_x"][0])
+
+
+def decode_pose(data: bytes | bytearray | memoryview) -> PoseMessage:
+    """
+    Decodes a pose message, or an unversioned skeleton message.
+
+    Args:
+        data: The message bytes. They back the returned records, so must not be
+            modified while those are in use.
+
+    Returns:
+        PoseMessage: The decoded message.
+
+    Raises:
+        ValueError: If the message is malformed or of an unsupported version.
+    """
+    size = len(data)
+    if size >= 2 and bytes(data[:2]) != MAGIC:
+        return _decode_unversioned(data)
+    if size < HEADER_DTYPE.itemsize:
+        raise ValueError(f"Pose message too short for its header: {size} bytes")
+
+    header = np.frombuffer(data, dtype=HEADER_DTYPE, count=1)[0]
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported pose protocol version {header['version']}")
+    try:
+        kind = PoseKind(int(header["kind"]))
+    except ValueError:
+        raise ValueError(f"Unknown pose message kind {header['kind']}") from None
+    count = int(header["count"])
+    record_dtype = _RECORD_DTYPES[kind]
+    expected = HEADER_DTYPE.itemsize + count * record_dtype.itemsize
+    if size != expected or (kind is PoseKind.HEAD and count != 1):
+        raise ValueError(
+            f"{kind.name} message with {count} records should be {expected} bytes, got {size}"
+        )
+    records = np.frombuffer(data, dtype=record_dtype, count=count, offset=HEADER_DTYPE.itemsize)
+    return PoseMessage(
+        kind,
+        records,
+        sequence=int(header["sequence"]),
+        timestamp=float(header["timestamp"]),
+        skeleton_type=int(header["skeleton_type"]),
+        version=VERSION,
+    )
+
+
+def _decode_unversioned(data: bytes | bytearray | memoryview) -> PoseMessage:
+    size = len(data)
+    if size < 4:
+        raise ValueError(f"Skeleton message too short: {size} bytes")
+    count = int(np.frombuffer(data, dtype="<i4", count=1)[0])
+    expected = 4 + count * BONE_DTYPE.itemsize
+    if count < 0 or size < expected:
+        raise ValueError(f"Skeleton message with {count} bones should be {expected} bytes")
+    records = np.frombuffer(data, dtype=BONE_DTYPE, count=count, offset=4)
+    return PoseMessage(PoseKind.SKELETON, records, version=0)
+
+
+def encode_pose(
+    kind: PoseKind,
+    records: np.ndarray,
+    sequence: int = 0,
+    timestamp: float = 0.0,
+    skeleton_type: int = -1,
+) -> bytes:
+    """
+    Encodes a pose message (e.g. for Python clients and recordings).
+
+    Args:
+        kind (PoseKind): What the message holds.
+        records (np.ndarray): Records of `HEAD_DTYPE` or `BONE_DTYPE`, matching `kind`.
+        sequence (int): The message sequence number.
+        timestamp (float): When the pose was sampled, in seconds.
+        skeleton_type (int): The skeleton type, or -1.
+
+    Returns:
+        bytes: The message.
+    """
+    records = np.ascontiguousarray(records, dtype=_RECORD_DTYPES[kind]).reshape(-1)
+    header = np.array(
+        [(MAGIC, VERSION, kind, skeleton_type, len(records), sequence, timestamp)],
+        dtype=HEADER_DTYPE,
+    )
+    return header.tobytes() + records.tobytes()
+
+
+def convert_unity(
+    positions: np.ndarray, rotations: np.ndarray, axes: np.ndarray = UNITY_TO_FLU
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Converts positions and (x, y, z, w) rotations from Unity's left-handed, Y-up frame
+    to a right-handed one, for all records at once.
+
+    Args:
+        positions (np.ndarray): Positions (..., 3).
+        rotations (np.ndarray): Rotations (..., 4) as (x, y, z, w) quaternions.
+        axes (np.ndarray): The change of basis, e.g. `UNITY_TO_FLU` (default) or
+            `UNITY_TO_FRD`.
+
+    Returns:
+        tuple: The positions (..., 3) and (x, y, z, w) rotations (..., 4), as new
+            arrays.
+    """
+    new_positions = positions @ axes.T
+    new_rotations = np.empty_like(rotations)
+    # The basis change flips handedness, which also flips the sense of rotation.
+    new_rotations[..., :3] = -(rotations[..., :3] @ axes.T)
+    new_rotations[..., 3] = rotations[..., 3]
+    return new_positions, new_rotations
+
+
+def unity_head_rotation(message: PoseMessage) -> dict[str, float]:
+    """
+    Returns the orientation of a Unity client's head message as the viewer rotation
+    `EquilibEqui2Pers.transform()` takes as `rot` (roll, pitch and yaw in radians).
+    """
+    _, rotation = convert_unity(message.positions[:1], message.rotations[:1], UNITY_TO_FRD)
+    x, y, z, w = rotation[0]
+    return matrix_to_rotation(quat_to_matrix(np.array([w, x, y, z])))
@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from .. import logger
+from ..metrics import get_metrics
+
+_STOP = object()
+
+
+class VisualizationSink:
+    """
+    Hands snapshots (e.g. of a `PoseHistory`) to a background thread that logs or
+    visualizes them, so debug visualization never runs on the event loop.
+
+    `submit()` never blocks: snapshots are decimated to at most `rate` per second,
+    and dropped when `max_queue` are already waiting (the writer is falling behind).
+    The writer runs in the sink's thread, started with the first snapshot; its
+    errors are logged.
+
+    Example:
+        sink = VisualizationSink(partial(log_to_rerun, rr), rate=15)
+        ...
+        if sink.due():
+            sink.submit(history.latest())
+
+    Args:
+        write (callable): Called with each snapshot, in the sink's thread.
+        rate (float, optional): Maximum snapshots per second. Defaults to 15; None
+            keeps every one.
+        max_queue (int): Snapshots that may wait for the writer. Defaults to 2.
+        name (str): Name of the thread and in log messages. Defaults to "viz".
+    """
+
+    def __init__(
+        self,
+        write: Callable[[Any], None],
+        rate: float | None = 15.0,
+        max_queue: int = 2,
+        name: str = "viz",
+    ):
+        self.write = write
+        self.rate = rate
+        self.name = name
+        self.submitted = 0
+        self.decimated = 0  # Skipped to keep to `rate`
+        self.dropped = 0  # Skipped because the writer was behind
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._next_time = 0.0
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def __repr__(self) -> str:
+        return (
+            f"<VisualizationSink {self.name} submitted={self.submitted} "
+            f"decimated={self.decimated} dropped={self.dropped}>"
+        )
+
+    def due(self) -> bool:
+        """Whether a snapshot submitted now would be kept, to skip building one if not."""
+        return not self._closed and (self.rate is None or time.monotonic() >= self._next_time)
+
+    def submit(self, snapshot: Any) -> bool:
+        """
+        Queues a snapshot for the writer, unless it is decimated or the queue is full.
+        The snapshot is not copied, so must not be modified afterwards.
+
+        Returns:
+            bool: Whether the snapshot was queued.
+        """
+        if self._closed:
+            return False
+        now = time.monotonic()
+        if self.rate is not None:
+            if now < self._next_time:
+                self.decimated += 1
+                return False
+            self._next_time = now + 1 / self.rate
+        try:
+            self._queue.put_nowait(snapshot)
+        except queue.Full:
+            self.dropped += 1
+            get_metrics().inc("snapshots_dropped_total", sink=self.name)
+            return False
+        self.submitted += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return True
+
+    def close(self, timeout: float = 1.0):
+        """
+        Stops the writer thread once it has written the queued snapshots (dropping the
+        oldest if the queue is full). Waits at most `timeout` seconds.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        while True:
+            try:
+                self._queue.put_nowait(_STOP)
+                break
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+        self._thread.join(timeout)
+        logger.debug(f"{self!r}: closed.")
+
+    def on_close(self):
+        # Called by the server when the sink is a peer's resource.
+        self.close()
+
+    def _run(self):
+        while True:
+            snapshot = self._queue.get()
+            if snapshot is _STOP:
+                return
+            try:
+                self.write(snapshot)
+            except Exception as e:
+                logger.error(f"{self.name}: Error writing snapshot: {e}")
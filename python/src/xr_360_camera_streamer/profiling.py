@@ -0,0 +1,249 @@
+"""
+A statistical sampling profiler for live servers: it periodically samples the
+Python stack of every thread, so the production workload can be profiled on demand
+(see `WebRTCServer(profiling=True)` and `xr-streamer profile`) at a small, bounded
+cost, unlike `cProfile`, which slows down every call while it is enabled.
+
+Samples are tagged with the pipeline stage and peer their thread was timing (see
+`Metrics.stage()`), and written as collapsed stacks (for flame graph tools) or in
+the speedscope format (https://www.speedscope.app).
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from .metrics import Metrics, get_metrics
+
+# Innermost frames of threads that are waiting for work, I/O or a lock (e.g. idle
+# pool workers and the event loop's `select()`), by (file name, function).
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+# Longest profile a server takes, in seconds.
+MAX_DURATION = 120.0
+# Shortest interval between samples, in seconds: each sample walks every thread's stack
+# with the GIL held, so much shorter intervals would stall the server.
+MIN_INTERVAL = 0.001
+
+FORMATS = ("collapsed", "speedscope")
+
+# (function, file, first line): one flame graph node per function.
+Frame = tuple[str, str, int]
+# (thread name, stage, peer, frames from the outermost).
+Sample = tuple[str, str, str, tuple[Frame, ...]]
+
+
+class Profile:
+    """
+    The samples taken by a `SamplingProfiler`, counted by thread, stage, peer and
+    stack.
+
+    Args:
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter[Sample] = Counter()
+        self.started = time.time()
+        self.duration = 0.0
+        self.ticks = 0  # Times the threads were sampled
+
+    def __repr__(self) -> str:
+        return (
+            f"<Profile {self.duration:.1f}s ticks={self.ticks} "
+            f"samples={sum(self.samples.values())}>"
+        )
+
+    def to_collapsed(self) -> str:
+        """
+        The samples as collapsed stacks, one `frame;frame;... count` line per stack,
+        as flame graph tools (e.g. flamegraph.pl, speedscope) read them. The thread,
+        peer and stage come first, as frames of their own.
+        """
+        lines = []
+        for (thread, stage, peer, frames), count in self.samples.most_common():
+            names = [f"thread:{thread}", *_tags(stage, peer), *map(_frame_name, frames)]
+            lines.append(f"{';'.join(name.replace(';', ':') for name in names)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self, name: str = "xr-360-camera-streamer") -> dict:
+        """
+        The samples in the speedscope file format: one profile per thread, weighted
+        in seconds, with the peer and stage as frames at the bottom of each stack.
+        """
+        frames: list[dict] = []
+        indices: dict[Frame, int] = {}
+
+        def index(frame: Frame) -> int:
+            if frame not in indices:
+                indices[frame] = len(frames)
+                function, file, line = frame
+                entry = {"name": function}
+                if file:
+                    entry.update(file=file, line=line)
+                frames.append(entry)
+            return indices[frame]
+
+        threads: dict[str, tuple[list, list]] = {}
+        for (thread, stage, peer, stack), count in self.samples.items():
+            tags = [(tag, "", 0) for tag in _tags(stage, peer)]
+            samples, weights = threads.setdefault(thread, ([], []))
+            samples.append([index(frame) for frame in (*tags, *stack)])
+            weights.append(count * self.interval)
+        profiles = [
+            {
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+            for thread, (samples, weights) in sorted(threads.items())
+        ]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "xr-360-camera-streamer",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads from a thread of its own, every `interval`
+    seconds, while it runs. Each sample costs a walk of every thread's stack with the
+    GIL held (tens of microseconds for a server's threads), and nothing in between.
+
+    Example:
+        profile = await SamplingProfiler(interval=0.005).run(10)
+        Path("profile.json").write_text(json.dumps(profile.to_speedscope()))
+
+    Args:
+        interval (float): Seconds between samples, at least `MIN_INTERVAL`. Defaults
+            to 0.01.
+        idle (bool): Whether to keep samples of threads that are waiting (see
+            `IDLE_FRAMES`). Defaults to False.
+        metrics (Metrics, optional): Where stage timers are tracked, for tagging.
+            Defaults to `get_metrics()`.
+    """
+
+    def __init__(self, interval: float = 0.01, idle: bool = False, metrics: Metrics | None = None):
+        if not interval >= MIN_INTERVAL:
+            raise ValueError(
+                f"Sampling interval must be at least {MIN_INTERVAL:g}s, got {interval}"
+            )
+        self.interval = interval
+        self.idle = idle
+        self.metrics = metrics or get_metrics()
+        self.profile: Profile | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._frames: dict = {}  # By code object (see `_frame()`)
+
+    def __repr__(self) -> str:
+        return f"<SamplingProfiler interval={self.interval:g}s running={self.running}>"
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Starts sampling into a new `profile`."""
+        if self._thread is not None:
+            raise RuntimeError("The profiler is already running")
+        self.profile = Profile(self.interval)
+        self._stop.clear()
+        self.metrics.tracking += 1  # Stage timers report where they are
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Profile:
+        """Stops sampling and returns the profile."""
+        if self._thread is None:
+            raise RuntimeError("The profiler is not running")
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.metrics.tracking -= 1
+        return self.profile
+
+    def sample(self, duration: float) -> Profile:
+        """Samples for `duration` seconds, blocking, and returns the profile."""
+        self.start()
+        try:
+            self._stop.wait(duration)
+        finally:
+            profile = self.stop()
+        return profile
+
+    async def run(self, duration: float) -> Profile:
+        """Samples for `duration` seconds without blocking the event loop."""
+        self.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profile = self.stop()
+        return profile
+
+    def _run(self):
+        own = threading.get_ident()
+        profile = self.profile
+        start = time.perf_counter()
+        next_tick = start
+        while not self._stop.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                code = frame.f_code
+                innermost = (os.path.basename(code.co_filename), code.co_name)
+                if not self.idle and innermost in IDLE_FRAMES:
+                    continue
+                tag = self.metrics.active_stage(thread_id, frame)
+                stage, peer = tag if tag is not None else ("", "")
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                name = names.get(thread_id, str(thread_id))
+                profile.samples[(name, stage, peer, tuple(stack))] += 1
+            profile.ticks += 1
+            # Ticks keep to the interval on average, without catching up after a stall.
+            next_tick = max(next_tick + self.interval, time.perf_counter())
+            self._stop.wait(next_tick - time.perf_counter())
+        profile.duration = time.perf_counter() - start
+
+    def _frame(self, code) -> Frame:
+        frame = self._frames.get(code)
+        if frame is None:
+            function = getattr(code, "co_qualname", code.co_name)  # Python 3.11+
+            frame = self._frames[code] = (function, code.co_filename, code.co_firstlineno)
+        return frame
+
+
+def _tags(stage: str, peer: str) -> list[str]:
+    tags = []
+    if peer:
+        tags.append(f"peer:{peer}")
+    if stage:
+        tags.append(f"stage:{stage}")
+    return tags
+
+
+def _frame_name(frame: Frame) -> str:
+    function, file, line = frame
+    return f"{function} ({os.path.basename(file)}:{line})"
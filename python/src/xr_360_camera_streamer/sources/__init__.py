@@ -1,5 +1,16 @@
 from .base import VideoSource
 from .ffmpeg_source import FFmpegFileSource
 from .opencv_source import OpenCVFileSource
+from .orientation import OrientationTrack
+from .pool import SourcePool, get_source_pool
+from .shared import SharedSource
 
-__all__ = ["VideoSource", "FFmpegFileSource", "OpenCVFileSource"]
+__all__ = [
+    "VideoSource",
+    "FFmpegFileSource",
+    "OpenCVFileSource",
+    "OrientationTrack",
+    "SharedSource",
+    "SourcePool",
+    "get_source_pool",
+]
@@ -29,6 +29,13 @@ class VideoSource(abc.ABC):
         """Releases the video source and cleans up resources."""
         pass
 
+    def reset(self):
+        """
+        Rewinds the source to its first frame, reusing what it has opened (see
+        `SourcePool`). Sources that cannot rewind raise NotImplementedError.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot be reset")
+
     @property
     @abc.abstractmethod
     def width(self) -> int:
@@ -127,6 +127,9 @@ class FFmpegFileSource(VideoSource):
         # fmt: on
 
         # Start the FFmpeg subprocess
+        self._start()
+
+    def _start(self):
         self.process = subprocess.Popen(
             self.ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
         )
@@ -169,3 +172,12 @@ class FFmpegFileSource(VideoSource):
                 self.process.wait(timeout=1.0)
             except subprocess.TimeoutExpired:
                 self.process.kill()
+
+    def reset(self):
+        """
+        Restarts decoding from the first frame, without inspecting the file again.
+
+        The ffmpeg pipe cannot seek, so this restarts the ffmpeg process.
+        """
+        self.release()
+        self._start()
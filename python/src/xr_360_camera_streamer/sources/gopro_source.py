@@ -0,0 +1,129 @@
+import struct
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+
+from .. import logger
+
+# GPMF value types (https://github.com/gopro/gpmf-parser), as big-endian numpy dtypes.
+# Type "\0" marks a nested container.
+_GPMF_TYPES = {
+    b"b": ">i1",
+    b"B": ">u1",
+    b"s": ">i2",
+    b"S": ">u2",
+    b"l": ">i4",
+    b"L": ">u4",
+    b"j": ">i8",
+    b"J": ">u8",
+    b"f": ">f4",
+    b"d": ">f8",
+}
+
+
+def iter_gpmf(payload: bytes) -> Iterator[tuple[str, bytes, int, int, bytes]]:
+    """
+    Iterates over the top-level KLV entries of a GPMF payload.
+
+    Args:
+        payload (bytes): The raw GPMF data, e.g. one packet of a GoPro `gpmd` track.
+
+    Yields:
+        tuple: `(key, type, struct_size, repeat, data)` for each entry. Nested
+            containers have type `b"\\0"`; pass their `data` back to `iter_gpmf()`.
+    """
+    offset = 0
+    while offset + 8 <= len(payload):
+        key, type_, size, repeat = struct.unpack_from(">4scBH", payload, offset)
+        offset += 8
+        length = size * repeat
+        data = payload[offset : offset + length]
+        offset += (length + 3) & ~3  # Entries are padded to 4 bytes.
+        yield key.decode("latin-1"), type_, size, repeat, data
+
+
+def _gpmf_values(type_: bytes, size: int, repeat: int, data: bytes) -> np.ndarray:
+    dtype = np.dtype(_GPMF_TYPES[type_])
+    return np.frombuffer(data, dtype=dtype).reshape(repeat, size // dtype.itemsize)
+
+
+def parse_gpmf_stream(payload: bytes, fourcc: str) -> np.ndarray | None:
+    """
+    Extracts the (scaled) samples of one sensor stream from a GPMF payload.
+
+    Args:
+        payload (bytes): The raw GPMF data of one packet.
+        fourcc (str): The stream to extract, e.g. "CORI" (camera orientation
+            quaternions) or "GYRO".
+
+    Returns:
+        np.ndarray | None: The samples as float64 with shape (N, components), or
+            None if the payload has no such stream.
+    """
+    for key, type_, _, _, data in iter_gpmf(payload):
+        if key != "DEVC" or type_ != b"\0":
+            continue
+        for key, type_, _, _, stream in iter_gpmf(data):
+            if key != "STRM" or type_ != b"\0":
+                continue
+            scale = None
+            for key, type_, size, repeat, value in iter_gpmf(stream):
+                if key == "SCAL" and type_ in _GPMF_TYPES:
+                    scale = _gpmf_values(type_, size, repeat, value).reshape(-1)
+                elif key == fourcc and type_ in _GPMF_TYPES:
+                    samples = _gpmf_values(type_, size, repeat, value).astype(np.float64)
+                    if scale is not None:
+                        # One scale for all components, or one per component.
+                        samples /= scale if scale.size == samples.shape[1] else scale[0]
+                    return samples
+    return None
+
+
+def read_gpmf_orientation(filepath: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reads the camera orientation ("CORI") stream that GoPro MAX and HERO8+ cameras
+    embed in their recordings.
+
+    NOTE: CORI is relative to the camera's orientation when recording started, so
+          horizon leveling is only as good as the camera was level at that moment.
+
+    Args:
+        filepath (str): Path to the GoPro `.mp4` / `.360` file.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Sample timestamps in seconds (N,) and unit
+            quaternions (N, 4) as (w, x, y, z).
+    """
+    import av  # Bundled with aiortc.
+
+    filepath = Path(filepath)
+    timestamps, quaternions = [], []
+    with av.open(str(filepath)) as container:
+        stream = next(
+            (
+                s
+                for s in container.streams.data
+                if "GoPro MET" in s.metadata.get("handler_name", "")
+            ),
+            None,
+        )
+        if stream is None:
+            raise ValueError(f"No GoPro metadata (GPMF) track found in {filepath}")
+
+        for packet in container.demux(stream):
+            if packet.pts is None or packet.size == 0:
+                continue
+            samples = parse_gpmf_stream(bytes(packet), "CORI")
+            if samples is None:
+                continue
+            # Samples are spread evenly over the packet's duration.
+            start = float(packet.pts * stream.time_base)
+            duration = float((packet.duration or 0) * stream.time_base)
+            timestamps.append(start + duration * np.arange(len(samples)) / len(samples))
+            quaternions.append(samples)
+
+    if not quaternions:
+        raise ValueError(f"GPMF track in {filepath} has no camera orientation (CORI) samples")
+    logger.info(f"Read {sum(len(q) for q in quaternions)} orientation samples from {filepath}")
+    return np.concatenate(timestamps), np.concatenate(quaternions)
@@ -59,3 +59,9 @@ class OpenCVFileSource(VideoSource):
         """Releases the video capture object."""
         if self.cap.isOpened():
             self.cap.release()
+
+    def reset(self):
+        """Seeks back to the first frame, reopening the file if it was released."""
+        if not self.cap.isOpened():
+            self.cap.open(str(self.filepath))
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
@@ -0,0 +1,242 @@
+import csv
+import json
+from pathlib import Path
+
+import numpy as np
+
+from .. import logger
+from ..transforms.rotation import (
+    heading_matrix,
+    matrix_to_quat,
+    quat_from_rotvec,
+    quat_multiply,
+    quat_normalize,
+    quat_slerp,
+    quat_to_matrix,
+    rotation_matrix,
+)
+from .gopro_source import read_gpmf_orientation
+
+# Accepted names of the timestamp column/key in sidecar files (seconds).
+_TIME_KEYS = ("time", "t", "timestamp")
+
+STABILIZATION_MODES = ("level", "full")
+
+
+class OrientationTrack:
+    """
+    The orientation of the camera over time, interpolated to frame timestamps.
+
+    Used to level or stabilize handheld and vehicle-mounted footage: pass
+    `correction(t)` as `world_rot` to `EquilibEqui2Pers` (directly or through a
+    `TransformPipeline`) and the correction is folded into the viewer's rotation, so
+    the frame is still sampled only once.
+
+    Orientations rotate rays from the camera's frame into the world frame, using the
+    library's ray axes (+X forward, +Y right, +Z down). Between samples they are
+    interpolated with slerp; outside the track the first/last sample is held.
+
+    Tracks are usually loaded with `load()`, which accepts:
+
+    - CSV or JSON sidecars with a time column ("time", "t" or "timestamp", in
+      seconds) and either quaternions ("qw", "qx", "qy", "qz"), Euler angles
+      ("roll", "pitch", "yaw", in degrees, same convention as the viewer's `rot`) or
+      gyro rates ("gx", "gy", "gz", in rad/s, integrated from the first sample).
+      JSON files hold a list of records, or an object with a "samples" list.
+    - GoPro recordings (`.mp4` / `.360`), whose embedded GPMF orientation stream is
+      read (see `from_gpmf()`).
+
+    Args:
+        timestamps (np.ndarray): Sample times in seconds (N,).
+        quaternions (np.ndarray): Camera orientations as (w, x, y, z) (N, 4).
+        time_offset (float): Added to every lookup time, to line the track up with
+            the video. Defaults to 0.
+    """
+
+    def __init__(self, timestamps: np.ndarray, quaternions: np.ndarray, time_offset: float = 0.0):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        quaternions = quat_normalize(quaternions)
+        expected_shape = (len(timestamps), 4)
+        if timestamps.ndim != 1 or len(timestamps) == 0 or quaternions.shape != expected_shape:
+            raise ValueError(
+                "OrientationTrack needs N timestamps and an (N, 4) array of quaternions, "
+                f"got {timestamps.shape} and {quaternions.shape}."
+            )
+        order = np.argsort(timestamps, kind="stable")
+        self.timestamps = timestamps[order]
+        self.quaternions = quaternions[order]
+        # Keep neighbours in the same hemisphere so interpolation never flips.
+        signs = np.sign(np.sum(self.quaternions[1:] * self.quaternions[:-1], axis=1))
+        signs[signs == 0] = 1
+        self.quaternions[1:] *= np.cumprod(signs)[:, np.newaxis]
+        self.time_offset = time_offset
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __repr__(self) -> str:
+        return (
+            f"<OrientationTrack samples={len(self)} "
+            f"range=[{self.timestamps[0]:.3f}, {self.timestamps[-1]:.3f}]s>"
+        )
+
+    def orientation(self, t: float | np.ndarray) -> np.ndarray:
+        """
+        Returns the interpolated camera orientation(s) at time(s) `t` (seconds).
+
+        Returns:
+            np.ndarray: Quaternions (w, x, y, z), shape (4,) or (..., 4).
+        """
+        t = np.asarray(t, dtype=np.float64) + self.time_offset
+        if len(self) == 1:
+            return np.broadcast_to(self.quaternions[0], t.shape + (4,)).copy()
+        t = np.clip(t, self.timestamps[0], self.timestamps[-1])
+        i = np.clip(np.searchsorted(self.timestamps, t, side="right") - 1, 0, len(self) - 2)
+        t0, t1 = self.timestamps[i], self.timestamps[i + 1]
+        span = t1 - t0
+        alpha = np.where(span > 0, (t - t0) / np.where(span > 0, span, 1.0), 0.0)
+        return quat_slerp(self.quaternions[i], self.quaternions[i + 1], alpha)
+
+    def matrix(self, t: float) -> np.ndarray:
+        """Returns the interpolated camera orientation at time `t` as a 3x3 matrix."""
+        return quat_to_matrix(self.orientation(t))
+
+    def correction(self, t: float, mode: str = "level") -> np.ndarray:
+        """
+        Returns the rotation that undoes the camera's motion at time `t`.
+
+        Args:
+            t (float): Frame timestamp in seconds.
+            mode (str): "level" removes pitch and roll (the horizon stays level but
+                the view still turns when the camera does), "full" removes all
+                camera rotation. Defaults to "level".
+
+        Returns:
+            np.ndarray: A 3x3 matrix to pass as `world_rot`.
+        """
+        R = self.matrix(t)
+        if mode == "full":
+            return R.T
+        if mode == "level":
+            return R.T @ heading_matrix(R)
+        raise ValueError(
+            f"Unknown stabilization mode '{mode}'. Choose one of {STABILIZATION_MODES}."
+        )
+
+    @classmethod
+    def from_euler(
+        cls, timestamps: np.ndarray, roll: np.ndarray, pitch: np.ndarray, yaw: np.ndarray, **kwargs
+    ) -> "OrientationTrack":
+        """Builds a track from per-sample Euler angles in radians (viewer convention)."""
+        quaternions = [
+            matrix_to_quat(rotation_matrix(r, p, y))
+            for r, p, y in zip(roll, pitch, yaw, strict=True)
+        ]
+        return cls(timestamps, np.array(quaternions), **kwargs)
+
+    @classmethod
+    def from_gyro(cls, timestamps: np.ndarray, rates: np.ndarray, **kwargs) -> "OrientationTrack":
+        """
+        Builds a track by integrating gyro rates, starting from the identity.
+
+        Args:
+            timestamps (np.ndarray): Sample times in seconds (N,).
+            rates (np.ndarray): Angular velocity about the camera's X, Y and Z axes in
+                rad/s (N, 3).
+            **kwargs: Forwarded to the constructor.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        rates = np.asarray(rates, dtype=np.float64)
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, rates = timestamps[order], rates[order]
+
+        # Rotation over each interval, from the mean rate of its two samples.
+        steps = quat_from_rotvec((rates[1:] + rates[:-1]) / 2 * np.diff(timestamps)[:, None])
+        quaternions = np.empty((len(timestamps), 4))
+        quaternions[0] = (1.0, 0.0, 0.0, 0.0)
+        for i, step in enumerate(steps):
+            # Body-frame rates compose on the right.
+            quaternions[i + 1] = quat_normalize(quat_multiply(quaternions[i], step))
+        return cls(timestamps, quaternions, **kwargs)
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, np.ndarray], **kwargs) -> "OrientationTrack":
+        """
+        Builds a track from named columns, as found in CSV/JSON sidecars (see the
+        class docstring for the accepted names).
+        """
+        time_key = next((k for k in _TIME_KEYS if k in columns), None)
+        if time_key is None:
+            raise ValueError(f"Orientation data needs a time column, one of {_TIME_KEYS}.")
+        t = np.asarray(columns[time_key], dtype=np.float64)
+
+        def get(*keys):
+            return [np.asarray(columns[k], dtype=np.float64) for k in keys]
+
+        if {"qw", "qx", "qy", "qz"} <= columns.keys():
+            return cls(t, np.stack(get("qw", "qx", "qy", "qz"), axis=1), **kwargs)
+        if {"roll", "pitch", "yaw"} <= columns.keys():
+            return cls.from_euler(t, *np.radians(get("roll", "pitch", "yaw")), **kwargs)
+        if {"gx", "gy", "gz"} <= columns.keys():
+            return cls.from_gyro(t, np.stack(get("gx", "gy", "gz"), axis=1), **kwargs)
+        raise ValueError(
+            "Orientation data needs quaternion (qw, qx, qy, qz), Euler (roll, pitch, yaw) "
+            f"or gyro (gx, gy, gz) columns; got {sorted(columns)}."
+        )
+
+    @classmethod
+    def from_csv(cls, filepath: str, **kwargs) -> "OrientationTrack":
+        """Loads a CSV sidecar with a header row."""
+        with open(filepath, newline="") as f:
+            rows = list(csv.DictReader(f))
+        if not rows:
+            raise ValueError(f"Orientation file {filepath} has no samples.")
+        columns = {key.strip().lower(): [row[key] for row in rows] for key in rows[0]}
+        return cls.from_columns(columns, **kwargs)
+
+    @classmethod
+    def from_json(cls, filepath: str, **kwargs) -> "OrientationTrack":
+        """Loads a JSON sidecar: a list of sample records, or {"samples": [...]}."""
+        with open(filepath) as f:
+            data = json.load(f)
+        records = data.get("samples", []) if isinstance(data, dict) else data
+        if not records:
+            raise ValueError(f"Orientation file {filepath} has no samples.")
+        columns = {key.lower(): [record[key] for record in records] for key in records[0]}
+        return cls.from_columns(columns, **kwargs)
+
+    @classmethod
+    def from_gpmf(
+        cls, filepath: str, axes: np.ndarray | None = None, **kwargs
+    ) -> "OrientationTrack":
+        """
+        Loads the orientation stream embedded in a GoPro recording.
+
+        Args:
+            filepath (str): Path to the GoPro `.mp4` / `.360` file.
+            axes (np.ndarray, optional): 3x3 change of basis from the camera's sensor
+                axes to the library's ray axes, for firmware whose axes differ.
+            **kwargs: Forwarded to the constructor.
+        """
+        timestamps, quaternions = read_gpmf_orientation(filepath)
+        if axes is not None:
+            axes = np.asarray(axes, dtype=np.float64)
+            quaternions = np.array(
+                [matrix_to_quat(axes @ R @ axes.T) for R in quat_to_matrix(quaternions)]
+            )
+        return cls(timestamps, quaternions, **kwargs)
+
+    @classmethod
+    def load(cls, filepath: str, **kwargs) -> "OrientationTrack":
+        """Loads a track, picking the reader from the file extension."""
+        suffix = Path(filepath).suffix.lower()
+        if suffix == ".csv":
+            track = cls.from_csv(filepath, **kwargs)
+        elif suffix == ".json":
+            track = cls.from_json(filepath, **kwargs)
+        elif suffix in (".mp4", ".360"):
+            track = cls.from_gpmf(filepath, **kwargs)
+        else:
+            raise ValueError(f"Unsupported orientation file type '{suffix}': {filepath}")
+        logger.info(f"Loaded {track} from {filepath}")
+        return track
@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+
+from .. import logger
+from .base import VideoSource
+
+
+class SourcePool:
+    """
+    Keeps released video sources open for the next peer that asks for the same spec
+    (factory plus arguments, e.g. the same file), so reconnecting peers skip opening
+    and probing the file.
+
+    A released source is rewound with `reset()` and kept idle; the next `acquire()`
+    of its spec takes it. Sources that cannot be reset are released instead.
+
+    NOTE: What a rewind keeps depends on the source. `OpenCVFileSource` seeks its
+          open decoder back to the first frame. `FFmpegFileSource` reads from an
+          ffmpeg pipe, which cannot seek, so its `reset()` restarts the ffmpeg
+          process: reuse saves inspecting the file and probing for hardware
+          acceleration, not the decoder start. The restart happens in `release()`,
+          so the next peer gets an already running process.
+
+    Example:
+        pool = get_source_pool()
+        source = pool.acquire(FFmpegFileSource, "video.mp4")
+        ...
+        pool.release(source)
+
+    Args:
+        max_idle (int): Number of idle sources to keep, across all specs; the least
+            recently released is closed first. Defaults to 0 (release at once).
+    """
+
+    def __init__(self, max_idle: int = 0):
+        self._idle: OrderedDict[int, tuple[Hashable, VideoSource]] = OrderedDict()
+        self._keys: dict[int, Hashable] = {}  # Spec of each source handed out, by id
+        self._max_idle = max_idle
+        self._lock = threading.Lock()
+
+    @property
+    def max_idle(self) -> int:
+        """Number of idle sources kept for reuse."""
+        return self._max_idle
+
+    @max_idle.setter
+    def max_idle(self, value: int):
+        self._max_idle = value
+        self._release_idle(value)
+
+    @staticmethod
+    def make_key(factory: Callable[..., VideoSource], *args, **kwargs) -> Hashable:
+        """Builds the pool key for a spec. All arguments must be hashable."""
+        key = (factory, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError as e:
+            raise TypeError(
+                f"Source spec for {getattr(factory, '__name__', factory)} must only "
+                f"contain hashable arguments: {e}"
+            ) from e
+        return key
+
+    def acquire(self, factory: Callable[..., VideoSource], *args, **kwargs) -> VideoSource:
+        """
+        Returns an idle source for a spec, at its first frame, or creates one.
+
+        Args:
+            factory (callable): A `VideoSource` class or a function that creates one.
+            *args: Positional arguments for `factory`; part of the spec.
+            **kwargs: Keyword arguments for `factory`; part of the spec.
+
+        Returns:
+            VideoSource: The source. Pass it to `release()` when done.
+        """
+        key = self.make_key(factory, *args, **kwargs)
+        with self._lock:
+            source = next((s for k, s in self._idle.values() if k == key), None)
+            if source is not None:
+                del self._idle[id(source)]
+                self._keys[id(source)] = key
+        if source is not None:
+            logger.debug(f"SourcePool: reusing {source!r}")
+            return source
+
+        # NOTE: created outside the lock, as opening a source can take a while.
+        source = factory(*args, **kwargs)
+        with self._lock:
+            self._keys[id(source)] = key
+        return source
+
+    def release(self, source: VideoSource):
+        """
+        Returns a source obtained from `acquire()`. It is rewound and kept for reuse if
+        there is room, and released otherwise. Blocks while the source is rewound.
+        """
+        with self._lock:
+            key = self._keys.pop(id(source), None)
+        if key is None or self._max_idle <= 0:
+            source.release()
+            return
+        try:
+            source.reset()
+        except NotImplementedError:
+            source.release()
+            return
+        with self._lock:
+            self._idle[id(source)] = (key, source)
+        self._release_idle(self._max_idle)
+
+    def clear(self):
+        """Releases all idle sources."""
+        self._release_idle(0)
+
+    def _release_idle(self, keep: int):
+        with self._lock:
+            released = []
+            while len(self._idle) > keep:
+                _, (_, source) = self._idle.popitem(last=False)
+                released.append(source)
+        # NOTE: released outside the lock, as stopping a decoder can block.
+        for source in released:
+            source.release()
+
+    def __len__(self) -> int:
+        """Number of idle sources."""
+        with self._lock:
+            return len(self._idle)
+
+
+_pool = SourcePool()
+
+
+def get_source_pool() -> SourcePool:
+    """Returns the process-wide `SourcePool`."""
+    return _pool
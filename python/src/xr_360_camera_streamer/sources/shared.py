@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+
+from ..metrics import get_metrics
+from .base import VideoSource
+
+
+class SharedSource:
+    """
+    Lets several consumers read one `VideoSource`, decoding every frame once.
+
+    Consumers ask for frames by index (e.g. derived from a shared clock) instead of
+    calling `next()` themselves, so any number of peers watching the same video cost
+    one decoder. Decoding runs in a worker thread to keep the event loop responsive.
+
+    Only the latest frame is kept: asking for an older index returns the latest
+    frame, and asking for a later one decodes forward (sources cannot seek).
+
+    Args:
+        source (VideoSource): The source to share. `SharedSource` takes ownership
+            and releases it in `release()`.
+    """
+
+    def __init__(self, source: VideoSource):
+        self.source = source
+        self._index = -1
+        self._frame: np.ndarray | None = None
+        self._ended = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def width(self) -> int:
+        return self.source.width
+
+    @property
+    def height(self) -> int:
+        return self.source.height
+
+    @property
+    def fps(self) -> float:
+        return self.source.fps
+
+    @property
+    def index(self) -> int:
+        """Index of the latest decoded frame (-1 before the first one)."""
+        return self._index
+
+    async def read(self, index: int) -> np.ndarray | None:
+        """
+        Returns frame `index`, decoding up to it if needed.
+
+        NOTE: The returned array is shared between consumers; do not modify it.
+
+        Returns:
+            np.ndarray | None: The frame, or None once the source has ended.
+        """
+        async with self._lock:
+            while self._index < index and not self._ended:
+                frame = await asyncio.to_thread(self._decode)
+                if frame is None:
+                    self._ended = True
+                    self._frame = None
+                    break
+                self._frame = frame
+                self._index += 1
+            return self._frame
+
+    def _decode(self) -> np.ndarray | None:
+        # Runs in a worker thread. Decoded once for all consumers, so not attributed
+        # to any peer.
+        with get_metrics().stage("decode", peer="shared"):
+            return next(self.source, None)
+
+    def release(self):
+        """Releases the underlying source."""
+        self.source.release()
@@ -1,3 +1,35 @@
+from .admission import AdmissionController, PipelineSpec
+from .dispatch import Batch, DispatchPolicy, LatestValue
+from .encoded import EncodedTrack
+from .passthrough import PassthroughTrack
+from .peer import Peer
+from .pose_buckets import PoseBucketHub, PoseBuckets, PoseBucketTrack
+from .rate_control import AdaptiveTrack, RateController
+from .relay import BroadcastRelay, RelayTrack
+from .renditions import Rendition, RenditionLadder, RenditionTrack, build_renditions
+from .rtcp import add_rtcp_listener
 from .webrtc_server import WebRTCServer
 
-__all__ = ["WebRTCServer"]
+__all__ = [
+    "WebRTCServer",
+    "Peer",
+    "AdmissionController",
+    "PipelineSpec",
+    "DispatchPolicy",
+    "LatestValue",
+    "Batch",
+    "BroadcastRelay",
+    "RelayTrack",
+    "EncodedTrack",
+    "PassthroughTrack",
+    "RateController",
+    "AdaptiveTrack",
+    "Rendition",
+    "RenditionLadder",
+    "RenditionTrack",
+    "build_renditions",
+    "PoseBucketHub",
+    "PoseBuckets",
+    "PoseBucketTrack",
+    "add_rtcp_listener",
+]
@@ -0,0 +1,283 @@
+import asyncio
+import os
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Cost of reprojecting a frame relative to encoding it (sampling every output pixel
+# through a remap table costs about as much as a fast H.264 encode).
+REPROJECTION_COST = 1.0
+
+# Seconds after admission before a peer's pipeline is assumed to show in the measured
+# CPU use (opening the source, building transforms, the first frames).
+SETTLE_TIME = 3.0
+
+
+def get_cpu_time() -> float:
+    """
+    CPU seconds used by the process and its child processes, such as the ffmpeg
+    decoders of `FFmpegFileSource`, which `time.process_time()` misses. Children that
+    are still running are only counted if psutil is installed; otherwise they count
+    once they have exited (see `os.times()`).
+    """
+    if psutil is None:
+        t = os.times()
+        return t.user + t.system + t.children_user + t.children_system
+    process = psutil.Process()
+    t = process.cpu_times()
+    total = t.user + t.system + t.children_user + t.children_system
+    for child in process.children(recursive=True):
+        try:
+            t = child.cpu_times()
+        except psutil.Error:
+            continue  # Exited meanwhile
+        total += t.user + t.system
+    return total
+
+
+class PipelineSpec:
+    """
+    What a peer's video pipeline produces, used by `AdmissionController` to estimate
+    its cost. `WebRTCServer` passes the spec a peer was admitted on to the video track
+    factory (as `spec`, if its signature asks for it).
+
+    Args:
+        width (int): Output width.
+        height (int): Output height.
+        fps (float): Output frame rate. Defaults to 30.
+        reprojection (bool): Whether frames are reprojected (e.g. from 360° to a
+            perspective view) before encoding. Defaults to False.
+        max_bitrate (int, optional): Video bitrate limit for peers on this spec, in bits
+            per second (e.g. so a rendition ladder picks a lower rendition).
+        cost (float, optional): The cost, overriding the estimate (e.g. measured).
+        name (str, optional): Name used in logs and answers. Defaults to "WxH@fps".
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        fps: float = 30.0,
+        reprojection: bool = False,
+        max_bitrate: int | None = None,
+        cost: float | None = None,
+        name: str | None = None,
+    ):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.reprojection = reprojection
+        self.max_bitrate = max_bitrate
+        self._cost = cost
+        self.name = name or f"{width}x{height}@{fps:g}"
+
+    def __repr__(self) -> str:
+        return f"<PipelineSpec {self.name} cost={self.cost:.1f}>"
+
+    @property
+    def cost(self) -> float:
+        """
+        Estimated cost, in megapixels per second of encoding: output pixels per second,
+        with reprojection counted as `REPROJECTION_COST` more encodes.
+        """
+        if self._cost is not None:
+            return self._cost
+        pixels = self.width * self.height * self.fps / 1e6
+        return pixels * (1 + REPROJECTION_COST * self.reprojection)
+
+    def to_dict(self) -> dict:
+        """A JSON-serializable summary, e.g. for the client."""
+        return {
+            "name": self.name,
+            "width": self.width,
+            "height": self.height,
+            "fps": self.fps,
+            "reprojection": self.reprojection,
+            "max_bitrate": self.max_bitrate,
+        }
+
+
+class Reservation:
+    """
+    Cost reserved by an admitted peer. The server releases it with the peer's other
+    resources (see `Peer.add_resource()`).
+    """
+
+    def __init__(self, controller: "AdmissionController", spec: PipelineSpec | None):
+        self.controller = controller
+        self.spec = spec
+        self.cost = spec.cost if spec is not None else 0.0
+        self.time = time.monotonic()
+
+    def __repr__(self) -> str:
+        return f"<Reservation {self.spec.name if self.spec else 'peer'} cost={self.cost:.1f}>"
+
+    async def on_close(self):
+        self.controller.release(self)
+
+
+class AdmissionController:
+    """
+    Decides whether the server can take a new peer without degrading the peers it
+    already serves.
+
+    Every admitted peer reserves the estimated cost of its pipeline (see
+    `PipelineSpec.cost`) until it goes away. A new peer is admitted on the first of
+    its candidate specs (best first) that fits both:
+
+    - the capacity model: the reserved cost plus the new cost is within `capacity`,
+      and there are fewer than `max_peers` peers;
+    - the live headroom: the CPU use of the process and its children (see
+      `get_cpu_time()`), extrapolated to the new cost from the cost of the
+      pipelines already running, stays under `max_cpu`, and the event loop lags
+      less than `max_loop_lag` (a lagging loop delays every peer's frames, so no
+      new peer is admitted then).
+
+    Reservations count at once: until a pipeline shows in the measured CPU use
+    (`SETTLE_TIME`), its cost is added to the measurement at the CPU use per unit of
+    cost of the pipelines already running (or, before any has run, `cpu_per_cost`),
+    so a burst of offers cannot all be admitted on the same measurement. Without
+    either, new peers are admitted one at a time until the first one shows.
+
+    Args:
+        capacity (float, optional): Total pipeline cost the server can serve, in
+            `PipelineSpec.cost` units. Defaults to no limit.
+        max_peers (int, optional): Maximum number of peers. Defaults to no limit.
+        max_cpu (float, optional): Fraction of all CPU cores the process may use,
+            e.g. 0.8. Defaults to no limit.
+        max_loop_lag (float, optional): Event loop lag, in seconds, above which no
+            peer is admitted. Defaults to 0.05.
+        cpu_per_cost (float, optional): Expected fraction of all cores per unit of
+            `PipelineSpec.cost`, used until a pipeline's CPU use has been measured
+            (e.g. from a previous run). Defaults to none.
+        interval (float): Seconds between CPU and loop lag measurements. Defaults to 0.5.
+        retry_after (int): Seconds a rejected client is told to wait before trying
+            again. Defaults to 5.
+    """
+
+    def __init__(
+        self,
+        capacity: float | None = None,
+        max_peers: int | None = None,
+        max_cpu: float | None = None,
+        max_loop_lag: float | None = 0.05,
+        cpu_per_cost: float | None = None,
+        interval: float = 0.5,
+        retry_after: int = 5,
+    ):
+        self.capacity = capacity
+        self.max_peers = max_peers
+        self.max_cpu = max_cpu
+        self.max_loop_lag = max_loop_lag
+        self.cpu_per_cost = cpu_per_cost  # Updated from measurements
+        self.interval = interval
+        self.retry_after = retry_after
+
+        self.cpu: float | None = None  # Smoothed fraction of all cores used (with children)
+        self.loop_lag = 0.0  # Smoothed event loop lag, in seconds
+        self.reservations: list[Reservation] = []
+        self._task: asyncio.Task | None = None
+
+    def __repr__(self) -> str:
+        cpu = "?" if self.cpu is None else f"{self.cpu:.0%}"
+        capacity = "" if self.capacity is None else f"/{self.capacity:.0f}"
+        return (
+            f"<AdmissionController peers={len(self.reservations)} "
+            f"cost={self.reserved:.0f}{capacity} cpu={cpu} lag={self.loop_lag * 1000:.0f}ms>"
+        )
+
+    @property
+    def reserved(self) -> float:
+        """Total cost reserved by admitted peers."""
+        return sum(r.cost for r in self.reservations)
+
+    def start(self):
+        """Starts measuring CPU use and event loop lag (called by the server)."""
+        if self._task is None and (self.max_cpu is not None or self.max_loop_lag is not None):
+            self._task = asyncio.ensure_future(self._monitor())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def check(self, spec: PipelineSpec | None) -> str | None:
+        """Returns why a new peer on `spec` would not fit, or None if it fits."""
+        cost = spec.cost if spec is not None else 0.0
+        if self.max_peers is not None and len(self.reservations) >= self.max_peers:
+            return f"{len(self.reservations)} peers (max {self.max_peers})"
+        if self.capacity is not None and self.reserved + cost > self.capacity:
+            return f"cost {self.reserved:.0f} + {cost:.0f} over capacity {self.capacity:.0f}"
+        if self.max_loop_lag is not None and self.loop_lag > self.max_loop_lag:
+            return f"event loop lagging {self.loop_lag * 1000:.0f}ms"
+        if self.max_cpu is not None and self.cpu is not None:
+            unsettled = self._unsettled()
+            pending = sum(r.cost for r in unsettled)
+            settled = self.reserved - pending
+            # The running pipelines give the latest estimate (kept by `_measured()`).
+            cpu_per_cost = self.cpu / settled if settled > 0 else self.cpu_per_cost
+            if cpu_per_cost is not None:
+                cpu = self.cpu + (pending + cost) * cpu_per_cost
+            elif unsettled:
+                # Nothing to extrapolate from yet: wait until the new peer shows.
+                return f"waiting for the CPU use of {len(unsettled)} new peer(s)"
+            else:
+                cpu = self.cpu
+            if cpu > self.max_cpu:
+                return f"CPU {cpu:.0%} (max {self.max_cpu:.0%})"
+        return None
+
+    def admit(self, specs: list[PipelineSpec | None]) -> tuple[Reservation | None, str | None]:
+        """
+        Reserves the first spec that fits, best first.
+
+        Returns:
+            tuple: The reservation (None if nothing fits) and why the best spec did
+                not fit (None if it did).
+        """
+        reason = None
+        for spec in specs:
+            problem = self.check(spec)
+            if problem is None:
+                reservation = Reservation(self, spec)
+                self.reservations.append(reservation)
+                return reservation, reason
+            reason = reason or problem
+        return None, reason
+
+    def release(self, reservation: Reservation):
+        """Returns an admitted peer's reservation."""
+        if reservation in self.reservations:
+            self.reservations.remove(reservation)
+
+    def _unsettled(self) -> list[Reservation]:
+        now = time.monotonic()
+        return [r for r in self.reservations if now - r.time < SETTLE_TIME]
+
+    def _measured(self, cpu: float, lag: float):
+        # Smooths a measurement in, and learns the CPU use per unit of cost from the
+        # pipelines that show in it, for after they are gone.
+        self.loop_lag = 0.7 * self.loop_lag + 0.3 * lag
+        self.cpu = cpu if self.cpu is None else 0.7 * self.cpu + 0.3 * cpu
+        settled = self.reserved - sum(r.cost for r in self._unsettled())
+        if settled > 0:
+            self.cpu_per_cost = self.cpu / settled
+
+    async def _monitor(self):
+        loop = asyncio.get_running_loop()
+        cores = os.cpu_count() or 1
+        wall, cpu_time = loop.time(), get_cpu_time()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now, now_cpu = loop.time(), get_cpu_time()
+                lag = max(0.0, now - wall - self.interval)
+                # A child's time can be lost between exiting and being waited for.
+                cpu = max(0.0, now_cpu - cpu_time) / max(now - wall, 1e-6) / cores
+                wall, cpu_time = now, now_cpu
+                self._measured(cpu, lag)
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,173 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from .. import logger
+from ..metrics import get_metrics
+
+Handler = Callable[[Any], Awaitable[Any]]
+
+
+class DispatchPolicy:
+    """
+    How a data channel's messages are delivered to its handler (see
+    `WebRTCServer(datachannel_policies=...)`). This base policy delivers every
+    message as it arrives, at most one handler call at a time per channel.
+
+    Args:
+        max_rate (float, optional): Maximum handler calls per second. Messages that
+            arrive in between wait (and, depending on the policy, are coalesced).
+            Defaults to no limit.
+    """
+
+    def __init__(self, max_rate: float | None = None):
+        self.max_rate = max_rate
+        self.max_delay = 0.0  # Seconds messages may wait to be delivered together
+
+    def __repr__(self) -> str:
+        rate = "" if self.max_rate is None else f" max_rate={self.max_rate:g}"
+        return f"<{type(self).__name__}{rate}>"
+
+    def dispatcher(self, handler: Handler, name: str = "", **labels: str) -> "Dispatcher":
+        """
+        Creates the dispatcher for one channel; `handler(message)` is awaited. `labels`
+        (e.g. `peer` and `channel`) label its metrics.
+        """
+        return Dispatcher(self, handler, name, **labels)
+
+    def _add(self, pending: list, message: Any) -> int:
+        """Adds a message to the pending ones, returning how many were dropped."""
+        pending.append(message)
+        return 0
+
+    def _take(self, pending: list) -> Any:
+        """Removes and returns what to pass to the next handler call."""
+        return pending.pop(0)
+
+    def _full(self, pending: list) -> bool:
+        """Whether the pending messages must be delivered without waiting."""
+        return True
+
+
+class LatestValue(DispatchPolicy):
+    """
+    Latest value wins: a message that arrives while the handler is busy (or held back
+    by `max_rate`) replaces the one waiting, which is dropped unparsed. For state
+    such as head poses, where only the newest message matters.
+
+    Args:
+        max_rate (float, optional): Maximum handler calls per second. Defaults to no
+            limit (a call whenever the previous one has returned).
+    """
+
+    def _add(self, pending: list, message: Any) -> int:
+        dropped = len(pending)
+        pending[:] = [message]
+        return dropped
+
+
+class Batch(DispatchPolicy):
+    """
+    Collects messages and delivers them together: the handler receives a list of
+    messages as `message`, at most `max_delay` after the first one arrived (or as
+    soon as there are `max_size`). For streams where every message counts but one
+    call per message costs too much.
+
+    Args:
+        max_delay (float): Seconds the first message of a batch may wait. Defaults
+            to 0.02.
+        max_size (int, optional): Messages per batch. Defaults to no limit.
+        max_rate (float, optional): Maximum handler calls per second. Defaults to no
+            limit.
+    """
+
+    def __init__(
+        self, max_delay: float = 0.02, max_size: int | None = None, max_rate: float | None = None
+    ):
+        super().__init__(max_rate)
+        self.max_delay = max_delay
+        self.max_size = max_size
+
+    def _take(self, pending: list) -> list:
+        size = self.max_size or len(pending)
+        batch = pending[:size]
+        del pending[:size]
+        return batch
+
+    def _full(self, pending: list) -> bool:
+        return self.max_size is not None and len(pending) >= self.max_size
+
+
+class Dispatcher:
+    """
+    Delivers one channel's messages to its handler following a `DispatchPolicy`, in a
+    task of its own. `push()` only queues the raw message, so messages that the policy
+    drops are never parsed. Handler errors are logged. Call `close()` when the channel
+    closes.
+
+    Dropped messages and the number waiting are recorded in the process' metrics
+    (see `get_metrics()`), labelled with `labels`.
+    """
+
+    def __init__(self, policy: DispatchPolicy, handler: Handler, name: str = "", **labels: str):
+        self.policy = policy
+        self.handler = handler
+        self.name = name
+        self.labels = labels
+        self.received = 0
+        self.dropped = 0  # Messages superseded before delivery
+        self._pending: list = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __repr__(self) -> str:
+        return (
+            f"<Dispatcher {self.name} {self.policy!r} received={self.received} "
+            f"dropped={self.dropped}>"
+        )
+
+    def push(self, message: Any):
+        """Queues a message for delivery."""
+        self.received += 1
+        dropped = self.policy._add(self._pending, message)
+        metrics = get_metrics()
+        if dropped:
+            self.dropped += dropped
+            metrics.inc("messages_dropped_total", dropped, **self.labels)
+        metrics.set("queue_depth", len(self._pending), queue="datachannel", **self.labels)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+    def close(self):
+        """Stops delivering messages; pending ones are dropped."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            logger.debug(f"{self}: closed.")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_call = loop.time()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # Wait for more messages, until there are enough or the first one is due.
+            deadline = loop.time() + self.policy.max_delay
+            while not self.policy._full(self._pending) and loop.time() < deadline:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+            if self.policy.max_rate:
+                await asyncio.sleep(max(0.0, next_call - loop.time()))
+                next_call = loop.time() + 1 / self.policy.max_rate
+            # Taken last, so messages that arrived while waiting are coalesced.
+            message = self.policy._take(self._pending)
+            get_metrics().set("queue_depth", len(self._pending), queue="datachannel", **self.labels)
+            try:
+                await self.handler(message)
+            except Exception as e:
+                logger.error(f"{self.name}: Error in data channel handler: {e}")
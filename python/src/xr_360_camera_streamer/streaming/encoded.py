@@ -0,0 +1,130 @@
+import asyncio
+
+import av
+from aiortc import MediaStreamTrack, RTCRtpCodecParameters
+from aiortc.mediastreams import MediaStreamError
+from aiortc.rtp import AnyRtcpPacket
+
+from .. import logger
+from ..metrics import get_metrics
+from ..utils.codecs import ENCODER_NAMES, VideoEncoder, codec_name
+from .rtcp import RecoveryStats, is_keyframe_request
+
+
+class EncodedTrack(MediaStreamTrack):
+    """
+    Wraps a video track and encodes its frames with a tuned `VideoEncoder`, so the
+    encoder, preset and options can be chosen per server instead of patching
+    aiortc's encoders globally.
+
+    Once the codec is negotiated (see `set_codec()`), the track yields encoded
+    packets, which aiortc sends as they are. It serves the peer's PLI/FIR itself
+    with an IDR on the next frame (recording the wait in `recovery`), and follows
+    `RateController` through `set_bandwidth()`. If the negotiated codec has no
+    encoder here, frames are passed through and aiortc encodes them.
+
+    Args:
+        track (MediaStreamTrack): The track producing `av.VideoFrame`s.
+        profile (str, optional): A key of `ENCODER_PROFILES`, e.g. "ultra-low-latency".
+        bitrate (int): Initial target bitrate in bits per second. Defaults to 2 Mbps.
+        max_bitrate (int, optional): Limit on the target bitrate, including the
+            one `set_bandwidth()` sets, e.g. the peer's bandwidth limit.
+        framerate (int): Nominal frame rate, used by rate control. Defaults to 30.
+        encoders (dict, optional): libavcodec encoder per codec, e.g.
+            `{"h264": "h264_nvenc"}` (see `select_encoder()`). Defaults to the
+            software encoders.
+        options (dict, optional): Extra libavcodec options, overriding the profile's.
+        keyframe_interval (float, optional): Seconds between periodic keyframes.
+            Defaults to the encoder's.
+        intra_refresh (bool): Whether to replace periodic keyframes with intra
+            refresh (see `VideoEncoder`). Defaults to False.
+    """
+
+    kind = "video"
+
+    def __init__(
+        self,
+        track: MediaStreamTrack,
+        profile: str | None = None,
+        bitrate: int = 2_000_000,
+        max_bitrate: int | None = None,
+        framerate: int = 30,
+        encoders: dict[str, str] | None = None,
+        options: dict[str, str] | None = None,
+        keyframe_interval: float | None = None,
+        intra_refresh: bool = False,
+    ):
+        super().__init__()
+        self.track = track
+        self.profile = profile
+        self.max_bitrate = max_bitrate
+        self.bitrate = bitrate if max_bitrate is None else min(bitrate, max_bitrate)
+        self.framerate = framerate
+        self.encoders = encoders or {}
+        self.options = options
+        self.keyframe_interval = keyframe_interval
+        self.intra_refresh = intra_refresh
+        self.encoder: VideoEncoder | None = None
+        self.recovery = RecoveryStats("EncodedTrack")
+        self._keyframe_requested = False
+
+    def set_codec(self, codec: RTCRtpCodecParameters | str | None):
+        """Creates the encoder for the codec negotiated with the peer (e.g. "video/H264")."""
+        name = codec_name(codec) if codec is not None else None
+        if name not in ENCODER_NAMES:
+            logger.info(f"EncodedTrack: no encoder for {name}, leaving encoding to aiortc.")
+            return
+        self.encoder = VideoEncoder(
+            name,
+            bitrate=self.bitrate,
+            framerate=self.framerate,
+            options=self.options,
+            profile=self.profile,
+            encoder=self.encoders.get(name),
+            keyframe_interval=self.keyframe_interval,
+            intra_refresh=self.intra_refresh,
+        )
+        self.recovery.joined()
+        logger.info(
+            f"EncodedTrack: encoding {name} with {self.encoder.encoder} "
+            f"(profile: {self.profile or 'default'})."
+        )
+
+    def set_bandwidth(self, bitrate: float):
+        """Sets the encoder's target bitrate, e.g. from a `RateController`."""
+        if self.max_bitrate is not None:
+            bitrate = min(bitrate, self.max_bitrate)
+        self.bitrate = int(bitrate)
+        if self.encoder is not None:
+            self.encoder.set_bitrate(self.bitrate)
+
+    def handle_rtcp(self, packet: AnyRtcpPacket):
+        """RTCP listener (see `add_rtcp_listener()`): forces an IDR on PLI/FIR."""
+        if is_keyframe_request(packet):
+            self.recovery.request()
+            self._keyframe_requested = True
+
+    def stop(self):
+        super().stop()
+        self.track.stop()
+
+    def _encode(self, frame: av.VideoFrame, force_keyframe: bool) -> av.Packet | None:
+        # Runs in a worker thread (with the caller's context, for the metrics' peer).
+        with get_metrics().stage("encode"):
+            return self.encoder.encode(frame, force_keyframe)
+
+    async def recv(self) -> av.Packet | av.VideoFrame:
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        while True:
+            frame = await self.track.recv()
+            if self.encoder is None:
+                return frame
+            force_keyframe, self._keyframe_requested = self._keyframe_requested, False
+            packet = await asyncio.to_thread(self._encode, frame, force_keyframe)
+            if packet is not None:
+                if packet.is_keyframe:
+                    self.recovery.keyframe_sent()
+                return packet
+            self._keyframe_requested |= force_keyframe  # Not served yet
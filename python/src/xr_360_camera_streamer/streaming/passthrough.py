@@ -0,0 +1,266 @@
+import asyncio
+from collections import deque
+
+import av
+import av.bitstream
+from aiortc import MediaStreamTrack, RTCRtpCodecParameters
+from aiortc.mediastreams import MediaStreamError
+
+from .. import logger
+from ..metrics import get_metrics
+from ..utils.codecs import codec_name
+
+# H.264 profiles every WebRTC H.264 decoder handles: the SDP offers Constrained Baseline
+# (profile-level-id 42e01f), so Main's CABAC entropy coding cannot be relied on.
+PASSTHROUGH_H264_PROFILES = ("Baseline", "Constrained Baseline")
+PASSTHROUGH_PIX_FMTS = ("yuv420p", "yuvj420p")
+
+
+def get_passthrough_codec(stream: av.video.stream.VideoStream) -> str | None:
+    """
+    Returns the codec name ("h264" or "vp8") if a video stream's packets can be
+    sent to WebRTC peers as they are, or None if it has to be transcoded.
+    """
+    context = stream.codec_context
+    name = context.name
+    reason = None
+    if name not in ("h264", "vp8"):
+        reason = f"codec '{name}' is not supported by WebRTC peers"
+    elif context.pix_fmt not in PASSTHROUGH_PIX_FMTS:
+        reason = f"pixel format '{context.pix_fmt}' is not 8-bit 4:2:0"
+    elif name == "h264" and context.profile not in PASSTHROUGH_H264_PROFILES:
+        reason = f"H.264 profile '{context.profile}' is not WebRTC-compatible"
+    elif name == "h264" and context.has_b_frames:
+        reason = "the stream has B-frames"
+    if reason is not None:
+        logger.info(f"Passthrough not possible, transcoding instead: {reason}.")
+        return None
+    return name
+
+
+class FileReader:
+    """
+    Reads a video file for pre-encoded streaming, one packet or frame at a time.
+
+    In passthrough mode `read()` returns the compressed packets (H.264 converted to
+    Annex B, as RTP packetization expects); otherwise it decodes them and returns
+    frames. Timestamps continue across loops, and are kept on one timeline
+    (`offset`, in seconds) so readers of different encodes of the same video can
+    take over from each other.
+
+    Not thread-safe; `read()` does blocking I/O and should run in a worker thread.
+
+    Args:
+        filepath (str): The path to the video file.
+        loop (bool): Whether to restart the file when it ends. Defaults to True.
+    """
+
+    def __init__(self, filepath: str, loop: bool = True):
+        self.filepath = filepath
+        self.loop = loop
+        self.offset = 0.0  # Added to every timestamp, in seconds
+        self.end_time = 0.0  # End of the latest item, in seconds (including the offset)
+        self._open()
+        self.passthrough_codec = get_passthrough_codec(self.stream)
+
+    @property
+    def codec(self) -> str:
+        """The file's codec name, e.g. "h264"."""
+        return self.stream.codec_context.name
+
+    def _open(self):
+        self.container = av.open(self.filepath)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"  # Only used when transcoding
+        self._packets = None
+        self._bsf = None
+        self._frames: deque[av.VideoFrame] = deque()  # Decoded, not yet returned
+        self._drained = False  # Whether the decoder was flushed at the end of the file
+
+    def seek(self, t: float):
+        """Moves to the keyframe at or before time `t` (seconds, on the shared timeline)."""
+        pts = int((t - self.offset) / self.stream.time_base)
+        self.container.seek(max(pts, 0), stream=self.stream)
+        self.stream.codec_context.flush_buffers()
+        self._packets = None
+        self._bsf = None
+        self._frames.clear()
+        self._drained = False
+
+    def read(self, passthrough: bool) -> av.Packet | av.VideoFrame | None:
+        """Returns the next packet (or decoded frame), or None at the end of the file."""
+        with get_metrics().stage("decode"):
+            return self._read(passthrough)
+
+    def _read(self, passthrough: bool) -> av.Packet | av.VideoFrame | None:
+        while True:
+            if self._frames:
+                return self._frames.popleft()
+            if self._packets is None:
+                self._packets = self.container.demux(self.stream)
+            for packet in self._packets:
+                if packet.size == 0:
+                    continue  # Flush packet at the end of the file
+                if passthrough:
+                    item = self._convert_packet(packet)
+                    if item is not None:
+                        return item
+                else:
+                    # A packet can decode to several frames (or none, while the
+                    # decoder buffers); keep them all.
+                    self._decode(packet)
+                    if self._frames:
+                        return self._frames.popleft()
+            if not passthrough and not self._drained:
+                # Frames the decoder still holds at the end of the file.
+                self._drained = True
+                self._decode(None)
+                if self._frames:
+                    return self._frames.popleft()
+            if not self.loop:
+                return None
+            # Restart the file, continuing the timeline where it ended.
+            self.container.close()
+            self._open()
+            self.offset = self.end_time
+
+    def _decode(self, packet: av.Packet | None):
+        for frame in self.stream.codec_context.decode(packet):
+            self._frames.append(self._retime(frame))
+
+    def _convert_packet(self, packet: av.Packet) -> av.Packet | None:
+        if self.codec == "h264":
+            # MP4/MKV store H.264 length-prefixed; RTP packetization expects Annex B
+            # start codes, with the parameter sets in front of every keyframe.
+            if self._bsf is None:
+                self._bsf = av.bitstream.BitStreamFilterContext("h264_mp4toannexb", self.stream)
+            is_keyframe = packet.is_keyframe  # The filter consumes the input packet
+            filtered = self._bsf.filter(packet)
+            if not filtered:
+                return None
+            packet = filtered[0]
+            packet.is_keyframe = is_keyframe
+        return self._retime(packet)
+
+    def _retime(self, item: av.Packet | av.VideoFrame):
+        time_base = self.stream.time_base
+        pts = item.pts if item.pts is not None else item.dts
+        item.pts = (pts or 0) + round(self.offset / time_base)
+        item.time_base = time_base
+        duration = getattr(item, "duration", None) or self._frame_duration()
+        self.end_time = max(self.end_time, float((item.pts + duration) * time_base))
+        return item
+
+    def _frame_duration(self) -> int:
+        rate = self.stream.average_rate or self.stream.guessed_rate or 30
+        return max(1, round(1 / (rate * self.stream.time_base)))
+
+    def close(self):
+        self.container.close()
+
+
+class Pacer:
+    """Releases items in real time according to their timestamps."""
+
+    def __init__(self):
+        self._start: float | None = None
+
+    def reset(self):
+        """Releases the next item right away and paces the following ones from it."""
+        self._start = None
+
+    async def wait(self, item: av.Packet | av.VideoFrame):
+        loop = asyncio.get_running_loop()
+        t = float(item.pts * item.time_base)
+        if self._start is None:
+            self._start = loop.time() - t
+        delay = self._start + t - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class PassthroughTrack(MediaStreamTrack):
+    """
+    A video track that streams a file's compressed packets without decoding or
+    re-encoding them.
+
+    For files that are already H.264 or VP8 at a WebRTC-compatible profile, the
+    packets are demuxed and handed to the RTP sender as pre-encoded frames, which
+    costs next to no CPU. The peer has to negotiate the file's codec (the server
+    prefers it, see `preferred_codecs`); if it negotiates another one, or the file
+    is not passthrough-compatible, the track decodes the file and yields frames
+    instead, which aiortc then encodes as usual.
+
+    Frames are paced by their timestamps, and the file optionally loops. When the
+    track is moved to a new connection (e.g. a resumed session, see `set_codec()`),
+    pacing restarts and packets are skipped until the next keyframe, which the new
+    peer needs to start decoding.
+
+    Args:
+        filepath (str): The path to the video file.
+        loop (bool): Whether to restart the file when it ends. Defaults to True.
+    """
+
+    kind = "video"
+
+    def __init__(self, filepath: str, loop: bool = True):
+        super().__init__()
+        self.filepath = filepath
+        self.reader = FileReader(filepath, loop=loop)
+        self.passthrough = False
+        self._pacer = Pacer()
+        self._needs_keyframe = True
+        self._reading = False
+
+    @property
+    def preferred_codecs(self) -> list[str]:
+        """Codecs to prefer during negotiation, so the file can be sent as-is."""
+        codec = self.reader.passthrough_codec
+        return [codec] if codec is not None else []
+
+    def set_codec(self, codec: RTCRtpCodecParameters | str | None):
+        """
+        Chooses passthrough or transcoding for the codec negotiated with the peer
+        (again if the track is moved to a new connection, e.g. a resumed session).
+        """
+        negotiated = codec_name(codec) if codec is not None else None
+        self.passthrough = negotiated is not None and negotiated == self.reader.passthrough_codec
+        # Don't send the frames missed while disconnected in a burst.
+        self._pacer.reset()
+        self._needs_keyframe = True
+        if self.passthrough:
+            logger.info(f"PassthroughTrack: sending {self.filepath} as-is ({negotiated}).")
+        else:
+            logger.info(
+                f"PassthroughTrack: peer negotiated {negotiated}, file is "
+                f"{self.reader.codec}; transcoding {self.filepath}."
+            )
+
+    def stop(self):
+        super().stop()
+        # A read in progress closes the file when it returns.
+        if not self._reading:
+            self.reader.close()
+
+    async def recv(self) -> av.Packet | av.VideoFrame:
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        while True:
+            self._reading = True
+            try:
+                item = await asyncio.to_thread(self.reader.read, self.passthrough)
+            finally:
+                self._reading = False
+            if self.readyState != "live":
+                self.reader.close()
+                raise MediaStreamError
+            if item is None:
+                self.stop()
+                raise MediaStreamError
+            if self.passthrough and self._needs_keyframe and not item.is_keyframe:
+                continue  # The peer cannot decode anything before a keyframe
+            self._needs_keyframe = False
+
+            await self._pacer.wait(item)
+            return item
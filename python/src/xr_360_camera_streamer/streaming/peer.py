@@ -0,0 +1,180 @@
+import asyncio
+import time
+from typing import Any
+
+from aiortc import MediaStreamTrack, RTCPeerConnection, RTCRtpSender
+from aiortc.mediastreams import MediaStreamError
+
+from .. import logger
+from ..metrics import get_metrics
+from .admission import PipelineSpec
+from .rate_control import RateController
+
+
+async def close_resource(resource: Any):
+    """
+    Releases a per-peer resource: stops it if it is a live track, then calls its
+    `on_close()` hook if it has one. A coroutine hook is awaited; a synchronous one
+    runs in a worker thread, as releasing decoders and the like can block. Errors
+    are logged, so one resource cannot keep the others from being released.
+    """
+    try:
+        if isinstance(resource, MediaStreamTrack) and resource.readyState != "ended":
+            resource.stop()
+        on_close = getattr(resource, "on_close", None)
+        if on_close is None:
+            return
+        if asyncio.iscoroutinefunction(on_close):
+            await on_close()
+        else:
+            await asyncio.to_thread(on_close)
+    except Exception as e:
+        logger.error(f"Could not release {resource!r}: {e}")
+
+
+class SessionTrack(MediaStreamTrack):
+    """
+    Forwards a session's video track to one connection. aiortc stops a sender's track
+    when the connection ends; stopping this one leaves the session's track running,
+    so a resumed session continues where it was (see `WebRTCServer`). The track's
+    hooks (`set_codec()`, `recovery`, ...) are available through this one.
+
+    Args:
+        track (MediaStreamTrack): The session's video track.
+    """
+
+    kind = "video"
+
+    def __init__(self, track: MediaStreamTrack):
+        super().__init__()
+        self.track = track
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes this class does not have. The track's own
+        # `on_close()` is the session's to call, not the connection's.
+        if name == "on_close" or name == "track":
+            raise AttributeError(name)
+        return getattr(self.track, name)
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+        return await self.track.recv()
+
+
+class Peer:
+    """
+    A client connected to a `WebRTCServer`, with what was negotiated and created for
+    it. The server keeps one per connection in `WebRTCServer.peers`.
+
+    The peer owns the resources created for it (its state, its video track, and
+    anything added with `add_resource()`), and releases them in `close()` when the
+    connection goes away (see `close_resource()`).
+
+    Args:
+        id (str): The peer's id, also used in log messages.
+        pc (RTCPeerConnection): The peer connection.
+        state (Any, optional): The state object created for the peer.
+        created_at (float, optional): When the peer's offer arrived, in
+            `time.monotonic()` seconds. Defaults to now.
+        session (str, optional): The session the peer belongs to, which outlives the
+            connection if the server keeps sessions (see `WebRTCServer`).
+    """
+
+    def __init__(
+        self,
+        id: str,
+        pc: RTCPeerConnection,
+        state: Any = None,
+        created_at: float | None = None,
+        session: str | None = None,
+    ):
+        self.id = id
+        self.pc = pc
+        self.state = state
+        self.session = session
+        self.created_at = time.monotonic() if created_at is None else created_at
+        self.time_to_answer: float | None = None  # Seconds from offer to answer
+        self.time_to_first_frame: float | None = None  # Seconds from offer to first frame
+        self.video_track: MediaStreamTrack | None = None
+        self.source_track: MediaStreamTrack | None = None  # `video_track` before wrapping
+        self.video_sender: RTCRtpSender | None = None
+        self.codec: str | None = None  # Negotiated video codec, e.g. "h264"
+        self.spec: PipelineSpec | None = None  # Spec admitted on (see `AdmissionController`)
+        self.max_bitrate: int | None = None  # Video bitrate limit, in bits per second
+        self.rate_controller: RateController | None = None
+        self.resources: list[Any] = []  # Released in reverse order by `close()`
+        self.closed = False
+
+    def __repr__(self) -> str:
+        return f"<Peer {self.id} codec={self.codec} state={self.pc.connectionState}>"
+
+    def to_dict(self) -> dict:
+        """A JSON-serializable summary of the peer."""
+        return {
+            "id": self.id,
+            "session": self.session,
+            "connection_state": self.pc.connectionState,
+            "codec": self.codec,
+            "spec": self.spec.name if self.spec is not None else None,
+            "max_bitrate": self.max_bitrate,
+            "time_to_answer": self.time_to_answer,
+            "time_to_first_frame": self.time_to_first_frame,
+        }
+
+    def add_resource(self, resource: Any):
+        """
+        Makes the peer release `resource` when it closes: a track is stopped, and an
+        `on_close()` hook (e.g. of a state object or track) is called.
+        """
+        if resource is not None and not any(r is resource for r in self.resources):
+            self.resources.append(resource)
+
+    async def close(self):
+        """
+        Stops the peer's video track and releases its resources, most recent first.
+        Safe to call more than once.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        resources = [r for r in self.resources if r is not self.video_track]
+        if self.video_track is not None:
+            resources.append(self.video_track)  # Stopped first, so the sender stops reading
+        self.resources = []
+        for resource in reversed(resources):
+            await close_resource(resource)
+        get_metrics().remove_peer(self.id)
+        logger.debug(f"{self.id}: Released its resources.")
+
+    def answered(self):
+        """Records the time to answer; called when the answer is sent."""
+        self.time_to_answer = time.monotonic() - self.created_at
+        logger.info(f"{self.id}: Answered in {self.time_to_answer * 1000:.0f}ms")
+
+    def watch_frames(self, track: MediaStreamTrack):
+        """
+        Watches the frames (or packets) the peer's sender takes from `track`: records
+        the time to first frame (the sender starts once the connection is
+        established), counts the frames, and times the "send" stage of each one (see
+        `get_metrics()`), from the sender taking it until it asks for the next. That
+        covers aiortc's encoding, unless the track yields encoded packets, and
+        packetization.
+        """
+        recv = track.recv
+        metrics = get_metrics()
+        taken_at = None
+
+        async def recv_watched():
+            nonlocal taken_at
+            if taken_at is not None:
+                metrics.observe_stage("send", time.perf_counter() - taken_at, self.id)
+            item = await recv()
+            if self.time_to_first_frame is None:
+                self.time_to_first_frame = time.monotonic() - self.created_at
+                logger.info(f"{self.id}: First video frame after {self.time_to_first_frame:.2f}s")
+            metrics.inc("frames_sent_total", peer=self.id)
+            taken_at = time.perf_counter()
+            return item
+
+        track.recv = recv_watched
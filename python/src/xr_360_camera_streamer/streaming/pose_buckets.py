@@ -0,0 +1,262 @@
+import asyncio
+import math
+from collections import Counter
+from collections.abc import Callable
+from fractions import Fraction
+
+import numpy as np
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+from av import VideoFrame
+
+from .. import logger
+from ..metrics import get_metrics
+from ..sources.shared import SharedSource
+from ..transforms.base import VideoTransform
+
+# RTP clock rate for video.
+VIDEO_CLOCK_RATE = 90000
+
+BucketKey = tuple[int, int, int]
+
+
+class PoseBuckets:
+    """
+    Quantizes viewer orientations into angular buckets.
+
+    Viewers whose poses fall into the same bucket see the same rendered view: the
+    one at the bucket's centre. A viewer only leaves its bucket once it is more than
+    `hysteresis` steps past the bucket's edge, so small head movements around an
+    edge do not make it flap between buckets.
+
+    Angles are in radians, in the same `rot` format the reprojection uses.
+
+    Args:
+        yaw_step (float): Bucket size around the vertical axis, in degrees.
+        pitch_step (float): Bucket size up/down, in degrees.
+        roll_step (float, optional): Bucket size for roll, in degrees. If None, roll
+            is not bucketed and views are rendered level.
+        hysteresis (float): Extra distance past the bucket edge, as a fraction of a
+            step, before a viewer migrates. Defaults to 0.25.
+    """
+
+    def __init__(
+        self,
+        yaw_step: float = 10.0,
+        pitch_step: float = 10.0,
+        roll_step: float | None = None,
+        hysteresis: float = 0.25,
+    ):
+        if yaw_step <= 0 or pitch_step <= 0 or (roll_step is not None and roll_step <= 0):
+            raise ValueError("Pose bucket steps must be positive.")
+        self.yaw_step = math.radians(yaw_step)
+        self.pitch_step = math.radians(pitch_step)
+        self.roll_step = None if roll_step is None else math.radians(roll_step)
+        self.hysteresis = hysteresis
+        # Number of yaw buckets around the full circle.
+        self._yaw_count = max(1, round(2 * math.pi / self.yaw_step))
+
+    def key(self, rot: dict[str, float]) -> BucketKey:
+        """Returns the bucket a pose falls into."""
+        yaw = round(rot["yaw"] / self.yaw_step) % self._yaw_count
+        pitch = round(rot["pitch"] / self.pitch_step)
+        roll = 0 if self.roll_step is None else round(rot["roll"] / self.roll_step)
+        return (yaw, pitch, roll)
+
+    def centre(self, key: BucketKey) -> dict[str, float]:
+        """Returns the pose a bucket is rendered at."""
+        yaw, pitch, roll = key
+        return {
+            "yaw": yaw * self.yaw_step,
+            "pitch": pitch * self.pitch_step,
+            "roll": 0.0 if self.roll_step is None else roll * self.roll_step,
+        }
+
+    def update(self, key: BucketKey | None, rot: dict[str, float]) -> BucketKey:
+        """
+        Returns the bucket a viewer currently in `key` should be in for pose `rot`.
+        """
+        if key is None:
+            return self.key(rot)
+        centre = self.centre(key)
+        limit = 0.5 + self.hysteresis
+        # Wrap the yaw difference into [-pi, pi).
+        yaw_delta = (rot["yaw"] - centre["yaw"] + math.pi) % (2 * math.pi) - math.pi
+        inside = (
+            abs(yaw_delta) <= limit * self.yaw_step
+            and abs(rot["pitch"] - centre["pitch"]) <= limit * self.pitch_step
+            and (
+                self.roll_step is None
+                or abs(rot["roll"] - centre["roll"]) <= limit * self.roll_step
+            )
+        )
+        return key if inside else self.key(rot)
+
+
+class PoseBucketHub:
+    """
+    Renders one shared output per occupied pose bucket.
+
+    With many viewers, most look in similar directions. Instead of a private
+    reprojection per peer, each `PoseBucketTrack` renders (once per frame) the view
+    of the bucket its viewer is in, and every other peer in that bucket reuses it.
+    Server cost then scales with the number of distinct views rather than the number
+    of viewers. The source is decoded once for all peers (see `SharedSource`) and
+    frames follow a shared clock, so peers in a bucket ask for the same frame.
+
+    Args:
+        source (SharedSource): The shared source, e.g. `SharedSource(FFmpegFileSource(...))`.
+        transform (VideoTransform): The view transform; called with `rot` set to the
+            bucket's centre. Shared by all buckets, so it should be thread-safe (the
+            library's remap-based transforms are).
+        buckets (PoseBuckets): The bucket layout.
+        frame_kwargs (callable, optional): Called with a frame's timestamp in seconds;
+            returns extra keyword arguments for the transform (e.g. `world_rot` from
+            an `OrientationTrack`).
+    """
+
+    def __init__(
+        self,
+        source: SharedSource,
+        transform: VideoTransform,
+        buckets: PoseBuckets,
+        frame_kwargs: Callable[[float], dict] | None = None,
+    ):
+        self.source = source
+        self.transform = transform
+        self.buckets = buckets
+        self.frame_kwargs = frame_kwargs
+        self._members: Counter[BucketKey] = Counter()
+        self._renders: dict[BucketKey, tuple[int, asyncio.Future]] = {}
+        self._clock_start: float | None = None
+
+    async def next_index(self, previous: int | None) -> int:
+        """
+        Waits until the frame after `previous` is due on the shared clock and returns
+        its index. Peers that fall behind skip ahead to the current frame.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._clock_start is None:
+            self._clock_start = now
+        index = int((now - self._clock_start) * self.source.fps)
+        if previous is not None and index <= previous:
+            index = previous + 1
+            await asyncio.sleep(self._clock_start + index / self.source.fps - now)
+        return index
+
+    def move(self, old: BucketKey | None, new: BucketKey | None):
+        """Moves a viewer between buckets (None means "not in a bucket")."""
+        if old is not None:
+            self._members[old] -= 1
+            if self._members[old] <= 0:
+                del self._members[old]
+                self._renders.pop(old, None)
+        if new is not None:
+            self._members[new] += 1
+        logger.debug(f"PoseBucketHub: viewer moved {old} -> {new}, {self.stats()}")
+
+    def stats(self) -> dict:
+        """Returns the number of viewers and occupied buckets."""
+        return {"viewers": sum(self._members.values()), "buckets": len(self._members)}
+
+    async def render(self, key: BucketKey, index: int) -> np.ndarray | None:
+        """
+        Returns the view of bucket `key` for frame `index`, rendering it only if no
+        other peer has already done so.
+
+        NOTE: The returned array is shared between peers; do not modify it.
+
+        Returns:
+            np.ndarray | None: The rendered frame, or None once the source has ended.
+        """
+        entry = self._renders.get(key)
+        while entry is not None and entry[0] >= index:
+            try:
+                return await asyncio.shield(entry[1])
+            except asyncio.CancelledError:
+                if not entry[1].cancelled():
+                    raise  # This peer was cancelled
+            # The rendering peer was cancelled; render (or wait for another) instead.
+            entry = self._renders.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._renders[key] = (index, future)
+        try:
+            frame = await self.source.read(index)
+            image = None
+            if frame is not None:
+                kwargs = {"rot": self.buckets.centre(key)}
+                if self.frame_kwargs is not None:
+                    kwargs.update(self.frame_kwargs(index / self.source.fps))
+                image = await asyncio.to_thread(self._render, frame, kwargs)
+        except BaseException as e:
+            # Let the next peer render it again instead of waiting on this attempt.
+            if self._renders.get(key) == (index, future):
+                del self._renders[key]
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Retrieved by waiting peers, if any; avoid "never retrieved" warnings.
+                future.exception()
+            else:
+                future.cancel()  # E.g. the peer disconnected mid-render
+            raise
+        future.set_result(image)
+        return image
+
+    def _render(self, frame: np.ndarray, kwargs: dict) -> np.ndarray:
+        # Transforms reuse per-thread output buffers; copy before sharing across peers.
+        with get_metrics().stage("transform", peer="shared"):
+            return np.array(self.transform.transform(frame, **kwargs))
+
+
+class PoseBucketTrack(MediaStreamTrack):
+    """
+    A per-peer video track that streams the shared view of its viewer's pose bucket.
+
+    Args:
+        hub (PoseBucketHub): The hub shared by all bucketed peers.
+        pose (callable): Returns the viewer's current `rot` dict, e.g. `state.get_rot`.
+    """
+
+    kind = "video"
+
+    def __init__(self, hub: PoseBucketHub, pose: Callable[[], dict[str, float]]):
+        super().__init__()
+        self.hub = hub
+        self.pose = pose
+        self.key: BucketKey | None = None
+        self._index: int | None = None
+
+    @property
+    def rot(self) -> dict[str, float] | None:
+        """The pose the frames are currently rendered at (the bucket centre)."""
+        return None if self.key is None else self.hub.buckets.centre(self.key)
+
+    def stop(self):
+        if self.readyState != "ended":
+            self.hub.move(self.key, None)
+            self.key = None
+        super().stop()
+
+    async def recv(self) -> VideoFrame:
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        self._index = await self.hub.next_index(self._index)
+        key = self.hub.buckets.update(self.key, self.pose())
+        if key != self.key:
+            self.hub.move(self.key, key)
+            self.key = key
+
+        image = await self.hub.render(key, self._index)
+        if image is None:
+            self.stop()
+            raise MediaStreamError
+
+        # Timestamps come from the shared clock, so they are the same for every peer.
+        with get_metrics().stage("convert"):
+            frame = VideoFrame.from_ndarray(image, format="rgb24")
+        frame.pts = int(self._index * VIDEO_CLOCK_RATE / self.hub.source.fps)
+        frame.time_base = Fraction(1, VIDEO_CLOCK_RATE)
+        return frame
@@ -0,0 +1,272 @@
+import math
+from collections import deque
+from collections.abc import Callable
+
+from aiortc import MediaStreamTrack, RTCRtpSender, clock
+from aiortc.mediastreams import MediaStreamError
+from aiortc.rtp import (
+    RTCP_PSFB_APP,
+    AnyRtcpPacket,
+    RtcpPsfbPacket,
+    RtcpReceiverInfo,
+    RtcpRrPacket,
+    RtcpSrPacket,
+    unpack_remb_fci,
+)
+from av import VideoFrame
+
+from .. import logger
+from ..metrics import current_peer, get_metrics
+from .rtcp import add_rtcp_listener
+
+# Resolution scales the controller steps through when the bitrate gets too low.
+SCALE_STEPS = (1.0, 0.75, 0.5, 0.375, 0.25)
+
+# How much more bitrate than needed before stepping resolution back up.
+UPSCALE_MARGIN = 1.5
+
+# Number of receiver reports (about one per second) the baseline RTT is taken over, so a
+# lasting change of route is not mistaken for congestion forever.
+RTT_WINDOW = 30
+
+
+class RateController:
+    """
+    Per-peer congestion control driven by the peer's RTCP feedback.
+
+    The target bitrate follows a loss-based controller (as in Google Congestion
+    Control): it backs off in proportion to packet loss above 10%, grows by 8% per
+    report while loss is below 2%, and also backs off when the round-trip time
+    rises well above its minimum (queues building up). It never exceeds the peer's
+    REMB estimate.
+
+    The bitrate is passed to the sent track's `set_bandwidth()`, which tracks that
+    encode their own frames (`EncodedTrack`) or send pre-encoded packets (e.g.
+    `RenditionTrack`) implement. aiortc's built-in encoders cannot be steered from
+    outside, so `WebRTCServer` sends frames through an `EncodedTrack` under rate control.
+    When the bitrate gets too low for the video's size and frame rate
+    (`min_bits_per_pixel`), the controller asks for a smaller resolution and, at
+    the smallest one, a lower frame rate; `AdaptiveTrack` applies those, and
+    listeners can apply them earlier in the pipeline instead.
+
+    Args:
+        start_bitrate (float): Bitrate before any feedback, in bits per second.
+        min_bitrate (float): Lower bound of the target bitrate.
+        max_bitrate (float): Upper bound of the target bitrate.
+        min_bits_per_pixel (float): Bits per pixel per frame below which the
+            resolution (then frame rate) is reduced. Defaults to 0.03.
+        min_scale (float): Smallest resolution scale. Defaults to 0.25.
+        min_framerate (float): Lowest frame rate. Defaults to 10.
+        name (str): Name used in log messages, e.g. the peer connection's id.
+    """
+
+    def __init__(
+        self,
+        start_bitrate: float = 1_000_000,
+        min_bitrate: float = 150_000,
+        max_bitrate: float = 8_000_000,
+        min_bits_per_pixel: float = 0.03,
+        min_scale: float = 0.25,
+        min_framerate: float = 10.0,
+        name: str = "RateController",
+    ):
+        self.bitrate = min(max(start_bitrate, min_bitrate), max_bitrate)
+        self.min_bitrate = min_bitrate
+        self.max_bitrate = max_bitrate
+        self.min_bits_per_pixel = min_bits_per_pixel
+        self.scale_steps = [s for s in SCALE_STEPS if s >= min_scale] or [1.0]
+        self.min_framerate = min_framerate
+        self.name = name
+
+        self.loss = 0.0  # Fraction of packets lost, from the latest receiver report
+        self.rtt: float | None = None  # Smoothed round-trip time, in seconds
+        self.remb: float | None = None  # Receiver's bandwidth estimate, in bits per second
+        self.scale = 1.0  # Requested resolution scale
+        self.framerate: float | None = None  # Requested frame rate (None: unchanged)
+
+        self._rtts: deque[float] = deque(maxlen=RTT_WINDOW)
+        self._format: tuple[int, int, float] | None = None  # Width, height, frame rate
+        self._sender: RTCRtpSender | None = None
+        self._listeners: list[Callable[[RateController], None]] = []
+
+    def __repr__(self) -> str:
+        rtt = "?" if self.rtt is None else f"{self.rtt * 1000:.0f}ms"
+        fps = "source" if self.framerate is None else round(self.framerate)
+        return (
+            f"<RateController {self.bitrate / 1e6:.2f}Mbps loss={self.loss:.0%} rtt={rtt} "
+            f"scale={self.scale} fps={fps}>"
+        )
+
+    def attach(self, sender: RTCRtpSender):
+        """Starts controlling a sender, once the offer/answer exchange is done."""
+        self._sender = sender
+        add_rtcp_listener(sender, self.handle_rtcp)
+        self._apply()
+
+    def add_listener(self, callback: Callable[["RateController"], None]):
+        """Calls `callback(controller)` whenever the bitrate, scale or frame rate changes."""
+        self._listeners.append(callback)
+
+    def set_format(self, width: int, height: int, framerate: float):
+        """Tells the controller the full-resolution size and frame rate of the video."""
+        if self._format != (width, height, framerate):
+            self._format = (width, height, framerate)
+            self._update_constraints()
+
+    def handle_rtcp(self, packet: AnyRtcpPacket):
+        """RTCP listener (see `add_rtcp_listener()`)."""
+        if isinstance(packet, (RtcpRrPacket, RtcpSrPacket)):
+            ssrc = self._sender._ssrc if self._sender is not None else None
+            for report in packet.reports:
+                if ssrc is None or report.ssrc == ssrc:
+                    self._on_report(report)
+        elif isinstance(packet, RtcpPsfbPacket) and packet.fmt == RTCP_PSFB_APP:
+            try:
+                self.remb, _ = unpack_remb_fci(packet.fci)
+            except ValueError:
+                return
+            if self.bitrate > self.remb:
+                self._set_bitrate(self.remb)
+
+    def _on_report(self, report: RtcpReceiverInfo):
+        self.loss = report.fraction_lost / 256
+        if report.lsr:
+            # Round-trip time from the last sender report the peer received (RFC 3550
+            # 6.4.1), in the middle 32 bits of NTP time (1/65536 s units).
+            now = (clock.current_ntp_time() >> 16) & 0xFFFFFFFF
+            rtt = ((now - report.lsr - report.dlsr) & 0xFFFFFFFF) / 65536
+            if rtt < 60:
+                self.rtt = rtt if self.rtt is None else 0.8 * self.rtt + 0.2 * rtt
+                self._rtts.append(rtt)
+
+        min_rtt = min(self._rtts, default=None)
+        delayed = (
+            self.rtt is not None
+            and min_rtt is not None
+            and self.rtt > 2 * min_rtt
+            and self.rtt - min_rtt > 0.05
+        )
+        bitrate = self.bitrate
+        if self.loss > 0.1:
+            bitrate *= 1 - 0.5 * self.loss
+        elif delayed:
+            bitrate *= 0.85
+        elif self.loss < 0.02:
+            bitrate *= 1.08
+        if self.remb is not None:
+            bitrate = min(bitrate, self.remb)
+        self._set_bitrate(bitrate)
+
+    def _set_bitrate(self, bitrate: float):
+        bitrate = min(max(bitrate, self.min_bitrate), self.max_bitrate)
+        if bitrate == self.bitrate:
+            return
+        self.bitrate = bitrate
+        logger.debug(f"{self.name}: {self}")
+        self._update_constraints()
+        self._apply()
+
+    def _update_constraints(self):
+        if self._format is None:
+            return
+        width, height, framerate = self._format
+
+        def fits(scale: float, margin: float = 1.0) -> bool:
+            needed = self.min_bits_per_pixel * width * height * scale**2 * framerate
+            return self.bitrate >= needed * margin
+
+        # The largest scale the bitrate can afford, with a margin for scaling back up
+        # so the resolution does not flap (every change costs a keyframe).
+        scale = self.scale_steps[-1]
+        for step in self.scale_steps:
+            if fits(step, 1.0 if step <= self.scale else UPSCALE_MARGIN):
+                scale = step
+                break
+        max_framerate = None
+        if not fits(scale):
+            # Even the smallest resolution needs too much: lower the frame rate too.
+            pixels = width * height * scale**2
+            max_framerate = max(
+                self.min_framerate, self.bitrate / (self.min_bits_per_pixel * pixels)
+            )
+
+        changed = scale != self.scale or (max_framerate is None) != (self.framerate is None)
+        self.scale, self.framerate = scale, max_framerate
+        if changed:
+            logger.info(f"{self.name}: adapting video to {self}")
+
+    def _apply(self):
+        for callback in self._listeners:
+            callback(self)
+        if self._sender is None:
+            return
+        track = self._sender.track
+        if hasattr(track, "set_bandwidth"):
+            track.set_bandwidth(self.bitrate)
+
+
+class AdaptiveTrack(MediaStreamTrack):
+    """
+    Wraps a video track and applies a `RateController`'s requests to its frames:
+    frames are downscaled to the requested resolution scale and dropped to the
+    requested frame rate before aiortc encodes them.
+
+    Args:
+        track (MediaStreamTrack): The track producing full-size `av.VideoFrame`s.
+        controller (RateController): The peer's controller.
+    """
+
+    kind = "video"
+
+    def __init__(self, track: MediaStreamTrack, controller: RateController):
+        super().__init__()
+        self.track = track
+        self.controller = controller
+        self._last_time: float | None = None  # Timestamp of the previous source frame
+        self._due: float | None = None  # Timestamp from which the next frame is sent
+        self._framerate: float | None = None
+
+    def stop(self):
+        super().stop()
+        self.track.stop()
+
+    async def recv(self) -> VideoFrame:
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        while True:
+            frame = await self.track.recv()
+            t = float(frame.pts * frame.time_base) if frame.pts is not None else None
+            if t is not None and self._last_time is not None and t > self._last_time:
+                # Smoothed source frame rate, from the timestamps.
+                rate = 1 / (t - self._last_time)
+                self._framerate = (
+                    rate if self._framerate is None else 0.9 * self._framerate + 0.1 * rate
+                )
+            self._last_time = t
+            if self._framerate is not None:
+                self.controller.set_format(frame.width, frame.height, round(self._framerate))
+
+            max_rate = self.controller.framerate
+            if max_rate is None or t is None:
+                self._due = None
+                break
+            if self._due is not None and t < self._due:
+                metrics = get_metrics()
+                metrics.inc("frames_dropped_total", reason="rate_control", peer=current_peer.get())
+                continue  # Dropped
+            # Frames are due every 1 / max_rate on average, so the rate is met even when
+            # it is not a whole fraction of the source's.
+            late = self._due is None or t - self._due >= 1 / max_rate
+            self._due = (t if late else self._due) + 1 / max_rate
+            break
+
+        scale = self.controller.scale
+        if scale < 1:
+            # Even dimensions, as the encoders' 4:2:0 chroma subsampling requires.
+            width = max(2, math.floor(frame.width * scale / 2) * 2)
+            height = max(2, math.floor(frame.height * scale / 2) * 2)
+            scaled = frame.reformat(width=width, height=height)
+            scaled.pts, scaled.time_base = frame.pts, frame.time_base
+            frame = scaled
+        return frame
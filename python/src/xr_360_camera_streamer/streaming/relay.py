@@ -0,0 +1,281 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+import av
+from aiortc import MediaStreamTrack, RTCRtpCodecParameters
+from aiortc.mediastreams import MediaStreamError
+from aiortc.rtp import AnyRtcpPacket
+
+from .. import logger
+from ..metrics import current_peer, get_metrics
+from ..utils.codecs import VideoEncoder, codec_name
+from .rtcp import RecoveryStats, is_keyframe_request
+
+# Encoded frames buffered per peer before it is considered too slow to keep up.
+RELAY_QUEUE_SIZE = 30
+
+
+class RelayTrack(MediaStreamTrack):
+    """
+    A per-peer track that yields the shared, pre-encoded packets of a
+    `BroadcastRelay`. Created with `BroadcastRelay.subscribe()`.
+
+    The track starts delivering at the next keyframe once its codec is known (see
+    `set_codec()`), and resyncs at a keyframe if the peer falls too far behind.
+    The time it waits for keyframes is recorded in `recovery`.
+    """
+
+    kind = "video"
+
+    def __init__(self, relay: "BroadcastRelay"):
+        super().__init__()
+        self.relay = relay
+        self.codec: str | None = None
+        self._queue: asyncio.Queue[av.Packet | None] = asyncio.Queue(maxsize=RELAY_QUEUE_SIZE)
+        self._needs_keyframe = True
+        self.recovery = RecoveryStats("RelayTrack")
+        self.peer = current_peer.get()  # Subscribed for this peer (see `WebRTCServer`)
+
+    def set_codec(self, codec: RTCRtpCodecParameters | str):
+        """Starts delivery in the codec negotiated with the peer (e.g. "video/H264")."""
+        self.codec = codec_name(codec)
+        self.recovery.joined()
+        self.relay._attach(self)
+
+    def handle_rtcp(self, packet: AnyRtcpPacket):
+        """RTCP listener (see `add_rtcp_listener()`): turns PLI/FIR into a shared IDR request."""
+        if is_keyframe_request(packet) and self.codec is not None:
+            self.recovery.request()
+            self.relay.request_keyframe(self.codec)
+
+    def _deliver(self, packet: av.Packet):
+        if self._needs_keyframe:
+            if not packet.is_keyframe:
+                return
+            self._needs_keyframe = False
+        if packet.is_keyframe:
+            self.recovery.keyframe_sent()
+        metrics = get_metrics()
+        try:
+            self._queue.put_nowait(packet)
+        except asyncio.QueueFull:
+            # Dropping a single inter frame would corrupt the picture until the next
+            # keyframe anyway, so drop the backlog and resync at a keyframe.
+            dropped = self._queue.qsize() + 1
+            metrics.inc("frames_dropped_total", dropped, reason="relay_backlog", peer=self.peer)
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._needs_keyframe = True
+            self.recovery.request()
+            self.relay.request_keyframe(self.codec)
+            logger.warning("RelayTrack: peer fell behind, resyncing at the next keyframe")
+        metrics.set("queue_depth", self._queue.qsize(), queue="relay", peer=self.peer)
+
+    def on_close(self):
+        # Called when the peer is cleaned up (see `close_resource()`), even if the
+        # track already ended or never got its codec, e.g. after a failed offer.
+        self.relay._detach(self)
+
+    def stop(self):
+        if self.readyState != "ended":
+            self.relay._detach(self)
+            # Wake up a pending `recv()`.
+            try:
+                self._queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        super().stop()
+
+    async def recv(self) -> av.Packet:
+        if self.readyState != "live":
+            raise MediaStreamError
+        packet = await self._queue.get()
+        if packet is None:
+            raise MediaStreamError
+        return packet
+
+
+class BroadcastRelay:
+    """
+    Encodes a video track once and forwards the encoded packets to every subscribed
+    peer, instead of running one decode and one encode per peer.
+
+    One encoder runs per codec in use (peers that negotiated H.264 share one, VP8
+    peers share another), fed from a single read of the source track. Frames are
+    paced by their timestamps. Keyframe requests from any peer (PLI/FIR, a new
+    subscriber, or a peer that fell behind) force an IDR on the shared encoder, at
+    most once per `min_keyframe_interval`; requests inside the interval are
+    remembered and served when it ends.
+
+    Args:
+        source (MediaStreamTrack): A track producing `av.VideoFrame`s with `pts` and
+            `time_base` set (e.g. a file track). The relay owns it.
+        bitrate (int): Target bitrate of the shared encoders, in bits per second.
+        framerate (int): Nominal frame rate, used by rate control.
+        min_keyframe_interval (float): Minimum time between forced keyframes, in
+            seconds. Defaults to 0.5.
+        pace (bool): Whether to release frames in real time according to their
+            timestamps. Disable if the source track paces itself. Defaults to True.
+        profile (str, optional): Encoder tuning profile, a key of `ENCODER_PROFILES`.
+        encoders (dict, optional): libavcodec encoder per codec, e.g.
+            `{"h264": "h264_nvenc"}`. Defaults to the software encoders.
+        keyframe_interval (float, optional): Seconds between periodic keyframes.
+            Defaults to the encoder's.
+        intra_refresh (bool): Whether to replace periodic keyframes with intra
+            refresh (see `VideoEncoder`). Defaults to False.
+    """
+
+    def __init__(
+        self,
+        source: MediaStreamTrack,
+        bitrate: int = 2_000_000,
+        framerate: int = 30,
+        min_keyframe_interval: float = 0.5,
+        pace: bool = True,
+        profile: str | None = None,
+        encoders: dict[str, str] | None = None,
+        keyframe_interval: float | None = None,
+        intra_refresh: bool = False,
+    ):
+        self.source = source
+        self.bitrate = bitrate
+        self.framerate = framerate
+        self.min_keyframe_interval = min_keyframe_interval
+        self.pace = pace
+        self.profile = profile
+        self.encoders = encoders or {}
+        self.keyframe_interval = keyframe_interval
+        self.intra_refresh = intra_refresh
+        # Only changed by `_encode()`, which holds `_encode_lock`: a cancelled run's
+        # last encode may still be going when a new run starts.
+        self._encoders: dict[str, VideoEncoder] = {}
+        self._encode_lock = threading.Lock()
+        self._subscribers: defaultdict[str, set[RelayTrack]] = defaultdict(set)
+        self._pending: set[RelayTrack] = set()
+        self._keyframe_requests: set[str] = set()
+        self._keyframe_lock = threading.Lock()
+        self._last_keyframe: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self) -> RelayTrack:
+        """Returns a new per-peer track. Call `set_codec()` on it once negotiated."""
+        track = RelayTrack(self)
+        self._pending.add(track)
+        return track
+
+    def _attach(self, track: RelayTrack):
+        self._pending.discard(track)
+        self._subscribers[track.codec].add(track)
+        # A new subscriber can only start decoding at a keyframe.
+        self.request_keyframe(track.codec)
+        logger.info(f"BroadcastRelay: subscriber joined ({track.codec}), {self.stats()}")
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def _detach(self, track: RelayTrack):
+        if track in self._pending:
+            self._pending.discard(track)
+            return
+        subscribers = self._subscribers.get(track.codec)
+        if subscribers is None or track not in subscribers:
+            return  # Already detached
+        subscribers.discard(track)
+        if not subscribers:
+            del self._subscribers[track.codec]
+        logger.info(f"BroadcastRelay: subscriber left ({track.codec}), {self.stats()}")
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def request_keyframe(self, codec: str):
+        """Asks the shared encoder of `codec` for an IDR frame (rate limited)."""
+        with self._keyframe_lock:
+            self._keyframe_requests.add(codec)
+
+    def stats(self) -> dict[str, int]:
+        """Number of subscribed peers per codec."""
+        return {codec: len(tracks) for codec, tracks in self._subscribers.items()}
+
+    def _encode(self, codecs: list[str], frame: av.VideoFrame) -> list[av.Packet | None]:
+        # Runs in a worker thread. Codecs are encoded one after another because the
+        # encoders set the frame's picture type.
+        with self._encode_lock:
+            # Drop idle encoders; a later subscriber starts from a keyframe anyway.
+            for codec in [c for c in self._encoders if c not in codecs]:
+                del self._encoders[codec]
+            return [self._encode_one(codec, frame) for codec in codecs]
+
+    def _encode_one(self, codec: str, frame: av.VideoFrame) -> av.Packet | None:
+        now = time.monotonic()
+        encoder = self._encoders.get(codec)
+        if encoder is None:
+            encoder = self._encoders[codec] = VideoEncoder(
+                codec,
+                bitrate=self.bitrate,
+                framerate=self.framerate,
+                profile=self.profile,
+                encoder=self.encoders.get(codec),
+                keyframe_interval=self.keyframe_interval,
+                intra_refresh=self.intra_refresh,
+            )
+        with self._keyframe_lock:
+            force_keyframe = (
+                codec in self._keyframe_requests
+                and now - self._last_keyframe.get(codec, float("-inf"))
+                >= self.min_keyframe_interval
+            )
+        with get_metrics().stage("encode"):
+            packet = encoder.encode(frame, force_keyframe=force_keyframe)
+        if packet is not None and packet.is_keyframe:
+            # Any keyframe, forced or not, serves every pending request.
+            with self._keyframe_lock:
+                self._keyframe_requests.discard(codec)
+                self._last_keyframe[codec] = now
+        return packet
+
+    async def _run(self):
+        # Started for the first subscriber, but reads and encodes for all of them.
+        current_peer.set("broadcast")
+        loop = asyncio.get_running_loop()
+        start = None
+        try:
+            while True:
+                frame = await self.source.recv()
+                if self.pace and frame.pts is not None and frame.time_base is not None:
+                    t = float(frame.pts * frame.time_base)
+                    if start is None:
+                        start = loop.time() - t
+                    delay = start + t - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                codecs = list(self._subscribers)
+                # In the relay's context, so its stage timings are labelled "broadcast".
+                packets = await asyncio.to_thread(self._encode, codecs, frame)
+                for codec, packet in zip(codecs, packets, strict=True):
+                    if packet is None:
+                        continue
+                    for track in list(self._subscribers.get(codec, ())):
+                        track._deliver(packet)
+        except MediaStreamError:
+            logger.info("BroadcastRelay: source ended.")
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            logger.error(f"BroadcastRelay: stopped on error: {e!r}")
+        # End every subscriber's stream (see `RelayTrack.stop()`).
+        for track in [t for tracks in self._subscribers.values() for t in tracks]:
+            track.stop()
+
+    async def close(self):
+        """Stops all subscribers and the source track."""
+        for track in [t for tracks in self._subscribers.values() for t in tracks]:
+            track.stop()
+        for track in list(self._pending):
+            track.stop()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.source.stop()
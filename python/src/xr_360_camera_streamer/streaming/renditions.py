@@ -0,0 +1,471 @@
+import asyncio
+import json
+import time
+from fractions import Fraction
+from pathlib import Path
+
+import av
+from aiortc import MediaStreamTrack, RTCRtpCodecParameters
+from aiortc.mediastreams import MediaStreamError
+from aiortc.rtp import RTCP_PSFB_APP, AnyRtcpPacket, RtcpPsfbPacket, unpack_remb_fci
+
+from .. import logger
+from ..utils.codecs import codec_name
+from .passthrough import FileReader, Pacer
+from .rtcp import RecoveryStats, is_keyframe_request
+
+MANIFEST_NAME = "manifest.json"
+
+# Output heights of the default ladder; those above the source's height are skipped.
+DEFAULT_HEIGHTS = (2160, 1440, 1080, 720, 480)
+
+# Default bitrate per pixel per frame (about 6 Mbps for 1080p30).
+DEFAULT_BITS_PER_PIXEL = 0.1
+
+# Container and libavcodec encoder per rendition codec.
+_CONTAINERS = {"h264": "mp4", "vp8": "webm"}
+_ENCODERS = {"h264": "libx264", "vp8": "libvpx"}
+
+
+def get_renditions_dir(filepath: str) -> Path:
+    """Returns where the renditions of a video are stored: `<name>.renditions/` next to it."""
+    path = Path(filepath)
+    return path.parent / f"{path.stem}.renditions"
+
+
+class Rendition:
+    """
+    One pre-transcoded encode of a video.
+
+    Args:
+        path (str): The path to the encoded file.
+        codec (str): "h264" or "vp8".
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        bitrate (int): Target bitrate in bits per second.
+    """
+
+    def __init__(self, path: str, codec: str, width: int, height: int, bitrate: int):
+        self.path = str(path)
+        self.codec = codec
+        self.width = width
+        self.height = height
+        self.bitrate = bitrate
+
+    @property
+    def name(self) -> str:
+        return f"{self.height}p_{self.codec}"
+
+    def __repr__(self) -> str:
+        return f"<Rendition {self.name} {self.width}x{self.height} {self.bitrate / 1e6:.1f}Mbps>"
+
+    def to_dict(self, root: Path) -> dict:
+        return {
+            "path": str(Path(self.path).relative_to(root)),
+            "codec": self.codec,
+            "width": self.width,
+            "height": self.height,
+            "bitrate": self.bitrate,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, root: Path) -> "Rendition":
+        return cls(
+            path=str(root / data["path"]),
+            codec=data["codec"],
+            width=data["width"],
+            height=data["height"],
+            bitrate=data["bitrate"],
+        )
+
+
+class RenditionLadder:
+    """
+    A set of renditions of one video, with keyframes at the same timestamps in
+    every rendition so a stream can switch between them at any keyframe.
+
+    Ladders are built with `build_renditions()` (or `xr-streamer build`) and
+    described by a JSON manifest stored next to the renditions.
+
+    Args:
+        renditions (list[Rendition]): The renditions.
+        keyframe_interval (float): Time between keyframes, in seconds.
+    """
+
+    def __init__(self, renditions: list[Rendition], keyframe_interval: float):
+        if not renditions:
+            raise ValueError("A rendition ladder needs at least one rendition.")
+        self.renditions = sorted(renditions, key=lambda r: r.bitrate)
+        self.keyframe_interval = keyframe_interval
+
+    def __repr__(self) -> str:
+        return f"<RenditionLadder {[r.name for r in self.renditions]}>"
+
+    @property
+    def codecs(self) -> list[str]:
+        """The codecs renditions are available in."""
+        return list(dict.fromkeys(r.codec for r in self.renditions))
+
+    def select(self, codec: str | None, bitrate: float) -> Rendition:
+        """
+        Returns the best rendition for a peer: the highest-bitrate one in its codec
+        that fits in `bitrate`, or the lowest one if none fits. If no rendition is
+        in the peer's codec, all renditions are considered (they are transcoded).
+        """
+        candidates = [r for r in self.renditions if r.codec == codec] or self.renditions
+        fitting = [r for r in candidates if r.bitrate <= bitrate]
+        return fitting[-1] if fitting else candidates[0]
+
+    def save(self, manifest_path: str | Path):
+        root = Path(manifest_path).parent
+        data = {
+            "keyframe_interval": self.keyframe_interval,
+            "renditions": [r.to_dict(root) for r in self.renditions],
+        }
+        with open(manifest_path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "RenditionLadder":
+        """
+        Loads a ladder from its manifest, or from the video it was built from (the
+        manifest is then looked up in `get_renditions_dir()`).
+        """
+        path = Path(path)
+        if path.suffix != ".json":
+            path = get_renditions_dir(path) / MANIFEST_NAME
+        if not path.exists():
+            raise FileNotFoundError(
+                f"Rendition manifest not found at {path}. Build it with `xr-streamer build`."
+            )
+        with open(path) as f:
+            data = json.load(f)
+        renditions = [Rendition.from_dict(r, path.parent) for r in data["renditions"]]
+        ladder = cls(renditions, data["keyframe_interval"])
+        logger.info(f"Loaded {ladder} from {path}")
+        return ladder
+
+
+def build_renditions(
+    filepath: str,
+    heights: tuple[int, ...] = DEFAULT_HEIGHTS,
+    codecs: tuple[str, ...] = ("h264",),
+    keyframe_interval: float = 1.0,
+    bits_per_pixel: float = DEFAULT_BITS_PER_PIXEL,
+    output_dir: str | None = None,
+) -> RenditionLadder:
+    """
+    Transcodes a video into a rendition ladder and writes its manifest.
+
+    The source is decoded once and every frame is scaled and encoded into all
+    renditions. Encodes are WebRTC-compatible so they can be streamed without
+    transcoding (H.264 Constrained Baseline, no B-frames), with keyframes forced at
+    the same frames in every rendition.
+
+    Args:
+        filepath (str): The source video.
+        heights (tuple[int, ...]): Output heights; those above the source's height
+            are skipped (the source height is used if none is left). The aspect ratio
+            is preserved.
+        codecs (tuple[str, ...]): Codecs to encode each height in ("h264", "vp8").
+        keyframe_interval (float): Time between keyframes, in seconds. Shorter means
+            faster switching and joining, at some cost in quality.
+        bits_per_pixel (float): Target bitrate per pixel per frame.
+        output_dir (str, optional): Where to write the renditions. Defaults to
+            `get_renditions_dir(filepath)`.
+
+    Returns:
+        RenditionLadder: The ladder that was built.
+    """
+    for codec in codecs:
+        if codec not in _ENCODERS:
+            raise ValueError(f"Unsupported rendition codec '{codec}'. Choose from {_ENCODERS}.")
+    root = Path(output_dir) if output_dir is not None else get_renditions_dir(filepath)
+    root.mkdir(parents=True, exist_ok=True)
+
+    source = av.open(filepath)
+    stream = source.streams.video[0]
+    stream.thread_type = "AUTO"
+    rate = stream.average_rate or stream.guessed_rate or Fraction(30)
+    src_width, src_height = stream.codec_context.width, stream.codec_context.height
+    heights = sorted({h for h in heights if h <= src_height} or {src_height}, reverse=True)
+    keyframe_every = max(1, round(keyframe_interval * rate))
+
+    outputs = []
+    for height in heights:
+        # Even dimensions, as 4:2:0 chroma subsampling requires.
+        width = round(src_width * height / src_height / 2) * 2
+        height = height // 2 * 2
+        bitrate = int(width * height * rate * bits_per_pixel)
+        for codec in codecs:
+            rendition = Rendition(
+                root / f"{height}p_{codec}.{_CONTAINERS[codec]}", codec, width, height, bitrate
+            )
+            container = av.open(rendition.path, "w")
+            out_stream = container.add_stream(_ENCODERS[codec], rate=rate)
+            context = out_stream.codec_context
+            context.width, context.height = width, height
+            context.pix_fmt = "yuv420p"
+            context.bit_rate = bitrate
+            # A fixed GOP, with keyframes also forced below, so they line up across
+            # renditions.
+            context.gop_size = keyframe_every
+            if codec == "h264":
+                context.options = {
+                    "profile": "baseline",  # Constrained Baseline in x264
+                    "bf": "0",
+                    "keyint_min": str(keyframe_every),
+                    "sc_threshold": "0",
+                    "maxrate": str(bitrate),
+                    "bufsize": str(2 * bitrate),
+                }
+            else:
+                context.options = {
+                    "auto-alt-ref": "0",  # No hidden frames: one packet per frame
+                    "keyint_min": str(keyframe_every),
+                    "lag-in-frames": "0",
+                    "maxrate": str(bitrate),
+                }
+            outputs.append((rendition, container, out_stream))
+            logger.info(f"Building {rendition} -> {rendition.path}")
+
+    time_base = 1 / Fraction(rate)
+    index = 0
+    start = time.perf_counter()
+    for frame in source.decode(stream):
+        for rendition, container, out_stream in outputs:
+            scaled = frame.reformat(rendition.width, rendition.height, "yuv420p")
+            scaled.pts, scaled.time_base = index, time_base
+            scaled.pict_type = (
+                av.video.frame.PictureType.I
+                if index % keyframe_every == 0
+                else av.video.frame.PictureType.NONE
+            )
+            container.mux(out_stream.encode(scaled))
+        index += 1
+        if index % 300 == 0:
+            logger.info(f"Encoded {index} frames ({index / (time.perf_counter() - start):.1f} fps)")
+    for _, container, out_stream in outputs:
+        container.mux(out_stream.encode())
+        container.close()
+    source.close()
+
+    ladder = RenditionLadder([r for r, _, _ in outputs], keyframe_every / float(rate))
+    ladder.save(root / MANIFEST_NAME)
+    logger.info(f"Built {ladder} from {index} frames into {root}")
+    return ladder
+
+
+class RenditionTrack(MediaStreamTrack):
+    """
+    A per-peer video track that streams the rendition of a `RenditionLadder` that
+    best fits the peer's codec and bandwidth.
+
+    Renditions in the negotiated codec are sent without transcoding (see
+    `PassthroughTrack`). The bandwidth estimate comes from the peer's REMB
+    messages (or `set_bandwidth()`); the track switches to a lower rendition as
+    soon as the estimate drops below its bitrate, and to a higher one once the
+    estimate has allowed it for `upswitch_delay`. Switches happen at a keyframe of
+    the new rendition, so the peer's decoder never sees a broken reference.
+
+    If no rendition is in the negotiated codec, the selected rendition is decoded
+    and aiortc encodes it; its encoder then adapts to the bandwidth itself.
+
+    Pre-encoded renditions cannot produce a keyframe on request, so a peer that
+    loses one (PLI/FIR) recovers at the next aligned keyframe, at most one
+    keyframe interval of the ladder later; the wait is recorded in `recovery`.
+    Likewise, a track moved to a new connection (e.g. a resumed session) continues
+    where it was from the next keyframe.
+
+    Args:
+        ladder (RenditionLadder): The renditions to choose from.
+        loop (bool): Whether to restart the video when it ends. Defaults to True.
+        initial_bandwidth (float): Bandwidth assumed before the first estimate, in
+            bits per second. Defaults to 1.5 Mbps.
+        headroom (float): Fraction of the estimated bandwidth a rendition may use.
+            Defaults to 0.85.
+        upswitch_delay (float): Seconds the estimate has to allow a higher
+            rendition before switching up. Defaults to 4.
+    """
+
+    kind = "video"
+
+    def __init__(
+        self,
+        ladder: RenditionLadder,
+        loop: bool = True,
+        initial_bandwidth: float = 1_500_000,
+        headroom: float = 0.85,
+        upswitch_delay: float = 4.0,
+    ):
+        super().__init__()
+        self.ladder = ladder
+        self.loop = loop
+        self.bandwidth = initial_bandwidth
+        self.headroom = headroom
+        self.upswitch_delay = upswitch_delay
+        self.codec: str | None = None
+        self.passthrough = False
+        self.rendition: Rendition | None = None
+        self._reader: FileReader | None = None
+        self._target: Rendition | None = None
+        self._next_rendition: Rendition | None = None
+        self._next_reader: FileReader | None = None
+        self._switch_item: av.Packet | None = None
+        self._upswitch_since: float | None = None
+        self._pacer = Pacer()
+        self._needs_keyframe = True
+        self._reading = False
+        self.recovery = RecoveryStats("RenditionTrack")
+
+    @property
+    def preferred_codecs(self) -> list[str]:
+        """Codecs to prefer during negotiation, so renditions can be sent as-is."""
+        return self.ladder.codecs
+
+    def set_codec(self, codec: RTCRtpCodecParameters | str | None):
+        """
+        Picks the first rendition for the codec negotiated with the peer (again if the
+        track is moved to a new connection, e.g. a resumed session; the stream then
+        continues from its current position).
+        """
+        codec = codec_name(codec) if codec is not None else None
+        rendition = self.ladder.select(codec, self.bandwidth * self.headroom)
+        previous = self._reader
+        if previous is not None:
+            # Resumed: don't send the frames missed while disconnected in a burst.
+            self._pacer.reset()
+            self._needs_keyframe = True
+            self.recovery.request()
+        if previous is None or codec != self.codec or rendition is not self.rendition:
+            if self._next_reader is not None:
+                self._next_reader.close()
+            self._next_rendition = self._next_reader = self._switch_item = None
+            self._target = None
+            self._reader = FileReader(rendition.path, loop=self.loop)
+            if previous is not None:
+                # Continue at the same position in the new rendition.
+                self._reader.offset = previous.offset
+                self._reader.seek(previous.end_time)
+                previous.close()
+        self.codec, self.rendition = codec, rendition
+        self.passthrough = self._reader.passthrough_codec == self.codec
+        self.recovery.joined()
+        mode = "as-is" if self.passthrough else "transcoding"
+        logger.info(f"RenditionTrack: starting with {self.rendition} ({self.codec}, {mode}).")
+
+    def set_bandwidth(self, bitrate: float):
+        """Updates the bandwidth estimate (bits per second) and schedules a switch."""
+        self.bandwidth = bitrate
+        if self.rendition is None or not self.passthrough:
+            return
+        target = self.ladder.select(self.codec, bitrate * self.headroom)
+        if target is self.rendition:
+            self._upswitch_since = None
+            self._target = None
+            return
+        if target.bitrate > self.rendition.bitrate:
+            now = time.monotonic()
+            if self._upswitch_since is None:
+                self._upswitch_since = now
+            if now - self._upswitch_since < self.upswitch_delay:
+                return
+        self._upswitch_since = None
+        self._target = target
+
+    def handle_rtcp(self, packet: AnyRtcpPacket):
+        """
+        RTCP listener (see `add_rtcp_listener()`): takes bandwidth estimates from REMB,
+        and records PLI/FIR (served by the next keyframe).
+        """
+        if is_keyframe_request(packet) and self.passthrough:
+            self.recovery.request()
+        elif isinstance(packet, RtcpPsfbPacket) and packet.fmt == RTCP_PSFB_APP:
+            try:
+                bitrate, _ = unpack_remb_fci(packet.fci)
+            except ValueError:
+                return
+            self.set_bandwidth(bitrate)
+
+    def _read(self) -> av.Packet | av.VideoFrame | None:
+        # Runs in a worker thread.
+        target = self._target
+        if self._next_reader is not None and self._next_rendition is not target:
+            # The target changed since the switch was prepared.
+            self._next_reader.close()
+            self._next_rendition = self._next_reader = self._switch_item = None
+        if target is not None and self._next_reader is None:
+            self._prepare_switch(target)
+
+        item = self._reader.read(self.passthrough)
+        switch = self._switch_item
+        if switch is not None and (
+            item is None or item.pts * item.time_base >= switch.pts * switch.time_base
+        ):
+            logger.info(f"RenditionTrack: switching {self.rendition} -> {self._next_rendition}")
+            self._reader.close()
+            self._reader, self.rendition = self._next_reader, self._next_rendition
+            self._next_rendition = self._next_reader = self._switch_item = None
+            if self._target is self.rendition:
+                self._target = None
+            return switch
+        return item
+
+    def _prepare_switch(self, target: Rendition):
+        # Open the target rendition at the current position and find its next
+        # keyframe; the current rendition is sent until then.
+        now = self._reader.end_time
+        reader = FileReader(target.path, loop=self.loop)
+        reader.offset = self._reader.offset
+        reader.seek(now)
+        item = reader.read(passthrough=True)
+        while item is not None and not (item.is_keyframe and item.pts * item.time_base >= now):
+            if item.pts * item.time_base > now + 2 * self.ladder.keyframe_interval:
+                item = None  # Keyframes are not aligned with the manifest
+                break
+            item = reader.read(passthrough=True)
+        if item is None:
+            logger.warning(f"RenditionTrack: no keyframe to switch to {target} at {now:.2f}s")
+            reader.close()
+            self._target = None
+            return
+        self._next_rendition, self._next_reader, self._switch_item = target, reader, item
+
+    def _close_readers(self):
+        for reader in (self._reader, self._next_reader):
+            if reader is not None:
+                reader.close()
+
+    def stop(self):
+        super().stop()
+        # A read in progress closes the files when it returns.
+        if not self._reading:
+            self._close_readers()
+
+    async def recv(self) -> av.Packet | av.VideoFrame:
+        if self.readyState != "live":
+            raise MediaStreamError
+        if self._reader is None:
+            # No negotiated codec (e.g. used outside `WebRTCServer`): transcode.
+            self.set_codec(None)
+
+        while True:
+            self._reading = True
+            try:
+                item = await asyncio.to_thread(self._read)
+            finally:
+                self._reading = False
+            if self.readyState != "live":
+                self._close_readers()
+                raise MediaStreamError
+            if item is None:
+                self.stop()
+                raise MediaStreamError
+            if self.passthrough and self._needs_keyframe and not item.is_keyframe:
+                continue  # The peer cannot decode anything before a keyframe
+            self._needs_keyframe = False
+
+            await self._pacer.wait(item)
+            if self.passthrough and item.is_keyframe:
+                self.recovery.keyframe_sent()
+            return item
@@ -0,0 +1,122 @@
+import inspect
+import time
+from collections import deque
+from collections.abc import Callable
+
+from aiortc import RTCRtpSender
+from aiortc.rtp import RTCP_PSFB_FIR, RTCP_PSFB_PLI, AnyRtcpPacket, RtcpPsfbPacket
+
+from .. import logger
+
+RtcpListener = Callable[[AnyRtcpPacket], None]
+
+
+def add_rtcp_listener(sender: RTCRtpSender, listener: RtcpListener):
+    """
+    Calls `listener(packet)` for every RTCP packet a sender receives (receiver
+    reports, NACKs, PLI/FIR, REMB, ...), after aiortc has handled it.
+
+    aiortc has no public hook for this; the DTLS transport dispatches RTCP by
+    calling the sender's `_handle_rtcp_packet()`, so the listener is installed by
+    wrapping that method on this sender instance only. Listeners may be plain
+    functions or coroutines.
+
+    Args:
+        sender (RTCRtpSender): The sender to observe.
+        listener (callable): Called with each RTCP packet.
+    """
+    listeners = getattr(sender, "_rtcp_listeners", None)
+    if listeners is None:
+        listeners = sender._rtcp_listeners = []
+        handle_rtcp_packet = sender._handle_rtcp_packet
+
+        async def handle_with_listeners(packet: AnyRtcpPacket):
+            await handle_rtcp_packet(packet)
+            for callback in list(listeners):
+                try:
+                    result = callback(packet)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    # Never let a listener break aiortc's RTCP handling.
+                    logger.error(f"RTCP listener {callback!r} failed: {e}")
+
+        sender._handle_rtcp_packet = handle_with_listeners
+    listeners.append(listener)
+
+
+def is_keyframe_request(packet: AnyRtcpPacket) -> bool:
+    """Whether a packet is a Picture Loss Indication or Full Intra Request."""
+    return isinstance(packet, RtcpPsfbPacket) and packet.fmt in (RTCP_PSFB_PLI, RTCP_PSFB_FIR)
+
+
+class RecoveryStats:
+    """
+    Records how long a peer waits for a keyframe: from joining until its first
+    keyframe is sent (time to first frame), and from a keyframe request (PLI/FIR,
+    or a resync) until the next one (time to recover). Requests made while one is
+    already pending are served by the same keyframe, so they are not counted again.
+
+    Args:
+        name (str): Name used in log messages, e.g. the track's class.
+        history (int): Number of recovery times kept. Defaults to 100.
+    """
+
+    def __init__(self, name: str = "RecoveryStats", history: int = 100):
+        self.name = name
+        self.first_frame_time: float | None = None  # Seconds from joining to first keyframe
+        self.recovery_times: deque[float] = deque(maxlen=history)  # Seconds, latest last
+        self.requests = 0
+        self._requested_at: float | None = None
+        self._joined_at = time.monotonic()
+
+    def __repr__(self) -> str:
+        first = "?" if self.first_frame_time is None else f"{self.first_frame_time * 1000:.0f}ms"
+        result = f"first frame={first}, {len(self.recovery_times)} recoveries"
+        if self.recovery_times:
+            result += f" (mean={self.mean * 1000:.0f}ms, max={self.max * 1000:.0f}ms)"
+        return f"<RecoveryStats {result}>"
+
+    @property
+    def mean(self) -> float | None:
+        """Mean recovery time in seconds, or None before the first recovery."""
+        if not self.recovery_times:
+            return None
+        return sum(self.recovery_times) / len(self.recovery_times)
+
+    @property
+    def max(self) -> float | None:
+        """Longest recovery time in seconds, or None before the first recovery."""
+        return max(self.recovery_times, default=None)
+
+    def joined(self):
+        """Marks the start of streaming to the peer (defaults to when created)."""
+        self._joined_at = time.monotonic()
+
+    def request(self):
+        """Marks a keyframe request from (or on behalf of) the peer."""
+        self.requests += 1
+        if self._requested_at is None and self.first_frame_time is not None:
+            self._requested_at = time.monotonic()
+
+    def keyframe_sent(self):
+        """Marks a keyframe handed to the peer's sender."""
+        now = time.monotonic()
+        if self.first_frame_time is None:
+            self.first_frame_time = now - self._joined_at
+            logger.info(f"{self.name}: first keyframe after {self.first_frame_time * 1000:.0f}ms")
+        elif self._requested_at is not None:
+            elapsed = now - self._requested_at
+            self.recovery_times.append(elapsed)
+            logger.debug(f"{self.name}: recovered with a keyframe after {elapsed * 1000:.0f}ms")
+        self._requested_at = None
+
+    def to_dict(self) -> dict:
+        """The metrics as a JSON-serializable dictionary (times in seconds)."""
+        return {
+            "first_frame_time": self.first_frame_time,
+            "requests": self.requests,
+            "recoveries": len(self.recovery_times),
+            "recovery_time_mean": self.mean,
+            "recovery_time_max": self.max,
+        }
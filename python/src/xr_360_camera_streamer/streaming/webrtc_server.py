@@ -1,16 +1,50 @@
 import asyncio
 import inspect
+import time
 import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from functools import wraps
+from functools import partial, wraps
 
 import uvicorn
-from aiortc import RTCPeerConnection, RTCSessionDescription, RTCConfiguration
+from aiortc import (
+    MediaStreamTrack,
+    RTCConfiguration,
+    RTCPeerConnection,
+    RTCRtpSender,
+    RTCSessionDescription,
+)
+from aiortc.exceptions import InvalidStateError
+from aiortc.sdp import MediaDescription, SessionDescription, candidate_from_sdp
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from .. import logger
-from ..utils.codecs import get_video_codecs_from_sdp
+from ..metrics import current_peer, get_metrics
+from ..profiling import FORMATS, MAX_DURATION, MIN_INTERVAL, SamplingProfiler
+from ..utils.codecs import (
+    codec_name,
+    get_codec_preferences,
+    get_negotiated_codec,
+    get_transceiver,
+    get_video_bandwidth_from_sdp,
+    get_video_codecs_from_sdp,
+    set_video_bandwidth_in_sdp,
+)
+from .admission import AdmissionController, PipelineSpec
+from .dispatch import DispatchPolicy
+from .encoded import EncodedTrack
+from .peer import Peer, SessionTrack, close_resource
+from .rate_control import AdaptiveTrack, RateController
+from .relay import BroadcastRelay
+from .rtcp import add_rtcp_listener
+
+# Per-peer context that is passed to user callables only if their signature asks for it.
+_CONTEXT_KWARGS = ("state", "channel", "spec")
+
+# How synchronous user callables run (see `WebRTCServer(execution=...)`).
+EXECUTION_MODES = ("inline", "thread", "serial")
 
 
 class WebRTCServer:
@@ -27,6 +61,23 @@ class WebRTCServer:
         datachannel_handlers=None,
         state_factory=None,
         rtc_configuration: RTCConfiguration = None,
+        broadcast: bool = False,
+        relay_options: dict | None = None,
+        rate_control: bool = False,
+        rate_control_options: dict | None = None,
+        encoder_options: dict | None = None,
+        codec_preferences=None,
+        max_video_bitrate: int | None = None,
+        prewarm: int = 0,
+        trickle_ice: bool = False,
+        session_grace: float = 0.0,
+        admission: AdmissionController | None = None,
+        pipeline_specs: list[PipelineSpec] | None = None,
+        datachannel_policies: dict[str, DispatchPolicy] | None = None,
+        execution: dict[str, str] | None = None,
+        executor_workers: int | None = None,
+        metrics: bool = True,
+        profiling: bool = False,
     ):
         """
         Initializes the WebRTC Server.
@@ -36,12 +87,112 @@ class WebRTCServer:
             port (int, optional): The port to run the server on. Defaults to 8080.
             video_track_factory (callable, optional): A function or class that, when called,
                 returns a new instance of a MediaStreamTrack. It will receive a `state` object
-                as a keyword argument if its signature includes `state` or `**kwargs`.
+                as a keyword argument if its signature includes `state` or `**kwargs`. A
+                synchronous factory runs in a worker thread, so the peer's connection
+                setup proceeds meanwhile. The track is stopped when the peer goes away,
+                and its `on_close()` is called if it has one, to release what `stop()`
+                does not (e.g. a decoder or a shared transform; see `Peer.close()`).
             datachannel_handlers (dict, optional): A dictionary mappping data channel labels
                 (str) to callback functions. Callbacks will receive a `state` object as a
-                keyword argument if their signature includes `state` or `**kwargs`.
+                keyword argument if their signature includes `state` or `**kwargs`, and
+                the `RTCDataChannel` the message arrived on (to reply to the client) if
+                it includes `channel`.
             state_factory (callable, optional): A function or class that, when called, returns
-                a new state object for the peer connection.
+                a new state object for the peer connection. Its `on_close()` is called,
+                if it has one, when the peer goes away.
+            broadcast (bool, optional): If True, every peer receives the same video:
+                `video_track_factory` is called once (without a state) and its frames
+                are encoded once by a `BroadcastRelay`, which forwards the encoded
+                packets to all peers. Use this when the video does not depend on the
+                peer. Defaults to False.
+            relay_options (dict, optional): Keyword arguments for the `BroadcastRelay`
+                (e.g. `bitrate`, `min_keyframe_interval`).
+            rate_control (bool, optional): If True, each peer's video bitrate follows its
+                network feedback (see `RateController`), and frames are downscaled or
+                dropped when the bitrate gets too low for them. Frames are then encoded
+                by an `EncodedTrack` (with `encoder_options`, if given), whose bitrate
+                the controller sets. Defaults to False.
+            rate_control_options (dict, optional): Keyword arguments for each peer's
+                `RateController` (e.g. `max_bitrate`, `min_framerate`).
+            encoder_options (dict, optional): If given, each peer's frames are encoded
+                by an `EncodedTrack` with these keyword arguments (e.g. `profile`,
+                `encoders`) instead of aiortc's default encoders. Broadcasts take
+                the same arguments through `relay_options`.
+            codec_preferences (list or callable, optional): Video codecs in order of
+                preference, e.g. `["h264", "vp8"]`; each peer negotiates the first one
+                it supports (the others are removed from the answer). Or a policy
+                function that receives the codec names the peer offered (and `state`,
+                if its signature asks for it) and returns such a list. A codec the
+                video track needs (e.g. a passthrough file's) always comes first. The
+                negotiated codec is in `peers[id].codec`. Defaults to the peer's order.
+            max_video_bitrate (int, optional): Video bitrate limit per peer, in bits
+                per second. A lower limit in the peer's offer (`b=AS`/`b=TIAS`, the
+                bandwidth it can receive) and its spec's `max_bitrate` apply too. The
+                limit caps the peer's encoder: frames are encoded by an `EncodedTrack`
+                with `max_bitrate` set, and its `RateController` (see `rate_control`)
+                stays below it. A broadcast's shared encoder is capped at this
+                server-wide limit only, and pre-encoded files (passthrough, renditions)
+                are not re-encoded for it. The limit is also written into the answer,
+                though there it only bounds what the peer sends to the server.
+            prewarm (int, optional): Number of states and video tracks to build ahead of
+                time, so a new peer gets one at once (opening sources and building
+                transforms can take a while). Refilled in the background as peers take
+                them (on the event loop, unless the factory's `execution` says
+                otherwise). With `broadcast`, the relay is created at startup instead.
+                Defaults to 0.
+            trickle_ice (bool, optional): If True, clients may send their offer before
+                their ICE candidates are gathered, and post the candidates to
+                `/candidate` as they come (see `_candidate_handler()`). aiortc gathers
+                the server's own candidates before answering, so they are always in
+                the answer. Defaults to False.
+            session_grace (float, optional): Seconds a disconnected peer's session is
+                kept: its state and video track stay as they are (e.g. the source's
+                position and the transform), and a client that sends a new offer with
+                the `session` from its answer resumes them, at the cost of a keyframe.
+                Broadcast peers resume their state only. Defaults to 0 (no sessions).
+            admission (AdmissionController, optional): Admission control for new video
+                peers. A peer is admitted on the best of `pipeline_specs` that fits
+                the server's capacity and live headroom; if none fits, the offer is
+                answered with 503 and a `Retry-After` header, so the peers already
+                served keep their frame rate. Defaults to admitting every peer.
+            pipeline_specs (list, optional): The `PipelineSpec`s a peer's video can be
+                produced at, best first; lower ones are used when the server is too busy
+                for the best. The video track factory receives the peer's spec as
+                `spec` (if its signature asks for it), and the answer includes it.
+                Broadcast peers share one pipeline, so only the peer count and live
+                headroom apply to them.
+            datachannel_policies (dict, optional): How each data channel's messages are
+                delivered to its handler, by label, e.g. `{"control": LatestValue()}`
+                to only handle the newest pose (see `DispatchPolicy`). Messages the
+                policy drops are never passed to the handler, so never parsed.
+                Defaults to calling the handler for every message as it arrives.
+            execution (dict, optional): Where synchronous callables run, by data channel
+                label (for its handler) or by parameter name ("video_track_factory",
+                "codec_preferences"):
+
+                - "inline": on the event loop. For quick callables only, as every
+                  peer's signalling, RTCP and frames wait while it runs.
+                - "thread": in the server's worker pool (see `executor_workers`).
+                  Calls may run concurrently, so a channel's messages may be handled
+                  out of order.
+                - "serial": in a worker thread of each peer's channel, one call at a
+                  time in the order the messages arrived, so a slow handler only
+                  delays its own channel. For factories, one thread for all calls.
+
+                Async callables always run on the event loop. Defaults to "inline", so
+                callables that use the loop or non-thread-safe objects keep working;
+                pass e.g. `{"video_track_factory": "thread"}` for a factory that opens
+                files or builds transforms.
+            executor_workers (int, optional): Threads in the worker pool. Defaults to
+                the `ThreadPoolExecutor` default.
+            metrics (bool, optional): If True, the pipeline metrics (see
+                `get_metrics()`) are served at `/metrics`, in the Prometheus text format,
+                and `/stats`, as JSON with the connected peers. Each peer's stage timings
+                are labelled with its id. Defaults to True.
+            profiling (bool, optional): If True, `/profile` takes a sampling profile of
+                the running server, e.g. `/profile?duration=10&format=speedscope` (see
+                `_profile_handler()`). It exposes the server's code paths, so only
+                enable it where the port is not public. Defaults to False.
         """
         self.host = host
         self.port = port
@@ -49,33 +200,83 @@ class WebRTCServer:
         self.rtc_configuration = rtc_configuration
         self.app = FastAPI(lifespan=self.lifespan)
         self.pcs = set()  # global storage for peer connection(s)
+        self.broadcast = broadcast
+        self.relay_options = relay_options or {}
+        self.relay: BroadcastRelay | None = None  # Created with the first broadcast peer
+        self.rate_control = rate_control
+        self.rate_control_options = rate_control_options or {}
+        self.encoder_options = encoder_options
+        self.max_video_bitrate = max_video_bitrate
+        self.peers: dict[str, Peer] = {}  # Connected peers, by id
+        self.prewarm = prewarm
+        self.trickle_ice = trickle_ice
+        self._warm: deque[tuple] = deque()  # Pre-warmed (state, video track) pairs
+        self._prewarm_task: asyncio.Task | None = None
+        self._relay_lock = asyncio.Lock()
+        self.session_grace = session_grace
+        self._sessions: dict[str, tuple[Peer, asyncio.TimerHandle]] = {}  # Disconnected
+        self.admission = admission
+        self.pipeline_specs = list(pipeline_specs or [])
+        self.datachannel_policies = datachannel_policies or {}
+        self.execution = dict(execution or {})
+        for name, mode in self.execution.items():
+            if mode not in EXECUTION_MODES:
+                raise ValueError(
+                    f"Unknown execution mode '{mode}' for '{name}'. "
+                    f"Choose one of {EXECUTION_MODES}."
+                )
+        self._executor = ThreadPoolExecutor(executor_workers, thread_name_prefix="webrtc")
+        self._serial_executors: list[ThreadPoolExecutor] = []  # See `_wrap_callable()`
+
+        self._codec_policy = None
+        if callable(codec_preferences):
+            self._codec_policy = self._wrap_callable(
+                codec_preferences, self.execution.get("codec_preferences", "inline")
+            )
+            codec_preferences = None
+        self.codec_preferences = list(codec_preferences or [])
 
         # Wrap factories and handlers to manage state passing and async execution
-        self._video_track_factory = self._wrap_callable(video_track_factory)
+        self._video_track_factory = self._wrap_callable(
+            video_track_factory, self.execution.get("video_track_factory", "inline")
+        )
         self._datachannel_handlers = {
-            label: self._wrap_callable(handler)
+            label: self._wrap_callable(handler, self.execution.get(label, "inline"))
             for label, handler in (datachannel_handlers or {}).items()
         }
 
+        self.metrics = get_metrics()
+        self._profiler: SamplingProfiler | None = None
         self.app.post("/offer")(self._create_offer_handler)  # WebRTC signal endpoint
-
-    def _wrap_callable(self, func):
+        if trickle_ice:
+            self.app.post("/candidate")(self._candidate_handler)
+        if metrics:
+            self.app.get("/metrics")(self._metrics_handler)
+            self.app.get("/stats")(self._stats_handler)
+        if profiling:
+            self.app.get("/profile")(self._profile_handler)
+
+    def _wrap_callable(self, func, execution: str = "inline"):
         """
         Wraps a user-provided callable (factory or handler) to standardize its
         execution.
 
         This wrapper performs two main functions:
-        1.  **State Injection**: It inspects the callable's signature once. If the
-            callable can accept a `state` keyword argument (i.e., it has a
-            `state` parameter or `**kwargs`), the wrapper will pass the
-            peer-specific state object to it. This is done at initialization
-            to avoid repeated, costly `inspect` calls in the hot path.
+        1.  **Context Injection**: It inspects the callable's signature once. If the
+            callable can accept a `state` (or `channel`, `spec`) keyword argument (i.e.,
+            it has a parameter of that name or `**kwargs`), the wrapper will pass the
+            peer-specific state object (or data channel, pipeline spec) to it. This is done at
+            initialization to avoid repeated, costly `inspect` calls in the hot path.
         2.  **Async Handling**: It ensures that both synchronous and asynchronous
             callables are handled correctly by returning an `async` wrapper that
-            `await`s the original function if it's a coroutine.
+            `await`s the original function if it's a coroutine. Synchronous callables
+            run as `execution` says (see `EXECUTION_MODES`); for "serial", the caller
+            may pass the `executor` to run in (e.g. its channel's), and otherwise the
+            callable gets a worker thread of its own.
 
         Args:
             func (callable): The function or callable to wrap.
+            execution (str): Where a synchronous callable runs. Defaults to "inline".
 
         Returns:
             An async wrapper function that normalizes the callable's execution.
@@ -85,42 +286,82 @@ class WebRTCServer:
             return None
 
         sig = inspect.signature(func)
-        has_state = "state" in sig.parameters or any(
+        has_var_keyword = any(
             p.kind == inspect.Parameter.VAR_KEYWORD for p in sig.parameters.values()
         )
+        injected = tuple(
+            name for name in _CONTEXT_KWARGS if has_var_keyword or name in sig.parameters
+        )
         is_async = asyncio.iscoroutinefunction(func)
+        default_executor = self._executor
+        if execution == "serial" and not is_async:
+            name = getattr(func, "__name__", "callable")
+            default_executor = ThreadPoolExecutor(1, thread_name_prefix=f"webrtc-{name}")
+            self._serial_executors.append(default_executor)  # Shut down with the server
 
         @wraps(func)
-        async def wrapper(*args, **kwargs):
-            state = kwargs.pop("state", None)
+        async def wrapper(*args, executor: ThreadPoolExecutor | None = None, **kwargs):
+            context = {name: kwargs.pop(name, None) for name in _CONTEXT_KWARGS}
             call_args = kwargs
 
-            if has_state:
-                call_args["state"] = state
+            for name in injected:
+                call_args[name] = context[name]
 
             if is_async:
                 return await func(*args, **call_args)
-            else:
+            elif execution == "inline":
                 return func(*args, **call_args)
+            else:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    executor or default_executor, partial(func, *args, **call_args)
+                )
 
         return wrapper
 
     @asynccontextmanager
     async def lifespan(self, app: FastAPI):
         # Startup
+        if self.admission is not None:
+            self.admission.start()
+        self.metrics.add_collector(self._collect_metrics)
+        self._schedule_prewarm()
         yield
 
         # Shutdown
         logger.info("Server shutting down, closing all peer connections.")
-        # Make a copy of the set to iterate over, as closing pcs modifies the set
-        coros = [pc.close() for pc in list(self.pcs)]
-        await asyncio.gather(*coros)
-        self.pcs.clear()
+        # Make a copy of the peers to iterate over, as closing them modifies the dict
+        peers = list(self.peers.values())
+        await asyncio.gather(*(self._close_peer(peer, keep_session=False) for peer in peers))
+        for session in list(self._sessions):
+            await self._expire_session(session)
+        if self._prewarm_task is not None:
+            self._prewarm_task.cancel()
+        while self._warm:
+            state, track = self._warm.popleft()
+            await close_resource(track)
+            await close_resource(state)
+        if self.relay is not None:
+            await self.relay.close()
+            await close_resource(self.relay.source)
+        if self.admission is not None:
+            self.admission.stop()
+        self.metrics.remove_collector(self._collect_metrics)
+        self._executor.shutdown(wait=False)
+        for executor in self._serial_executors:
+            executor.shutdown(wait=False)
 
     async def _create_offer_handler(self, request: Request):
         """
         Handles the SDP offer from the client and returns an SDP answer.
+
+        The answer is produced as fast as possible: the offer is parsed once, the
+        peer's ICE candidates are gathered while its video track is built, and a
+        pre-warmed state and track are used when available (see `prewarm`). With
+        `trickle_ice`, the answer includes the peer's `id`, for the trickle ICE
+        endpoint; clients should only post candidates when it is there.
         """
+        received_at = time.monotonic()
         params = await request.json()
         offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
 
@@ -128,35 +369,89 @@ class WebRTCServer:
         #     f"Browser capabilities (offer) from {request.client.host}:\n{offer.sdp}"
         # )
         video_codecs = get_video_codecs_from_sdp(offer.sdp)
-        logger.debug(
-            f"Browser video codecs from {request.client.host}:\n{video_codecs}"
-        )
-
-        # Create a new peer connection
-        pc = RTCPeerConnection(configuration=self.rtc_configuration)
-        pc_id = f"PeerConnection({uuid.uuid4()})"
-        self.pcs.add(pc)
-        logger.info(f"{pc_id}: Created PeerConnection for {request.client.host}")
-
-        # Create a state object for peer connection
-        state = None
-        if self.state_factory:
-            state = self.state_factory()
-            logger.info(f"{pc_id}: Created state object: {state}")
-
-        # Create a video track if peer connection requests
-        if self._video_track_factory:
-            from aiortc.sdp import SessionDescription
+        logger.debug(f"Browser video codecs from {request.client.host}:\n{video_codecs}")
 
+        # Parsed once here; aiortc parses it again when it is applied.
+        try:
             parsed_offer = SessionDescription.parse(offer.sdp)
-            if any(m.kind == "video" and m.port != 0 for m in parsed_offer.media):
-                logger.info(f"{pc_id}: Client wants video, creating track.")
-                video_track = await self._video_track_factory(state=state)
-                pc.addTrack(video_track)
+        except Exception as e:  # aiortc's parser also asserts
+            logger.warning(f"Invalid offer from {request.client.host}: {e!r}")
+            return JSONResponse(status_code=400, content={"error": f"Invalid offer: {e}"})
+        # Only once the offer is valid: a bad re-offer must not lose the session. Later
+        # errors keep it too (see `_close_peer()`).
+        resumed = await self._resume_session(params.get("session"))
+        video_media = next(
+            (m for m in parsed_offer.media if m.kind == "video" and m.port != 0), None
+        )
+        wants_video = self._video_track_factory is not None and video_media is not None
+
+        # Admission control: a new video peer reserves its pipeline's cost, on the best
+        # spec that fits; resumed sessions keep their reservation.
+        spec = self._default_spec
+        reservation = None
+        if self.admission is not None and wants_video and resumed is None:
+            specs = self.pipeline_specs if spec is not None else [None]
+            reservation, reason = self.admission.admit(specs)
+            if reservation is None:
+                logger.warning(
+                    f"Rejected a peer from {request.client.host} ({reason}): {self.admission}"
+                )
+                retry_after = self.admission.retry_after
+                return JSONResponse(
+                    status_code=503,
+                    content={"error": f"Server at capacity: {reason}", "retry_after": retry_after},
+                    headers={"Retry-After": str(retry_after)},
+                )
+            spec = reservation.spec
+            if reason is not None:
+                logger.info(f"Admitting a peer from {request.client.host} at {spec.name}: {reason}")
+
+        # Until the peer holds the reservation, it is released here on errors.
+        try:
+            # Create a new peer connection
+            pc = RTCPeerConnection(configuration=self.rtc_configuration)
+            pc_id = f"PeerConnection({uuid.uuid4()})"
+            # Inherited by the connection's tasks (e.g. the sender reading the video track),
+            # so their stage timings are the peer's.
+            current_peer.set(pc_id)
+            self.pcs.add(pc)
+            logger.info(f"{pc_id}: Created PeerConnection for {request.client.host}")
+
+            # Create a state object for peer connection (or take the resumed or a pre-warmed one)
+            warm = None
+            if wants_video and resumed is None and spec is self._default_spec:
+                warm = self._take_warm()  # Pre-warmed on the default spec
+            if resumed is not None:
+                state, video_track = resumed.state, resumed.source_track
+                logger.info(f"{pc_id}: Resuming session {resumed.session}.")
+            elif warm is not None:
+                state, video_track = warm
+                logger.info(f"{pc_id}: Using a pre-warmed state and video track.")
             else:
-                logger.info(f"{pc_id}: Client does not want video, not adding track.")
-        else:
-            logger.warning(f"{pc_id}: No video_track_factory provided.")
+                state, video_track = None, None
+                if self.state_factory:
+                    state = self.state_factory()
+                    logger.info(f"{pc_id}: Created state object: {state}")
+            peer = self.peers[pc_id] = Peer(pc_id, pc, state, created_at=received_at)
+            if resumed is not None:
+                peer.session, peer.resources = resumed.session, resumed.resources
+                peer.source_track, peer.spec = video_track, resumed.spec
+            else:
+                peer.spec = spec
+                if self.session_grace:
+                    peer.session = uuid.uuid4().hex
+            peer.add_resource(reservation)
+        except Exception:
+            if reservation is not None:
+                self.admission.release(reservation)
+            raise
+        peer.add_resource(state)
+
+        # The lower of the server's and the peer's video bitrate limits.
+        limits = [self.max_video_bitrate, get_video_bandwidth_from_sdp(offer.sdp)]
+        if peer.spec is not None:
+            limits.append(peer.spec.max_bitrate)
+        peer.max_bitrate = min((limit for limit in limits if limit), default=None)
 
         # Create a data channel handler
         @pc.on("datachannel")
@@ -167,10 +462,39 @@ class WebRTCServer:
             if label in self._datachannel_handlers:
                 handler = self._datachannel_handlers[label]
 
+                # A "serial" handler runs in a thread of this channel's, so the others
+                # are not held up by it.
+                executor = None
+                if self.execution.get(label) == "serial":
+                    name = f"webrtc-{pc_id[15:23]}-{label}"  # PeerConnection(<uuid>)
+                    executor = ThreadPoolExecutor(1, thread_name_prefix=name)
+                    channel.on("close", partial(executor.shutdown, wait=False))
+
+                async def dispatch(message):
+                    if executor is not None and channel.readyState == "closed":
+                        # Messages still queued when the channel closed; its executor is
+                        # shut down.
+                        return
+                    await handler(message=message, state=state, channel=channel, executor=executor)
+
+                policy = self.datachannel_policies.get(label)
+                dispatcher = None
+                if policy is not None:
+                    dispatcher = policy.dispatcher(
+                        dispatch, name=f"{pc_id} '{label}'", peer=pc_id, channel=label
+                    )
+                    channel.on("close", dispatcher.close)
+
                 @channel.on("message")
                 async def on_message(message):
-                    logger.debug(f"{pc_id}: Message on '{label}': {message}")
-                    await handler(message=message, state=state)
+                    # Lazy: formatting every message costs loop time even when not logged.
+                    logger.opt(lazy=True).debug(
+                        "{}", lambda: f"{pc_id}: Message on '{label}': {message}"
+                    )
+                    if dispatcher is not None:
+                        dispatcher.push(message)  # Delivered (or dropped) by the policy
+                    else:
+                        await dispatch(message)
             else:
                 logger.warning(f"{pc_id}: No handler registered for data channel '{label}'.")
 
@@ -178,11 +502,17 @@ class WebRTCServer:
         async def on_connectionstatechange():
             logger.info(f"{pc_id}: Connection state is {pc.connectionState}")
             if pc.connectionState in ("failed", "closed", "disconnected"):
-                await pc.close()
-                self.pcs.discard(pc)
-                logger.info(f"{pc_id}: Cleaned up.")
+                await self._close_peer(peer)
 
         try:
+            video_sender = None
+            if wants_video:
+                video_sender = await self._add_video(peer, video_media, parsed_offer, video_track)
+            elif self._video_track_factory:
+                logger.info(f"{pc_id}: Client does not want video, not adding track.")
+            else:
+                logger.warning(f"{pc_id}: No video_track_factory provided.")
+
             await pc.setRemoteDescription(offer)
             answer = await pc.createAnswer()
             # logger.debug(f"{pc_id}: Server capabilities (answer):\n{answer.sdp}")
@@ -190,16 +520,320 @@ class WebRTCServer:
             logger.debug(f"{pc_id}: Server video codecs:\n{video_codecs}")
             await pc.setLocalDescription(answer)
 
+            if video_sender is not None:
+                self._start_video(peer)
+
         except Exception as e:
             logger.error(f"{pc_id}: Error during offer/answer exchange: {e}")
-            await pc.close()
-            self.pcs.discard(pc)
+            await self._close_peer(peer)
             return JSONResponse(status_code=500, content={"error": str(e)})
 
         # Return the answer to the client
-        return JSONResponse(
-            content={"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+        sdp = pc.localDescription.sdp
+        if video_sender is not None and peer.max_bitrate is not None:
+            sdp = set_video_bandwidth_in_sdp(sdp, peer.max_bitrate)
+        peer.answered()
+        answer = {"sdp": sdp, "type": pc.localDescription.type}
+        if self.trickle_ice:
+            answer["id"] = pc_id  # For posting candidates to /candidate
+        if peer.session is not None:
+            answer["session"] = peer.session
+        if peer.spec is not None:
+            answer["spec"] = peer.spec.to_dict()
+        return JSONResponse(content=answer)
+
+    async def _add_video(
+        self,
+        peer: Peer,
+        video_media: MediaDescription,
+        parsed_offer: SessionDescription,
+        video_track: MediaStreamTrack | None,
+    ) -> RTCRtpSender:
+        """Creates the peer's video track (unless pre-warmed) and adds it to the connection."""
+        pc, pc_id = peer.pc, peer.id
+
+        # Gather ICE candidates while the track is built, instead of after it (in
+        # `setLocalDescription()`). Only if the video transport is the one all media
+        # are bundled on; the others are discarded.
+        gathering = None
+        bundle = next((g for g in parsed_offer.group if g.semantic == "BUNDLE"), None)
+        if bundle is None or not bundle.items or bundle.items[0] == video_media.rtp.muxId:
+            transceiver = pc.addTransceiver("video", direction="sendonly")
+            gatherer = transceiver.sender.transport.transport.iceGatherer
+            gathering = asyncio.ensure_future(gatherer.gather())
+
+        try:
+            if video_track is not None:
+                pass
+            elif self.broadcast:
+                logger.info(f"{pc_id}: Client wants video, subscribing to broadcast.")
+                video_track = (await self._get_relay()).subscribe()
+            else:
+                logger.info(f"{pc_id}: Client wants video, creating track.")
+                video_track = await self._video_track_factory(state=peer.state, spec=peer.spec)
+            peer.add_resource(video_track)
+            peer.source_track = video_track
+        finally:
+            if gathering is not None:
+                await gathering
+        if self.session_grace and not self.broadcast:
+            video_track = SessionTrack(video_track)  # Not stopped with the connection
+
+        rate_controller = None
+        if self.rate_control:
+            options = dict(self.rate_control_options)
+            if peer.max_bitrate is not None:
+                options["max_bitrate"] = min(
+                    peer.max_bitrate, options.get("max_bitrate", peer.max_bitrate)
+                )
+            rate_controller = RateController(name=pc_id, **options)
+            if not hasattr(video_track, "set_codec"):
+                # Frames can be scaled and dropped; pre-encoded packets cannot.
+                video_track = AdaptiveTrack(video_track, rate_controller)
+        # Rate control and bitrate limits need an encoder they can steer; aiortc's own
+        # encoders only follow the peer's REMB.
+        own_encoder = (
+            self.encoder_options is not None
+            or rate_controller is not None
+            or peer.max_bitrate is not None
         )
+        if own_encoder and not hasattr(video_track, "set_codec"):
+            options = dict(self.encoder_options or {})
+            if peer.max_bitrate is not None:
+                options["max_bitrate"] = peer.max_bitrate
+            video_track = EncodedTrack(video_track, **options)
+        video_sender = pc.addTrack(video_track)
+
+        # Tracks that send pre-encoded packets may need a codec, e.g. the one a
+        # file is already encoded in; then the server's preferences apply.
+        preferred = list(getattr(video_track, "preferred_codecs", []))
+        if self._codec_policy is not None:
+            offered = list(
+                dict.fromkeys(
+                    codec_name(c) for c in video_media.rtp.codecs if codec_name(c) != "rtx"
+                )
+            )
+            preferred += await self._codec_policy(offered, state=peer.state)
+        else:
+            preferred += self.codec_preferences
+        preferences = get_codec_preferences(preferred, video_media.rtp.codecs)
+        if preferences:
+            get_transceiver(pc, video_sender).setCodecPreferences(preferences)
+        elif preferred:
+            logger.warning(f"{pc_id}: Client offered none of {preferred}, using its preference.")
+
+        peer.video_track, peer.video_sender = video_track, video_sender
+        peer.rate_controller = rate_controller
+        peer.watch_frames(video_track)
+        return video_sender
+
+    async def _close_peer(self, peer: Peer, keep_session: bool = True):
+        """
+        Closes a peer's connection and releases everything created for it, or keeps
+        it for `session_grace` seconds if the peer has a session.
+        """
+        if self.peers.pop(peer.id, None) is None:
+            return  # Already closed
+        await peer.pc.close()
+        self.pcs.discard(peer.pc)
+        if hasattr(peer.video_track, "recovery"):
+            logger.info(f"{peer.id}: Keyframe recovery: {peer.video_track.recovery}")
+
+        if keep_session and peer.session is not None:
+            if self.broadcast and peer.source_track is not None:
+                # A relay subscription is per connection; the new one starts at a keyframe.
+                peer.resources.remove(peer.source_track)
+                await close_resource(peer.source_track)
+                peer.source_track = None
+            # The source track keeps running: only its per-connection wrappers (see
+            # `SessionTrack`) were stopped with the connection.
+            expiry = asyncio.get_running_loop().call_later(
+                self.session_grace,
+                lambda: asyncio.ensure_future(self._expire_session(peer.session)),
+            )
+            self._sessions[peer.session] = (peer, expiry)
+            logger.info(f"{peer.id}: Keeping session {peer.session} for {self.session_grace:.0f}s.")
+            return
+
+        await peer.close()
+        logger.info(f"{peer.id}: Cleaned up.")
+
+    async def _resume_session(self, session: str | None) -> Peer | None:
+        """
+        Takes a session back from its previous connection, if it is still kept. A
+        connection that is still open (the client noticed the drop first) is closed.
+        """
+        if session is None or not self.session_grace:
+            return None
+        previous = next((p for p in self.peers.values() if p.session == session), None)
+        if previous is not None:
+            await self._close_peer(previous)
+        if session not in self._sessions:
+            logger.info(f"Session {session} expired or unknown, starting a new one.")
+            return None
+        peer, expiry = self._sessions.pop(session)
+        expiry.cancel()
+        self.metrics.remove_peer(peer.id)  # Continued under the new connection's id
+        return peer
+
+    async def _expire_session(self, session: str):
+        """Releases a disconnected session's resources once its grace period is over."""
+        if session not in self._sessions:
+            return
+        peer, expiry = self._sessions.pop(session)
+        expiry.cancel()
+        peer.video_track = peer.source_track  # The wrappers went with the connection
+        await peer.close()
+        logger.info(f"{peer.id}: Session {session} expired, cleaned up.")
+
+    def _start_video(self, peer: Peer):
+        """Configures the peer's video for what was negotiated, once the answer is set."""
+        video_track, video_sender = peer.video_track, peer.video_sender
+        codec = get_negotiated_codec(peer.pc, video_sender)
+        peer.codec = codec_name(codec) if codec is not None else None
+        logger.info(f"{peer.id}: Negotiated video codec: {peer.codec}")
+        if hasattr(video_track, "set_codec"):
+            # Tracks that send pre-encoded packets (broadcast relay, passthrough)
+            # must produce the negotiated codec, and may react to this peer's RTCP
+            # (e.g. PLI/FIR), which aiortc does not handle for packets.
+            video_track.set_codec(codec)
+            if hasattr(video_track, "handle_rtcp"):
+                add_rtcp_listener(video_sender, video_track.handle_rtcp)
+        if peer.rate_controller is not None:
+            peer.rate_controller.attach(video_sender)
+
+    async def _candidate_handler(self, request: Request):
+        """
+        Adds an ICE candidate that the client gathered after sending its offer (trickle
+        ICE). The body is the candidate as the browser serializes it
+        (`RTCIceCandidate.toJSON()`) plus the peer's `id` from the answer; an empty
+        candidate signals the end of the client's candidates.
+        """
+        params = await request.json()
+        peer = self.peers.get(params.get("id"))
+        if peer is None:
+            return JSONResponse(status_code=404, content={"error": "Unknown peer id."})
+
+        candidate = None
+        if params.get("candidate"):
+            # "candidate:<foundation> <component> ..." in SDP attribute syntax.
+            candidate = candidate_from_sdp(params["candidate"].removeprefix("candidate:"))
+            candidate.sdpMid = params.get("sdpMid")
+            candidate.sdpMLineIndex = params.get("sdpMLineIndex")
+        try:
+            await peer.pc.addIceCandidate(candidate)
+        except (ValueError, InvalidStateError) as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        return JSONResponse(content={})
+
+    async def _metrics_handler(self):
+        """Serves the pipeline metrics in the Prometheus text format."""
+        return PlainTextResponse(self.metrics.render_prometheus())
+
+    async def _stats_handler(self):
+        """
+        Serves the pipeline metrics as JSON (see `Metrics.to_dict()`), with a summary
+        of each connected peer.
+        """
+        stats = self.metrics.to_dict()
+        stats["peers"] = [peer.to_dict() for peer in self.peers.values()]
+        return JSONResponse(content=stats)
+
+    async def _profile_handler(
+        self,
+        duration: float = 10.0,
+        interval: float = 0.01,
+        format: str = "speedscope",
+        idle: bool = False,
+    ):
+        """
+        Samples the stacks of all the server's threads for `duration` seconds (at most
+        `MAX_DURATION`), every `interval` seconds (at least `MIN_INTERVAL`), and returns
+        the profile as speedscope JSON or collapsed stacks (`format`), with samples
+        tagged by stage and peer (see `SamplingProfiler`). One profile is taken at a time.
+        """
+        if format not in FORMATS:
+            return JSONResponse(
+                status_code=400, content={"error": f"Unknown format, choose one of {FORMATS}."}
+            )
+        if not (0 < duration <= MAX_DURATION and interval >= MIN_INTERVAL):
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "error": f"Need 0 < duration <= {MAX_DURATION:g} "
+                    f"and interval >= {MIN_INTERVAL:g}."
+                },
+            )
+        if self._profiler is not None:
+            return JSONResponse(status_code=409, content={"error": "Already profiling."})
+
+        self._profiler = SamplingProfiler(interval=interval, idle=idle, metrics=self.metrics)
+        logger.info(f"Profiling for {duration:g}s every {interval * 1000:g}ms.")
+        try:
+            profile = await self._profiler.run(duration)
+        finally:
+            self._profiler = None
+        logger.info(f"Profiled: {profile}")
+        if format == "collapsed":
+            return PlainTextResponse(profile.to_collapsed())
+        return JSONResponse(content=profile.to_speedscope(name=f"xr-streamer {self.port}"))
+
+    def _collect_metrics(self):
+        """Gauges of the server's load, read with the metrics."""
+        yield "peers", {}, len(self.peers)
+        yield "sessions", {}, len(self._sessions)
+        if self.admission is not None:
+            yield "admission_reserved", {}, self.admission.reserved
+            yield "loop_lag_seconds", {}, self.admission.loop_lag
+            if self.admission.cpu is not None:
+                yield "cpu_usage", {}, self.admission.cpu  # Fraction of all cores
+
+    def _take_warm(self) -> tuple | None:
+        """Returns a pre-warmed (state, video track) pair if one is ready, and warms another."""
+        warm = self._warm.popleft() if self._warm else None
+        self._schedule_prewarm()
+        return warm
+
+    def _schedule_prewarm(self):
+        if self.prewarm and self._video_track_factory is not None:
+            if self._prewarm_task is None or self._prewarm_task.done():
+                self._prewarm_task = asyncio.ensure_future(self._prewarm())
+
+    async def _prewarm(self):
+        """Builds states and video tracks ahead of connections, up to `prewarm` of them."""
+        current_peer.set("")  # Started by a peer's offer, but not for that peer
+        if self.broadcast:
+            await self._get_relay()
+            return
+        while len(self._warm) < self.prewarm:
+            state = self.state_factory() if self.state_factory else None
+            try:
+                track = await self._video_track_factory(state=state, spec=self._default_spec)
+            except Exception as e:
+                logger.error(f"Could not pre-warm a video track: {e}")
+                return
+            self._warm.append((state, track))
+            logger.debug(f"Pre-warmed a video track ({len(self._warm)}/{self.prewarm}).")
+
+    @property
+    def _default_spec(self) -> PipelineSpec | None:
+        """The spec a peer gets unless admission control downgrades it."""
+        if self.broadcast or not self.pipeline_specs:
+            return None
+        return self.pipeline_specs[0]
+
+    async def _get_relay(self) -> BroadcastRelay:
+        async with self._relay_lock:
+            if self.relay is None:
+                source = await self._video_track_factory(state=None)
+                options = dict(self.relay_options)
+                if self.max_video_bitrate is not None:
+                    # One encode for everyone: only the server-wide limit applies.
+                    options["bitrate"] = min(
+                        self.max_video_bitrate, options.get("bitrate", self.max_video_bitrate)
+                    )
+                self.relay = BroadcastRelay(source, **options)
+        return self.relay
 
     def run(self):
         """Starts the web server."""
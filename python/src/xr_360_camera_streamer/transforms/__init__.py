@@ -1,4 +1,26 @@
 from .base import VideoTransform
+from .color import ColorConvert
+from .cubemap import Equi2Cubemap, Equi2EAC
 from .equilib_transforms import EquilibEqui2Pers
+from .fisheye import DualFisheye2Equi, FisheyeLens
+from .foveated import FoveationWarp
+from .pipeline import TransformPipeline
+from .registry import TransformRegistry, get_transform_registry
+from .remap import Crop, RemapTransform, Resize
 
-__all__ = ["VideoTransform", "EquilibEqui2Pers"]
+__all__ = [
+    "VideoTransform",
+    "ColorConvert",
+    "Crop",
+    "DualFisheye2Equi",
+    "Equi2Cubemap",
+    "Equi2EAC",
+    "EquilibEqui2Pers",
+    "FisheyeLens",
+    "FoveationWarp",
+    "RemapTransform",
+    "Resize",
+    "TransformPipeline",
+    "TransformRegistry",
+    "get_transform_registry",
+]
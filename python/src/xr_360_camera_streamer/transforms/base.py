@@ -1,4 +1,5 @@
 import abc
+from collections.abc import Hashable
 
 import numpy as np
 
@@ -40,6 +41,65 @@ class VideoTransform(abc.ABC):
         """The height of the output frames after transformation."""
         pass
 
+    @property
+    def is_geometric(self) -> bool:
+        """
+        Whether the transform is a pure coordinate remap.
+
+        Geometric transforms implement `source_coords()`, which allows
+        `TransformPipeline` to fuse consecutive ones into a single remap table.
+        """
+        return False
+
+    @property
+    def commutes_with_remap(self) -> bool:
+        """
+        Whether the transform is a per-pixel operation that gives the same result
+        before or after a geometric remap (e.g. swapping colour channels).
+        """
+        return False
+
+    def source_coords(
+        self, x: np.ndarray, y: np.ndarray, input_width: int, input_height: int, **kwargs
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Maps output pixel coordinates back to input pixel coordinates.
+
+        Only geometric transforms (see `is_geometric`) implement this.
+
+        Args:
+            x (np.ndarray): Horizontal output pixel coordinates (any shape).
+            y (np.ndarray): Vertical output pixel coordinates (same shape as `x`).
+            input_width (int): Width of the frames fed into this transform.
+            input_height (int): Height of the frames fed into this transform.
+            **kwargs: The same dynamic parameters that `transform()` accepts.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The input (x, y) coordinates to sample.
+        """
+        raise NotImplementedError(f"{type(self).__name__} is not a geometric transform.")
+
+    def map_key(self, **kwargs) -> Hashable:
+        """
+        Returns a hashable summary of the dynamic parameters that affect
+        `source_coords()`, used to cache remap tables. Transforms whose mapping does
+        not depend on per-frame parameters can keep the default.
+        """
+        return None
+
+    @property
+    def cache_nbytes(self) -> int:
+        """Memory held by precomputed data (e.g. remap tables), in bytes."""
+        return 0
+
+    def set_sharers(self, count: int):
+        """
+        Called by `TransformRegistry` with the number of peers sharing the instance,
+        so caches keyed by per-peer parameters (e.g. remap tables per head pose) can
+        hold an entry for each of them. Does nothing by default.
+        """
+        return None
+
     def __call__(self, frame: np.ndarray, **kwargs) -> np.ndarray:
         """Provides a convenient, callable interface for the transform."""
         return self.transform(frame, **kwargs)
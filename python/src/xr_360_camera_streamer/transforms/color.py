@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+
+from .base import VideoTransform
+from .remap import OutputBuffers
+
+# Conversions that are linear per pixel, so applying them before or after a
+# bilinear remap gives the same result. `TransformPipeline` defers these until
+# after the (usually much smaller) remapped output has been produced.
+_REMAP_COMMUTING_CONVERSIONS = {
+    cv2.COLOR_RGB2BGR,
+    cv2.COLOR_BGR2RGB,
+    cv2.COLOR_RGB2GRAY,
+    cv2.COLOR_BGR2GRAY,
+    cv2.COLOR_RGB2YUV,
+    cv2.COLOR_BGR2YUV,
+    cv2.COLOR_YUV2RGB,
+    cv2.COLOR_YUV2BGR,
+    cv2.COLOR_RGB2XYZ,
+    cv2.COLOR_BGR2XYZ,
+}
+
+_GRAY_CONVERSIONS = {cv2.COLOR_RGB2GRAY, cv2.COLOR_BGR2GRAY}
+
+# Conversions to planar, chroma-subsampled layouts. Their output is
+# (H * 3 / 2, W) rather than (H, W, C).
+_PLANAR_CONVERSIONS = {
+    cv2.COLOR_RGB2YUV_I420,
+    cv2.COLOR_BGR2YUV_I420,
+    cv2.COLOR_RGB2YUV_YV12,
+    cv2.COLOR_BGR2YUV_YV12,
+}
+
+
+class ColorConvert(VideoTransform):
+    """
+    Converts frames between colour spaces with `cv2.cvtColor`, writing into a
+    buffer that is reused across frames.
+
+    Converting to "YUV_I420" produces exactly the `yuv420p` layout the encoders
+    consume, so `VideoFrame.from_ndarray(out, format="yuv420p")` skips the
+    encoder-side colour conversion entirely.
+
+    Args:
+        conversion (str | int): The conversion, either as an OpenCV code (e.g.
+            `cv2.COLOR_RGB2BGR`) or by name without the prefix (e.g. "RGB2BGR").
+    """
+
+    def __init__(self, conversion: str | int):
+        if isinstance(conversion, str):
+            code = getattr(cv2, f"COLOR_{conversion}", None)
+            if code is None:
+                raise ValueError(f"Unknown colour conversion '{conversion}'.")
+            conversion = code
+        self.code = conversion
+        self._buffers = OutputBuffers()
+
+    @property
+    def output_width(self) -> int | None:
+        """Colour conversion keeps the frame size, so this is `None` ("same as input")."""
+        return None
+
+    @property
+    def output_height(self) -> int | None:
+        """Colour conversion keeps the frame size, so this is `None` ("same as input")."""
+        return None
+
+    @property
+    def commutes_with_remap(self) -> bool:
+        return self.code in _REMAP_COMMUTING_CONVERSIONS
+
+    @property
+    def is_planar(self) -> bool:
+        """Whether the output is a planar (H * 3 / 2, W) YUV 4:2:0 frame."""
+        return self.code in _PLANAR_CONVERSIONS
+
+    @property
+    def preserves_channels(self) -> bool:
+        """Whether the output has the same shape as the input, so it can be converted in place."""
+        return self.commutes_with_remap and self.code not in _GRAY_CONVERSIONS
+
+    def transform(self, frame: np.ndarray, out: np.ndarray | None = None, **kwargs) -> np.ndarray:
+        """
+        Converts a frame.
+
+        Args:
+            frame (np.ndarray): The input frame.
+            out (np.ndarray, optional): Output buffer; may be `frame` itself when
+                `preserves_channels` is True. If omitted, a per-thread internal buffer
+                is reused.
+
+        Returns:
+            np.ndarray: The converted frame.
+        """
+        if out is None:
+            height, width = frame.shape[:2]
+            if self.is_planar:
+                shape = (height * 3 // 2, width)
+            elif self.code in _GRAY_CONVERSIONS:
+                shape = (height, width)
+            else:
+                shape = frame.shape
+            out = self._buffers.get(shape, frame.dtype)
+        return cv2.cvtColor(frame, self.code, dst=out)
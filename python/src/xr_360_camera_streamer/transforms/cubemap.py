@@ -0,0 +1,136 @@
+import cv2
+import numpy as np
+
+from .remap import RemapTransform
+from .spherical import rays_to_equirect
+
+# Face bases in the ray frame of `spherical.py` (+X forward, +Y right, +Z down):
+# (forward, right, down). A face pixel at normalized position (a, b) in [-1, 1]^2
+# looks along `forward + a * right + b * down`.
+CUBE_FACES = {
+    "front": ((1, 0, 0), (0, 1, 0), (0, 0, 1)),
+    "right": ((0, 1, 0), (-1, 0, 0), (0, 0, 1)),
+    "back": ((-1, 0, 0), (0, -1, 0), (0, 0, 1)),
+    "left": ((0, -1, 0), (1, 0, 0), (0, 0, 1)),
+    "up": ((0, 0, -1), (0, 1, 0), (1, 0, 0)),
+    "down": ((0, 0, 1), (0, 1, 0), (-1, 0, 0)),
+}
+
+# Face arrangements, as rows of face names.
+CUBEMAP_LAYOUTS = {
+    # Compact 3x2 packing (same aspect ratio as most encoders handle well).
+    "3x2": [["left", "front", "right"], ["down", "back", "up"]],
+    # Single strip, in `equilib`'s "horizon" order.
+    "6x1": [["front", "right", "back", "left", "up", "down"]],
+}
+
+
+class Equi2Cubemap(RemapTransform):
+    """
+    A transform that repacks an equirectangular (360°) frame into a cubemap.
+
+    Unlike `EquilibEqui2Pers`, the output covers the full sphere and does not depend
+    on the viewer's head pose, so a single stream can be shared by every client and
+    reprojected locally on the headset at display rate. The lookup table is static,
+    so after the first frame each frame costs one `cv2.remap` pass.
+
+    Use `layout_info()` to describe the packing to the client.
+
+    Args:
+        face_size (int): The width and height of each cube face in pixels.
+        layout (str): Face arrangement, one of `CUBEMAP_LAYOUTS`. Defaults to "3x2".
+        interpolation (str): One of "nearest", "bilinear" or "bicubic".
+    """
+
+    border_mode = cv2.BORDER_WRAP
+    projection = "cubemap"
+
+    def __init__(self, face_size: int, layout: str = "3x2", interpolation: str = "bilinear"):
+        super().__init__(interpolation=interpolation)
+        if layout not in CUBEMAP_LAYOUTS:
+            raise ValueError(
+                f"Unknown cubemap layout '{layout}'. Choose one of {list(CUBEMAP_LAYOUTS)}."
+            )
+        self.face_size = face_size
+        self.layout = layout
+        rows = CUBEMAP_LAYOUTS[layout]
+        self._rows = len(rows)
+        self._cols = len(rows[0])
+
+        # Per-cell basis vectors, indexed by row * cols + col.
+        bases = np.array([CUBE_FACES[name] for row in rows for name in row], dtype=np.float32)
+        self._forward, self._right, self._down = bases[:, 0], bases[:, 1], bases[:, 2]
+
+    @property
+    def output_width(self) -> int:
+        return self.face_size * self._cols
+
+    @property
+    def output_height(self) -> int:
+        return self.face_size * self._rows
+
+    def face_warp(self, t: np.ndarray) -> np.ndarray:
+        """
+        Maps uniformly spaced face coordinates in [-1, 1] to tangent-plane coordinates.
+        Plain cubemaps sample the tangent plane uniformly.
+        """
+        return t
+
+    def source_coords(self, x, y, input_width, input_height, **kwargs):
+        col = np.clip(x // self.face_size, 0, self._cols - 1).astype(np.intp)
+        row = np.clip(y // self.face_size, 0, self._rows - 1).astype(np.intp)
+        cell = row * self._cols + col
+
+        # Normalized position of the pixel centre within its face.
+        a = self.face_warp((x - col * self.face_size + 0.5) * (2 / self.face_size) - 1)
+        b = self.face_warp((y - row * self.face_size + 0.5) * (2 / self.face_size) - 1)
+
+        forward, right, down = self._forward[cell], self._right[cell], self._down[cell]
+        rays = (forward[..., i] + a * right[..., i] + b * down[..., i] for i in range(3))
+        return rays_to_equirect(*rays, input_width, input_height)
+
+    def layout_info(self) -> dict:
+        """
+        Describes the packing so a client can reproject it.
+
+        Returns:
+            dict: The projection name, face size, face grid (rows of face names) and,
+                per face, its `forward`, `right` and `down` basis vectors in the
+                library's ray frame (+X forward, +Y right, +Z down).
+        """
+        rows = CUBEMAP_LAYOUTS[self.layout]
+        return {
+            "projection": self.projection,
+            "face_size": self.face_size,
+            "width": self.output_width,
+            "height": self.output_height,
+            "layout": rows,
+            "faces": {
+                name: dict(zip(("forward", "right", "down"), CUBE_FACES[name], strict=True))
+                for row in rows
+                for name in row
+            },
+        }
+
+
+class Equi2EAC(Equi2Cubemap):
+    """
+    A transform that repacks an equirectangular (360°) frame into an equi-angular
+    cubemap (EAC).
+
+    EAC spaces samples uniformly in viewing angle rather than on the cube face, which
+    spreads resolution evenly across each face. For the same pixel count it looks
+    sharper than a plain cubemap near face centres, or can be sent smaller for the
+    same perceived quality.
+
+    Args:
+        face_size (int): The width and height of each cube face in pixels.
+        layout (str): Face arrangement, one of `CUBEMAP_LAYOUTS`. Defaults to "3x2".
+        interpolation (str): One of "nearest", "bilinear" or "bicubic".
+    """
+
+    projection = "eac"
+
+    def face_warp(self, t: np.ndarray) -> np.ndarray:
+        # A uniform step in angle across the face's 90° span.
+        return np.tan(t * (np.pi / 4))
@@ -1,7 +1,24 @@
+import cv2
 import numpy as np
 from equilib import Equi2Pers
+from equilib.numpy_utils import (
+    create_global2camera_rotation_matrix,
+    create_intrinsic_matrix,
+    create_rotation_matrix,
+)
 
 from .base import VideoTransform
+from .rotation import matrix_to_rotation
+from .spherical import rays_to_equirect
+
+# Rotations are rounded to this step (radians) before building remap tables, so a
+# still or slowly moving head reuses its table instead of building one per frame.
+# 1e-3 rad (~0.06 deg) is under a pixel at e.g. 1280 px for a 90 deg FOV.
+ROTATION_STEP = 1e-3
+
+
+def _quantize(values, step: float = ROTATION_STEP):
+    return np.round(np.asarray(values, dtype=np.float64) / step) * step
 
 
 class EquilibEqui2Pers(VideoTransform):
@@ -9,11 +26,23 @@ class EquilibEqui2Pers(VideoTransform):
     A transform that projects a frame from an equirectangular (360°) source
     to a standard perspective view.
 
+    The transform is also geometric (see `source_coords()`), so inside a
+    `TransformPipeline` it is fused with neighbouring resizes and crops into a single
+    `cv2.remap` pass.
+
+    Both entry points accept an optional `world_rot`, a correction applied to the
+    source (e.g. from an `OrientationTrack`) to level or stabilize the footage. It is
+    composed into the viewer's rotation, so it costs no extra sampling pass.
+
     Args:
         output_width (int): The width of the output perspective video.
         output_height (int): The height of the output perspective video.
     """
 
+    #: Equirectangular frames wrap around horizontally.
+    border_mode = cv2.BORDER_WRAP
+    interpolation = "bilinear"
+
     def __init__(self, output_width: int, output_height: int, fov_x: float) -> None:
         """
         Initializes the EquilibReprojection.
@@ -25,8 +54,15 @@ class EquilibEqui2Pers(VideoTransform):
         """
         self._output_width = output_width
         self._output_height = output_height
+        self.fov_x = fov_x
         self._equi2pers = Equi2Pers(width=output_width, height=output_height, fov_x=fov_x)
 
+        # Rotation-invariant part of the pixel -> ray mapping (same as `Equi2Pers`).
+        K = create_intrinsic_matrix(
+            height=output_height, width=output_width, fov_x=fov_x, skew=0.0, dtype=np.float64
+        )
+        self._cam2global = create_global2camera_rotation_matrix(dtype=np.float64) @ np.linalg.inv(K)
+
     @property
     def output_width(self) -> int:
         return self._output_width
@@ -35,6 +71,54 @@ class EquilibEqui2Pers(VideoTransform):
     def output_height(self) -> int:
         return self._output_height
 
+    @property
+    def is_geometric(self) -> bool:
+        return True
+
+    def source_coords(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        input_width: int,
+        input_height: int,
+        rot: dict[str, float],
+        world_rot: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Maps perspective pixel coordinates to equirectangular pixel coordinates,
+        matching the sampling positions of `transform()` up to `ROTATION_STEP`: the
+        rotations are rounded as in `map_key()`, so every table matches its key.
+        """
+        pitch, yaw, roll = _quantize((rot["pitch"], rot["yaw"], rot["roll"]))
+        if world_rot is not None:
+            world_rot = _quantize(world_rot)
+        R = self._view_matrix({"pitch": pitch, "yaw": yaw, "roll": roll}, world_rot)
+        C = (R @ self._cam2global).astype(np.float32)
+        rays = (C[i, 0] * x + C[i, 1] * y + C[i, 2] for i in range(3))
+        return rays_to_equirect(*rays, input_width, input_height)
+
+    @property
+    def cache_nbytes(self) -> int:
+        nbytes = self._cam2global.nbytes
+        for entry in self._equi2pers._cache.values():
+            nbytes += sum(getattr(array, "nbytes", 0) for array in entry)
+        return nbytes
+
+    def _view_matrix(self, rot: dict[str, float], world_rot: np.ndarray | None) -> np.ndarray:
+        R = create_rotation_matrix(**rot, z_down=self._equi2pers.z_down, dtype=np.float64)
+        if world_rot is not None:
+            R = world_rot @ R
+        return R
+
+    def map_key(self, rot: dict[str, float], world_rot: np.ndarray | None = None):
+        # Integer steps, so values that round alike hash alike.
+        angles = (rot["pitch"], rot["yaw"], rot["roll"])
+        key = tuple(np.round(np.asarray(angles) / ROTATION_STEP).astype(np.int64).tolist())
+        if world_rot is not None:
+            steps = np.round(np.asarray(world_rot, dtype=np.float64) / ROTATION_STEP)
+            key += (steps.astype(np.int64).tobytes(),)
+        return key
+
     def preprocess(self, img: np.ndarray) -> np.ndarray:
         """
         Preprocesses image
@@ -49,7 +133,9 @@ class EquilibEqui2Pers(VideoTransform):
     def postprocess(self, img: np.ndarray) -> np.ndarray:
         return np.transpose(img, (1, 2, 0))  # ?!
 
-    def transform(self, frame: np.ndarray, rot: dict[str, float]) -> np.ndarray:
+    def transform(
+        self, frame: np.ndarray, rot: dict[str, float], world_rot: np.ndarray | None = None
+    ) -> np.ndarray:
         """
         Re-projects an equirectangular frame to a perspective frame.
 
@@ -59,12 +145,18 @@ class EquilibEqui2Pers(VideoTransform):
                 - "pitch": rotation in degrees around the x-axis.
                 - "yaw": rotation in degrees around the y-axis.
                 - "roll": rotation in degrees around the z-axis.
+            world_rot (np.ndarray, optional): A 3x3 correction applied to the source
+                before the viewer's rotation, e.g. `OrientationTrack.correction()`.
 
         Returns:
             np.ndarray: The perspective frame.
         """
         # NOTE: `_equi2pers()` *silently hangs* when non-CHW images are provided.
 
+        if world_rot is not None:
+            # `equilib` only takes Euler angles, so fold the correction into them.
+            rot = matrix_to_rotation(self._view_matrix(rot, world_rot))
+
         equi = self.preprocess(frame)
         pers = self._equi2pers(equi=equi, rots=rot)
         perspective_frame = self.postprocess(pers)
@@ -0,0 +1,220 @@
+import math
+
+import numpy as np
+
+from .remap import RemapTransform
+from .rotation import rotation_matrix
+from .spherical import equirect_to_rays
+
+
+def _lens_rotation(yaw: float, pitch: float, roll: float) -> np.ndarray:
+    """Rotation (degrees) in the ray frame: yaw turns right, pitch tilts up, roll clockwise."""
+    # The viewer convention of `rotation_matrix()` has yaw and pitch the other way round.
+    return rotation_matrix(math.radians(roll), -math.radians(pitch), -math.radians(yaw))
+
+
+class FisheyeLens:
+    """
+    Calibration of one lens of a dual-fisheye camera, using the equidistant
+    ("f-theta") model that most consumer 360 cameras are close to.
+
+    Positions are given relative to the frame size, so the same calibration works
+    for every resolution the camera records at.
+
+    Args:
+        center_x (float): Horizontal centre of the image circle, as a fraction of the
+            frame width.
+        center_y (float): Vertical centre of the image circle, as a fraction of the
+            frame height.
+        radius (float): Radius of the image circle, as a fraction of the frame height.
+        fov (float): Field of view across the image circle, in degrees.
+        yaw (float): Mounting correction in degrees (positive turns right).
+        pitch (float): Mounting correction in degrees (positive tilts up).
+        roll (float): Mounting correction in degrees (positive rolls clockwise).
+    """
+
+    def __init__(
+        self,
+        center_x: float,
+        center_y: float,
+        radius: float,
+        fov: float = 190.0,
+        yaw: float = 0.0,
+        pitch: float = 0.0,
+        roll: float = 0.0,
+    ):
+        if not 0.0 < fov < 360.0:
+            raise ValueError(f"Lens field of view must be in (0, 360) degrees, got {fov}.")
+        self.center_x = center_x
+        self.center_y = center_y
+        self.radius = radius
+        self.fov = fov
+        self.yaw = yaw
+        self.pitch = pitch
+        self.roll = roll
+
+    def _params(self) -> tuple:
+        return (
+            self.center_x,
+            self.center_y,
+            self.radius,
+            self.fov,
+            self.yaw,
+            self.pitch,
+            self.roll,
+        )
+
+    # Lenses are compared by value so they can be part of a `TransformRegistry` spec.
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FisheyeLens) and self._params() == other._params()
+
+    def __hash__(self) -> int:
+        return hash(self._params())
+
+    def __repr__(self) -> str:
+        names = ("center_x", "center_y", "radius", "fov", "yaw", "pitch", "roll")
+        params = ", ".join(f"{n}={v}" for n, v in zip(names, self._params(), strict=True))
+        return f"FisheyeLens({params})"
+
+    @property
+    def half_fov(self) -> float:
+        """Angle between the optical axis and the edge of the image circle, in radians."""
+        return math.radians(self.fov) / 2
+
+    def project(
+        self,
+        rays: tuple[np.ndarray, np.ndarray, np.ndarray],
+        basis: np.ndarray,
+        input_width: int,
+        input_height: int,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Projects viewing rays into this lens's image circle.
+
+        Args:
+            rays (tuple[np.ndarray, np.ndarray, np.ndarray]): Unit ray components in
+                the library's ray frame (+X forward, +Y right, +Z down).
+            basis (np.ndarray): 3x3 matrix whose columns are the lens's optical axis,
+                image-right and image-down directions in the ray frame.
+            input_width (int): Width of the dual-fisheye frame in pixels.
+            input_height (int): Height of the dual-fisheye frame in pixels.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: The (x, y) pixel coordinates in
+                the frame and each ray's angle from the optical axis, in radians.
+        """
+        forward, right, down = (sum(basis[i, j] * rays[i] for i in range(3)) for j in range(3))
+        off_axis = np.hypot(right, down)
+        theta = np.arctan2(off_axis, forward)
+
+        # Equidistant model: distance from the centre grows linearly with the angle.
+        focal = self.radius * input_height / self.half_fov
+        scale = focal * theta / np.maximum(off_axis, 1e-9)
+        x = self.center_x * input_width - 0.5 + scale * right
+        y = self.center_y * input_height - 0.5 + scale * down
+        return x, y, theta
+
+
+# Nominal lens bases (optical axis, image right, image down): the front lens looks
+# along +X, the back lens along -X with its image mirrored horizontally.
+_FRONT_BASIS = np.eye(3)
+_BACK_BASIS = np.array([[-1, 0, 0], [0, -1, 0], [0, 0, 1]], dtype=np.float64)
+
+
+class DualFisheye2Equi(RemapTransform):
+    """
+    Stitches dual-fisheye frames (GoPro MAX, Insta360, ...) into an equirectangular
+    (360°) frame, replacing an offline stitch or a separate ffmpeg `v360` process.
+
+    Every output direction is sampled from the lens that sees it closest to its
+    optical axis. Near the seam, where the lenses' fields of view overlap, the two
+    lenses are cross-faded over `blend_width` degrees to hide small calibration and
+    exposure differences. Both the lookup and the seam weights are precomputed, so a
+    frame costs one remap pass plus a small pass over the seam band.
+
+    The transform is geometric, so in a `TransformPipeline` it fuses with the
+    perspective reprojection: a fisheye frame is sampled straight into the viewport
+    and the equirectangular frame is never materialised. `output_width` and
+    `output_height` then only set the resolution of that virtual intermediate.
+
+        TransformPipeline([
+            DualFisheye2Equi(output_width=3840, output_height=1920),
+            EquilibEqui2Pers(output_width=1280, output_height=720, fov_x=90.0),
+        ])
+
+    Args:
+        output_width (int): The width of the equirectangular output.
+        output_height (int): The height of the equirectangular output.
+        front_lens (FisheyeLens, optional): Calibration of the forward-facing lens.
+            Defaults to the left half of a side-by-side frame with a 190° lens.
+        back_lens (FisheyeLens, optional): Calibration of the backward-facing lens.
+            Defaults to the right half of a side-by-side frame with a 190° lens.
+        blend_width (float): Width of the seam cross-fade in degrees. 0 disables
+            blending. Defaults to 5.
+        interpolation (str): One of "nearest", "bilinear" or "bicubic".
+    """
+
+    def __init__(
+        self,
+        output_width: int,
+        output_height: int,
+        front_lens: FisheyeLens | None = None,
+        back_lens: FisheyeLens | None = None,
+        blend_width: float = 5.0,
+        interpolation: str = "bilinear",
+    ):
+        super().__init__(interpolation=interpolation)
+        if blend_width < 0:
+            raise ValueError(f"Seam blend width must not be negative, got {blend_width}.")
+        self._output_width = output_width
+        self._output_height = output_height
+        self.front_lens = front_lens or FisheyeLens(center_x=0.25, center_y=0.5, radius=0.5)
+        self.back_lens = back_lens or FisheyeLens(center_x=0.75, center_y=0.5, radius=0.5)
+        self.blend_width = blend_width
+        self._bases = [
+            basis @ _lens_rotation(lens.yaw, lens.pitch, lens.roll)
+            for basis, lens in ((_FRONT_BASIS, self.front_lens), (_BACK_BASIS, self.back_lens))
+        ]
+
+    @property
+    def output_width(self) -> int:
+        return self._output_width
+
+    @property
+    def output_height(self) -> int:
+        return self._output_height
+
+    @property
+    def is_blended(self) -> bool:
+        return self.blend_width > 0
+
+    def source_coords(self, x, y, input_width, input_height, **kwargs):
+        map_x, map_y, _ = self.table_coords(x, y, input_width, input_height)
+        return map_x, map_y
+
+    def table_coords(self, x, y, input_width, input_height, **kwargs):
+        rays = equirect_to_rays(x, y, self._output_width, self._output_height)
+        front_x, front_y, front_theta = self.front_lens.project(
+            rays, self._bases[0], input_width, input_height
+        )
+        back_x, back_y, back_theta = self.back_lens.project(
+            rays, self._bases[1], input_width, input_height
+        )
+
+        use_front = front_theta <= back_theta
+        map_x = np.where(use_front, front_x, back_x)
+        map_y = np.where(use_front, front_y, back_y)
+        if not self.is_blended:
+            return map_x, map_y, None
+
+        # The other lens fades in towards the seam, reaching an even mix on it.
+        blend_x = np.where(use_front, back_x, front_x)
+        blend_y = np.where(use_front, back_y, front_y)
+        margin = np.abs(back_theta - front_theta)
+        weight = 0.5 * np.clip(1 - margin / math.radians(self.blend_width), 0, 1)
+
+        # Never blend in samples from outside the other lens's image circle.
+        other_theta = np.where(use_front, back_theta, front_theta)
+        other_half_fov = np.where(use_front, self.back_lens.half_fov, self.front_lens.half_fov)
+        weight[other_theta > other_half_fov] = 0
+        return map_x, map_y, (blend_x, blend_y, weight.astype(np.float32))
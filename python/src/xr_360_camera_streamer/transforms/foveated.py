@@ -0,0 +1,114 @@
+import math
+
+import numpy as np
+
+from .remap import RemapTransform
+
+
+class FoveationWarp(RemapTransform):
+    """
+    Resamples a frame into a smaller, variable-density layout that keeps more pixels
+    in the centre of the view and fewer in the periphery.
+
+    Each axis is warped independently. A normalized output coordinate `s` in [-1, 1]
+    samples the normalized input coordinate
+
+        t = tan(s * alpha) / tan(alpha),   alpha = strength * pi / 2
+
+    so the centre is sampled `tan(alpha) / alpha` times more densely than a uniform
+    downscale, and the edges correspondingly less. The client undoes the warp with
+    the closed-form inverse `s = atan(t * tan(alpha)) / alpha` (see
+    `unwarp_params()`).
+
+    Placed after a reprojection in a `TransformPipeline`, the warp is fused into the
+    same remap table, so only the (smaller) warped frame is ever sampled and encoded:
+
+        TransformPipeline([
+            EquilibEqui2Pers(output_width=1920, output_height=1080, fov_x=90.0),
+            FoveationWarp(output_width=1280, output_height=720, strength=0.5),
+        ])
+
+    Args:
+        output_width (int): The width of the warped (encoded) frames.
+        output_height (int): The height of the warped (encoded) frames.
+        strength (float): How strongly to favour the centre, in [0, 1). 0 is a plain
+            uniform resize. Defaults to 0.5.
+        strength_y (float, optional): Vertical strength, if different from `strength`.
+        interpolation (str): One of "nearest", "bilinear" or "bicubic".
+    """
+
+    def __init__(
+        self,
+        output_width: int,
+        output_height: int,
+        strength: float = 0.5,
+        strength_y: float | None = None,
+        interpolation: str = "bilinear",
+    ):
+        super().__init__(interpolation=interpolation)
+        strength_y = strength if strength_y is None else strength_y
+        for value in (strength, strength_y):
+            if not 0.0 <= value < 1.0:
+                raise ValueError(f"Foveation strength must be in [0, 1), got {value}.")
+        self._output_width = output_width
+        self._output_height = output_height
+        self.alpha_x = strength * math.pi / 2
+        self.alpha_y = strength_y * math.pi / 2
+
+    @property
+    def output_width(self) -> int:
+        return self._output_width
+
+    @property
+    def output_height(self) -> int:
+        return self._output_height
+
+    @staticmethod
+    def _warp(s: np.ndarray, alpha: float) -> np.ndarray:
+        if alpha == 0.0:
+            return s
+        return np.tan(s * alpha) / math.tan(alpha)
+
+    def source_coords(self, x, y, input_width, input_height, **kwargs):
+        s_x = (x + 0.5) * (2 / self._output_width) - 1
+        s_y = (y + 0.5) * (2 / self._output_height) - 1
+        t_x = self._warp(s_x, self.alpha_x)
+        t_y = self._warp(s_y, self.alpha_y)
+        return (t_x + 1) * (input_width / 2) - 0.5, (t_y + 1) * (input_height / 2) - 0.5
+
+    def centre_gain(self) -> tuple[float, float]:
+        """How many times denser than a uniform resize the centre is sampled, per axis."""
+
+        def gain(alpha: float) -> float:
+            return math.tan(alpha) / alpha if alpha else 1.0
+
+        return gain(self.alpha_x), gain(self.alpha_y)
+
+    def unwarp_params(
+        self, display_width: int | None = None, display_height: int | None = None
+    ) -> dict:
+        """
+        Describes the warp so the client can undo it.
+
+        For a display pixel at normalized position `t` in [-1, 1] (per axis), the
+        client samples the received frame at `s = atan(t * tan(alpha)) / alpha`
+        (or `s = t` when `alpha` is 0).
+
+        Args:
+            display_width (int, optional): Width of the uniform image the warp was
+                computed from, passed through for the client's convenience.
+            display_height (int, optional): Height of that image.
+
+        Returns:
+            dict: JSON-serializable unwarp parameters.
+        """
+        return {
+            "type": "foveation",
+            "warp": "tan",
+            "alpha_x": self.alpha_x,
+            "alpha_y": self.alpha_y,
+            "encoded_width": self._output_width,
+            "encoded_height": self._output_height,
+            "display_width": display_width,
+            "display_height": display_height,
+        }
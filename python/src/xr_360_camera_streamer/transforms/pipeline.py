@@ -0,0 +1,233 @@
+import inspect
+
+import cv2
+import numpy as np
+
+from .base import VideoTransform
+from .remap import RemapTransform
+
+# Ordered from cheapest to most expensive; a fused remap uses the best one requested.
+_INTERPOLATION_ORDER = ["nearest", "bilinear", "bicubic"]
+
+# Positional parameters of `transform()` / `source_coords()` that are not dynamic kwargs.
+_RESERVED_PARAMS = {"self", "frame", "out", "x", "y", "input_width", "input_height"}
+
+
+def _accepted_kwargs(func) -> frozenset[str] | None:
+    """Returns the keyword names `func` accepts, or None if it takes `**kwargs`."""
+    params = inspect.signature(func).parameters.values()
+    if any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params):
+        return None
+    return frozenset(p.name for p in params if p.name not in _RESERVED_PARAMS)
+
+
+def _select(kwargs: dict, names: frozenset[str] | None) -> dict:
+    if names is None:
+        return kwargs
+    return {k: v for k, v in kwargs.items() if k in names}
+
+
+def _is_blended(transform: VideoTransform) -> bool:
+    return getattr(transform, "is_blended", False)
+
+
+class _FusedRemap(RemapTransform):
+    """A run of consecutive geometric transforms collapsed into one remap table."""
+
+    def __init__(self, stages: list[VideoTransform]):
+        interpolation = max(
+            (getattr(stage, "interpolation", "bilinear") for stage in stages),
+            key=_INTERPOLATION_ORDER.index,
+        )
+        super().__init__(interpolation=interpolation)
+        self.stages = stages
+        # Only the first stage samples the real input frame, so its border rules apply.
+        self.border_mode = getattr(stages[0], "border_mode", cv2.BORDER_REPLICATE)
+        self._stage_kwargs = [_accepted_kwargs(stage.source_coords) for stage in stages]
+
+    @property
+    def output_width(self) -> int:
+        return self.stages[-1].output_width
+
+    @property
+    def output_height(self) -> int:
+        return self.stages[-1].output_height
+
+    def source_coords(self, x, y, input_width, input_height, **kwargs):
+        sizes = [(input_width, input_height)]
+        sizes += [(stage.output_width, stage.output_height) for stage in self.stages[:-1]]
+
+        # Walk backwards from the final output to the original input.
+        for stage, names, (width, height) in reversed(
+            list(zip(self.stages, self._stage_kwargs, sizes, strict=True))
+        ):
+            x, y = stage.source_coords(x, y, width, height, **_select(kwargs, names))
+        return x, y
+
+    @property
+    def is_blended(self) -> bool:
+        return any(_is_blended(stage) for stage in self.stages)
+
+    def table_coords(self, x, y, input_width, input_height, **kwargs):
+        sizes = [(input_width, input_height)]
+        sizes += [(stage.output_width, stage.output_height) for stage in self.stages[:-1]]
+
+        # Same walk as `source_coords()`. Once the (single) blended stage has split a
+        # pixel into two taps, the secondary taps are carried back through the
+        # earlier stages as well.
+        blend = None
+        for stage, names, (width, height) in reversed(
+            list(zip(self.stages, self._stage_kwargs, sizes, strict=True))
+        ):
+            stage_kwargs = _select(kwargs, names)
+            if blend is not None:
+                blend_x, blend_y, weight = blend
+                blend_x, blend_y = stage.source_coords(
+                    blend_x, blend_y, width, height, **stage_kwargs
+                )
+                blend = (blend_x, blend_y, weight)
+            if _is_blended(stage):
+                x, y, blend = stage.table_coords(x, y, width, height, **stage_kwargs)
+            else:
+                x, y = stage.source_coords(x, y, width, height, **stage_kwargs)
+        return x, y, blend
+
+    def map_key(self, **kwargs):
+        return tuple(
+            stage.map_key(**_select(kwargs, names))
+            for stage, names in zip(self.stages, self._stage_kwargs, strict=True)
+        )
+
+
+class TransformPipeline(VideoTransform):
+    """
+    Chains several `VideoTransform`s into one, minimising full-frame memory passes.
+
+    When the pipeline is built, its stages are planned as follows:
+
+    - Consecutive geometric transforms (reprojection, resize, crop, ...) are fused
+      into a single remap table, so the frame is sampled once no matter how many
+      geometric steps are chained. Tables are cached per input size and dynamic
+      parameters (e.g. head rotation). A run holds at most one blended stage
+      (e.g. `DualFisheye2Equi`), whose seam taps are carried through the fusion.
+    - Per-pixel colour conversions that commute with resampling (see
+      `VideoTransform.commutes_with_remap`) are deferred until after the fused
+      remap, where they run on the smaller output, in place when possible.
+    - Every step writes into a buffer that is reused across frames.
+
+    Dynamic parameters passed to `transform()` are forwarded to each stage that
+    declares them, so stages with different signatures can be mixed freely.
+
+    NOTE: The returned array is overwritten by the next call. Copy it (or hand it to
+          `VideoFrame.from_ndarray`, which copies) before transforming another frame.
+
+    Args:
+        transforms (list[VideoTransform]): The stages, in the order they should be applied.
+    """
+
+    def __init__(self, transforms: list[VideoTransform]):
+        if not transforms:
+            raise ValueError("TransformPipeline needs at least one transform.")
+        self.transforms = list(transforms)
+        self._steps = self._plan(self.transforms)
+        self._step_kwargs = [_accepted_kwargs(step.transform) for step in self._steps]
+
+    @staticmethod
+    def _plan(transforms: list[VideoTransform]) -> list[VideoTransform]:
+        steps: list[VideoTransform] = []
+        run: list[VideoTransform] = []
+
+        def flush():
+            geometric = [t for t in run if t.is_geometric]
+            if len(geometric) == 1 and isinstance(geometric[0], RemapTransform):
+                steps.append(geometric[0])
+            elif geometric:
+                steps.append(_FusedRemap(geometric))
+            steps.extend(t for t in run if not t.is_geometric)
+            run.clear()
+
+        for t in transforms:
+            if _is_blended(t) and any(_is_blended(r) for r in run):
+                # Two blended stages would need four taps per pixel; sample twice instead.
+                flush()
+            if t.is_geometric or t.commutes_with_remap:
+                run.append(t)
+            else:
+                flush()
+                steps.append(t)
+        flush()
+        return steps
+
+    @property
+    def steps(self) -> list[VideoTransform]:
+        """The planned execution steps (fused remaps and the remaining transforms)."""
+        return list(self._steps)
+
+    @property
+    def output_width(self) -> int | None:
+        for t in reversed(self.transforms):
+            if t.output_width is not None:
+                return t.output_width
+        return None
+
+    @property
+    def output_height(self) -> int | None:
+        for t in reversed(self.transforms):
+            if t.output_height is not None:
+                return t.output_height
+        return None
+
+    @property
+    def is_geometric(self) -> bool:
+        return len(self._steps) == 1 and self._steps[0].is_geometric
+
+    def source_coords(self, x, y, input_width, input_height, **kwargs):
+        if not self.is_geometric:
+            return super().source_coords(x, y, input_width, input_height, **kwargs)
+        return self._steps[0].source_coords(x, y, input_width, input_height, **kwargs)
+
+    @property
+    def is_blended(self) -> bool:
+        return self.is_geometric and _is_blended(self._steps[0])
+
+    def table_coords(self, x, y, input_width, input_height, **kwargs):
+        if not self.is_blended:
+            return (*self.source_coords(x, y, input_width, input_height, **kwargs), None)
+        return self._steps[0].table_coords(x, y, input_width, input_height, **kwargs)
+
+    def map_key(self, **kwargs):
+        if not self.is_geometric:
+            return None
+        return self._steps[0].map_key(**kwargs)
+
+    @property
+    def cache_nbytes(self) -> int:
+        return sum(step.cache_nbytes for step in self._steps)
+
+    def set_sharers(self, count: int):
+        for step in self._steps:
+            step.set_sharers(count)
+
+    def transform(self, frame: np.ndarray, **kwargs) -> np.ndarray:
+        """
+        Runs the frame through every step.
+
+        Args:
+            frame (np.ndarray): The input frame.
+            **kwargs: Dynamic parameters; each stage receives the ones it declares.
+
+        Returns:
+            np.ndarray: The output of the last step.
+        """
+        source = frame
+        owned = False  # Whether `frame` is a buffer owned by one of our steps.
+        for step, names in zip(self._steps, self._step_kwargs, strict=True):
+            step_kwargs = _select(kwargs, names)
+            if owned and getattr(step, "preserves_channels", False):
+                frame = step.transform(frame, out=frame, **step_kwargs)
+            else:
+                frame = step.transform(frame, **step_kwargs)
+            # Steps may return views of their input (e.g. `Crop`); never write into
+            # the caller's frame.
+            owned = not np.may_share_memory(frame, source)
+        return frame
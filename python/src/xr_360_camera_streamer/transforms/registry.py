@@ -0,0 +1,168 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+
+from .. import logger
+from .base import VideoTransform
+
+
+class _Entry:
+    def __init__(self, key: Hashable, transform: VideoTransform):
+        self.key = key
+        self.transform = transform
+        self.refcount = 0
+
+
+class TransformRegistry:
+    """
+    A process-wide registry that shares transform instances between peers.
+
+    Peers that ask for the same output spec (factory plus arguments, e.g. the same
+    output size and FOV) receive the same instance, so expensive precomputed data
+    such as remap tables and ray grids exists once per spec instead of once per peer.
+    The library's remap-based transforms are safe to share: their tables are
+    read-only and each thread writes into its own output buffer.
+
+    Instances are reference counted. Call `release()` when a peer is done; the
+    instance is dropped once no peer holds it, unless `max_idle` allows keeping it
+    for the next peer that asks for the same spec (so a reconnecting peer does not
+    rebuild its tables).
+
+    Args:
+        max_idle (int): Number of unused instances to keep, least recently used
+            dropped first. Defaults to 0 (drop at once).
+
+    Example:
+        registry = get_transform_registry()
+        transform = registry.acquire(EquilibEqui2Pers, output_width=1280,
+                                     output_height=720, fov_x=90.0)
+        ...
+        registry.release(transform)
+    """
+
+    def __init__(self, max_idle: int = 0):
+        self._entries: dict[Hashable, _Entry] = {}
+        self._by_id: dict[int, _Entry] = {}
+        self._idle: OrderedDict[Hashable, _Entry] = OrderedDict()  # Unused, oldest first
+        self._max_idle = max_idle
+        self._lock = threading.Lock()
+
+    @property
+    def max_idle(self) -> int:
+        """Number of unused instances kept for reuse."""
+        return self._max_idle
+
+    @max_idle.setter
+    def max_idle(self, value: int):
+        with self._lock:
+            self._max_idle = value
+            self._trim_idle(value)
+
+    @staticmethod
+    def make_key(factory: Callable[..., VideoTransform], *args, **kwargs) -> Hashable:
+        """Builds the registry key for a spec. All arguments must be hashable."""
+        key = (factory, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError as e:
+            raise TypeError(
+                f"Transform spec for {getattr(factory, '__name__', factory)} must only "
+                f"contain hashable arguments: {e}"
+            ) from e
+        return key
+
+    def acquire(self, factory: Callable[..., VideoTransform], *args, **kwargs) -> VideoTransform:
+        """
+        Returns the shared transform for a spec, creating it on first use.
+
+        Args:
+            factory (callable): A `VideoTransform` class or a function that builds one
+                (e.g. a `TransformPipeline`).
+            *args: Positional arguments for `factory`; part of the spec.
+            **kwargs: Keyword arguments for `factory`; part of the spec.
+
+        Returns:
+            VideoTransform: The shared instance. Pass it to `release()` when done.
+        """
+        key = self.make_key(factory, *args, **kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # NOTE: built under the lock so concurrent peers never build a spec twice.
+                entry = _Entry(key, factory(*args, **kwargs))
+                self._entries[key] = entry
+                self._by_id[id(entry.transform)] = entry
+                logger.debug(f"TransformRegistry: created {self._describe(key)}")
+            elif self._idle.pop(key, None) is not None:
+                logger.debug(f"TransformRegistry: reusing {self._describe(key)}")
+            entry.refcount += 1
+            entry.transform.set_sharers(entry.refcount)
+            return entry.transform
+
+    def release(self, transform: VideoTransform):
+        """
+        Returns a transform obtained from `acquire()`. The instance is dropped (or
+        kept idle, see `max_idle`) once its last holder has released it.
+        """
+        with self._lock:
+            entry = self._by_id.get(id(transform))
+            if entry is None or entry.transform is not transform:
+                logger.warning(f"TransformRegistry: release of unknown transform {transform!r}")
+                return
+            entry.refcount -= 1
+            if entry.refcount <= 0:
+                entry.refcount = 0
+                self._idle[entry.key] = entry
+                self._trim_idle(self._max_idle)
+            entry.transform.set_sharers(entry.refcount)
+
+    def clear_idle(self):
+        """Drops all unused instances."""
+        with self._lock:
+            self._trim_idle(0)
+
+    def _trim_idle(self, keep: int):
+        # NOTE: called with the lock held.
+        while len(self._idle) > keep:
+            key, entry = self._idle.popitem(last=False)
+            del self._entries[key]
+            del self._by_id[id(entry.transform)]
+            logger.debug(f"TransformRegistry: dropped {self._describe(key)}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def _describe(key: Hashable) -> str:
+        factory, args, kwargs = key
+        params = [repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs]
+        return f"{getattr(factory, '__name__', repr(factory))}({', '.join(params)})"
+
+    def memory_report(self) -> list[dict]:
+        """
+        Reports, per spec, how many peers share it and how much precomputed data it
+        holds. Idle instances (see `max_idle`) have a `refcount` of 0.
+
+        Returns:
+            list[dict]: One entry per spec with `spec`, `refcount` and `cache_nbytes`
+                (bytes held once, no matter how many peers share the instance).
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+        return [
+            {
+                "spec": self._describe(entry.key),
+                "refcount": entry.refcount,
+                "cache_nbytes": entry.transform.cache_nbytes,
+            }
+            for entry in entries
+        ]
+
+
+_registry = TransformRegistry()
+
+
+def get_transform_registry() -> TransformRegistry:
+    """Returns the process-wide `TransformRegistry`."""
+    return _registry
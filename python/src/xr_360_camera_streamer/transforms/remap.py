@@ -0,0 +1,395 @@
+import abc
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+
+import cv2
+import numpy as np
+
+from .base import VideoTransform
+
+# Max distinct (input size, dynamic parameters) entries kept per table cache.
+# Static transforms need 1; head-tracked ones mostly hit the latest few poses.
+MAP_CACHE_MAXSIZE = 8
+# Entries kept per peer sharing a transform (its current and previous pose), so
+# peers looking in different directions do not evict each other's tables.
+MAP_CACHE_PER_SHARER = 2
+
+INTERPOLATION_FLAGS = {
+    "nearest": cv2.INTER_NEAREST,
+    "bilinear": cv2.INTER_LINEAR,
+    "bicubic": cv2.INTER_CUBIC,
+}
+
+
+def output_grid(width: int, height: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the (x, y) pixel coordinate grids of a `width` x `height` frame."""
+    xs = np.arange(width, dtype=np.float32)
+    ys = np.arange(height, dtype=np.float32)
+    return np.meshgrid(xs, ys)
+
+
+def reuse_buffer(buffer: np.ndarray | None, shape: tuple, dtype: np.dtype) -> np.ndarray:
+    """Returns `buffer` if it already has the requested shape and dtype, else a new array."""
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        return np.empty(shape, dtype=dtype)
+    return buffer
+
+
+# Row length of the packed seam-tap maps in `RemapTable`.
+_BLEND_ROW_LENGTH = 1024
+
+
+class OutputBuffers(threading.local):
+    """
+    Per-thread output buffers, so a transform instance can be shared between peers
+    (see `TransformRegistry`) while each thread keeps writing into its own memory.
+    """
+
+    def __init__(self):
+        self.out = None
+
+    def get(self, shape: tuple, dtype: np.dtype) -> np.ndarray:
+        """Returns this thread's buffer, (re)allocating it if the shape or dtype changed."""
+        self.out = reuse_buffer(self.out, shape, dtype)
+        return self.out
+
+
+class RemapTable:
+    """
+    A precomputed `cv2.remap` lookup table.
+
+    The float maps are converted to OpenCV's fixed-point representation once, which
+    halves their memory footprint and makes every subsequent sampling pass faster.
+
+    A table can also carry a second, sparse set of taps (`blend`) for output pixels
+    that mix two source positions, such as the seam between two fisheye lenses.
+    Only pixels with a non-zero blend weight are stored and resampled, so a narrow
+    seam band adds little to the cost of a frame.
+
+    Args:
+        map_x (np.ndarray): Horizontal source coordinate for every output pixel.
+        map_y (np.ndarray): Vertical source coordinate for every output pixel.
+        interpolation (str): One of "nearest", "bilinear" or "bicubic".
+        border_mode (int): OpenCV border mode used for out-of-range samples.
+        blend (tuple[np.ndarray, np.ndarray, np.ndarray], optional): Second source
+            (x, y) coordinates and their weight in [0, 1] for every output pixel.
+            The output is `(1 - weight) * primary + weight * secondary`.
+    """
+
+    def __init__(
+        self,
+        map_x: np.ndarray,
+        map_y: np.ndarray,
+        interpolation: str = "bilinear",
+        border_mode: int = cv2.BORDER_REPLICATE,
+        blend: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None,
+    ):
+        self.height, self.width = map_x.shape[:2]
+        self.interpolation = INTERPOLATION_FLAGS[interpolation]
+        self.border_mode = border_mode
+        self.map1, self.map2 = self._convert(map_x, map_y)
+
+        self.blend_index = self.blend_weights = None
+        if blend is not None:
+            blend_x, blend_y, weight = blend
+            index = np.flatnonzero(weight > 0)
+            if index.size:
+                self.blend_index = index
+                # (primary, secondary) weights as N x 1 columns for `cv2.blendLinear`.
+                secondary = weight.reshape(-1)[index].astype(np.float32)[:, np.newaxis]
+                self.blend_weights = (1 - secondary, secondary)
+                # Packed into a small "image" so the taps are sampled with one remap
+                # call (OpenCV limits each side to SHRT_MAX pixels).
+                padding = -index.size % _BLEND_ROW_LENGTH
+                self.blend_map1, self.blend_map2 = self._convert(
+                    *(
+                        np.pad(coords.reshape(-1)[index], (0, padding)).reshape(
+                            -1, _BLEND_ROW_LENGTH
+                        )
+                        for coords in (blend_x, blend_y)
+                    )
+                )
+
+        # Tables may be shared between threads and peers; make accidental writes fail.
+        for array in self._arrays():
+            array.flags.writeable = False
+
+    @staticmethod
+    def _convert(map_x: np.ndarray, map_y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return cv2.convertMaps(
+            map_x.astype(np.float32, copy=False),
+            map_y.astype(np.float32, copy=False),
+            cv2.CV_16SC2,
+        )
+
+    def _arrays(self) -> list[np.ndarray]:
+        arrays = [self.map1, self.map2]
+        if self.blend_index is not None:
+            arrays += [self.blend_index, *self.blend_weights, self.blend_map1, self.blend_map2]
+        return arrays
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the lookup table, in bytes."""
+        return sum(array.nbytes for array in self._arrays())
+
+    def apply(self, frame: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Samples `frame` through the table in a single pass.
+
+        Args:
+            frame (np.ndarray): The input frame (H, W) or (H, W, C).
+            out (np.ndarray, optional): A preallocated, contiguous output array of
+                shape (table height, table width, C) and the same dtype as `frame`.
+
+        Returns:
+            np.ndarray: The remapped frame (`out` if it was given).
+        """
+        out = cv2.remap(
+            frame,
+            self.map1,
+            self.map2,
+            self.interpolation,
+            dst=out,
+            borderMode=self.border_mode,
+        )
+        if self.blend_index is not None:
+            self._apply_blend(frame, out)
+        return out
+
+    def _apply_blend(self, frame: np.ndarray, out: np.ndarray):
+        taps = cv2.remap(
+            frame,
+            self.blend_map1,
+            self.blend_map2,
+            self.interpolation,
+            borderMode=self.border_mode,
+        )
+        # Work on N x 1 "images" of the seam pixels only.
+        channels = out.shape[2:]
+        taps = taps.reshape(-1, 1, *channels)[: self.blend_index.size]
+        flat = out.reshape(-1, *channels)
+        primary = np.take(flat, self.blend_index, axis=0)[:, np.newaxis]
+        blended = cv2.blendLinear(primary, taps, *self.blend_weights)
+        # Scatter whole pixels at once through an opaque per-pixel dtype; much faster
+        # than row-wise fancy assignment.
+        pixel = np.dtype((np.void, flat.itemsize * int(np.prod(channels))))
+        np.put(flat.view(pixel), self.blend_index, blended.view(pixel))
+
+
+class RemapTableCache:
+    """
+    A small, thread-safe LRU cache of `RemapTable`s keyed by input size and dynamic
+    parameters.
+
+    Args:
+        maxsize (int): Max number of tables to keep.
+    """
+
+    def __init__(self, maxsize: int = MAP_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._tables: OrderedDict[Hashable, RemapTable] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build) -> RemapTable:
+        """Returns the table for `key`, building it with `build()` on a miss."""
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+
+        # Build outside the lock so one slow build does not stall other threads.
+        table = build()
+        with self._lock:
+            while self._tables and len(self._tables) >= self.maxsize:
+                self._tables.popitem(last=False)
+            self._tables[key] = table
+        return table
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by all cached tables, in bytes."""
+        with self._lock:
+            return sum(table.nbytes for table in self._tables.values())
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+class RemapTransform(VideoTransform):
+    """
+    Base class for transforms that can be expressed as a per-pixel coordinate remap.
+
+    Subclasses only implement `source_coords()` (and `map_key()` if the mapping
+    depends on per-frame parameters). Building, caching and sampling the lookup
+    tables is handled here, and the output is written to a buffer that is reused
+    across frames, so a steady-state frame costs a single pass and no allocations.
+    Transforms that mix two source positions per output pixel also set
+    `is_blended` and override `table_coords()`.
+
+    Instances are safe to share between threads: tables are read-only and built
+    under a lock, and each thread gets its own output buffer.
+
+    NOTE: The returned array is overwritten by the next call from the same thread.
+          Copy it (or hand it to `VideoFrame.from_ndarray`, which copies) before
+          transforming another frame.
+
+    Args:
+        interpolation (str): One of "nearest", "bilinear" or "bicubic".
+            Defaults to "bilinear".
+    """
+
+    #: OpenCV border mode used when sampling the input frame.
+    border_mode = cv2.BORDER_REPLICATE
+
+    def __init__(self, interpolation: str = "bilinear"):
+        if interpolation not in INTERPOLATION_FLAGS:
+            raise ValueError(
+                f"Unsupported interpolation '{interpolation}'. "
+                f"Choose one of {list(INTERPOLATION_FLAGS)}."
+            )
+        self.interpolation = interpolation
+        self._tables = RemapTableCache()
+        self._buffers = OutputBuffers()
+
+    @property
+    def is_geometric(self) -> bool:
+        return True
+
+    @property
+    def is_blended(self) -> bool:
+        """Whether `table_coords()` returns a second set of blended taps."""
+        return False
+
+    @abc.abstractmethod
+    def source_coords(
+        self, x: np.ndarray, y: np.ndarray, input_width: int, input_height: int, **kwargs
+    ) -> tuple[np.ndarray, np.ndarray]:
+        pass
+
+    def table_coords(
+        self, x: np.ndarray, y: np.ndarray, input_width: int, input_height: int, **kwargs
+    ) -> tuple[np.ndarray, np.ndarray, tuple[np.ndarray, np.ndarray, np.ndarray] | None]:
+        """
+        Like `source_coords()`, but also returns the optional blend taps of the
+        table (see `RemapTable`). The default has none.
+
+        Returns:
+            tuple: The primary (x, y) input coordinates and either `None` or the
+                secondary `(x, y, weight)` arrays.
+        """
+        map_x, map_y = self.source_coords(x, y, input_width, input_height, **kwargs)
+        return map_x, map_y, None
+
+    def get_table(self, input_width: int, input_height: int, **kwargs) -> RemapTable:
+        """Returns the (cached) lookup table for the given input size and parameters."""
+
+        def build() -> RemapTable:
+            xs, ys = output_grid(self.output_width, self.output_height)
+            map_x, map_y, blend = self.table_coords(xs, ys, input_width, input_height, **kwargs)
+            return RemapTable(map_x, map_y, self.interpolation, self.border_mode, blend=blend)
+
+        key = (input_width, input_height, self.map_key(**kwargs))
+        return self._tables.get(key, build)
+
+    @property
+    def cache_nbytes(self) -> int:
+        return self._tables.nbytes
+
+    def set_sharers(self, count: int):
+        self._tables.maxsize = max(MAP_CACHE_MAXSIZE, MAP_CACHE_PER_SHARER * count)
+
+    def transform(self, frame: np.ndarray, out: np.ndarray | None = None, **kwargs) -> np.ndarray:
+        """
+        Remaps a frame in a single sampling pass.
+
+        Args:
+            frame (np.ndarray): The input frame (H, W, C).
+            out (np.ndarray, optional): Caller-owned output buffer. If omitted, a
+                per-thread internal buffer is reused across calls.
+            **kwargs: Dynamic parameters forwarded to `source_coords()`.
+
+        Returns:
+            np.ndarray: The transformed frame.
+        """
+        height, width = frame.shape[:2]
+        table = self.get_table(width, height, **kwargs)
+        if out is None:
+            shape = (self.output_height, self.output_width) + frame.shape[2:]
+            out = self._buffers.get(shape, frame.dtype)
+        return table.apply(frame, out)
+
+
+class Resize(RemapTransform):
+    """
+    Scales frames to a fixed output size.
+
+    NOTE: Sampling is point-wise (no area averaging), so large downscale factors may
+          alias. Inside a `TransformPipeline` the resize is folded into the
+          neighbouring remaps at no extra cost.
+
+    Args:
+        output_width (int): The width of the output frames.
+        output_height (int): The height of the output frames.
+        interpolation (str): One of "nearest", "bilinear" or "bicubic".
+    """
+
+    def __init__(self, output_width: int, output_height: int, interpolation: str = "bilinear"):
+        super().__init__(interpolation=interpolation)
+        self._output_width = output_width
+        self._output_height = output_height
+
+    @property
+    def output_width(self) -> int:
+        return self._output_width
+
+    @property
+    def output_height(self) -> int:
+        return self._output_height
+
+    def source_coords(self, x, y, input_width, input_height, **kwargs):
+        # Align pixel centres, like `cv2.resize`.
+        scale_x = input_width / self._output_width
+        scale_y = input_height / self._output_height
+        return (x + 0.5) * scale_x - 0.5, (y + 0.5) * scale_y - 0.5
+
+
+class Crop(RemapTransform):
+    """
+    Cuts a fixed rectangle out of each frame.
+
+    Args:
+        x (int): Left edge of the crop rectangle.
+        y (int): Top edge of the crop rectangle.
+        width (int): Width of the crop rectangle.
+        height (int): Height of the crop rectangle.
+    """
+
+    def __init__(self, x: int, y: int, width: int, height: int):
+        super().__init__(interpolation="nearest")
+        self.x = x
+        self.y = y
+        self._output_width = width
+        self._output_height = height
+
+    @property
+    def output_width(self) -> int:
+        return self._output_width
+
+    @property
+    def output_height(self) -> int:
+        return self._output_height
+
+    def source_coords(self, x, y, input_width, input_height, **kwargs):
+        return x + self.x, y + self.y
+
+    def transform(self, frame: np.ndarray, out: np.ndarray | None = None, **kwargs) -> np.ndarray:
+        """Crops a frame. Without `out`, this returns a view and touches no pixels."""
+        view = frame[self.y : self.y + self.output_height, self.x : self.x + self.output_width]
+        if out is None:
+            return view
+        np.copyto(out, view)
+        return out
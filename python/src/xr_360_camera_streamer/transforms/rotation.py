@@ -0,0 +1,161 @@
+"""
+Rotation helpers shared by the reprojection transforms and orientation tracks.
+
+Matrices act on rays in the frame of `spherical.py` (+X forward, +Y right, +Z down).
+Euler angles follow the viewer convention of `EquilibEqui2Pers` (i.e. `equilib`'s
+`create_rotation_matrix(..., z_down=False)`), in radians. Quaternions are stored as
+(w, x, y, z) along the last axis, and every quaternion function accepts stacked
+arrays of them.
+"""
+
+import numpy as np
+
+
+def rotation_matrix(roll: float, pitch: float, yaw: float) -> np.ndarray:
+    """
+    Builds the rotation for a viewer orientation, matching `EquilibEqui2Pers`.
+
+    Args:
+        roll (float): Rotation about the forward axis, in radians.
+        pitch (float): Rotation about the right axis, in radians.
+        yaw (float): Rotation about the vertical axis, in radians.
+
+    Returns:
+        np.ndarray: The 3x3 rotation matrix (float64).
+    """
+    # Same as `create_rotation_matrix(roll, pitch, yaw, z_down=False)`.
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(-pitch), np.sin(-pitch)
+    cy, sy = np.cos(-yaw), np.sin(-yaw)
+    R_x = np.array([[1.0, 0.0, 0.0], [0.0, cr, -sr], [0.0, sr, cr]])
+    R_y = np.array([[cp, 0.0, sp], [0.0, 1.0, 0.0], [-sp, 0.0, cp]])
+    R_z = np.array([[cy, -sy, 0.0], [sy, cy, 0.0], [0.0, 0.0, 1.0]])
+    return R_z @ R_y @ R_x
+
+
+def matrix_to_rotation(R: np.ndarray) -> dict[str, float]:
+    """
+    Inverse of `rotation_matrix()`.
+
+    Args:
+        R (np.ndarray): A 3x3 rotation matrix.
+
+    Returns:
+        dict[str, float]: The "roll", "pitch" and "yaw" angles in radians, in the
+            format `EquilibEqui2Pers.transform()` takes as `rot`.
+    """
+    # R = Rz(-yaw) @ Ry(-pitch) @ Rx(roll)
+    cos_pitch = np.hypot(R[0, 0], R[1, 0])
+    if cos_pitch > 1e-9:
+        roll = np.arctan2(R[2, 1], R[2, 2])
+        yaw = -np.arctan2(R[1, 0], R[0, 0])
+    else:
+        # Looking straight up or down: roll and yaw are the same axis.
+        roll = 0.0
+        yaw = -np.arctan2(-R[0, 1], R[1, 1])
+    pitch = -np.arctan2(-R[2, 0], cos_pitch)
+    return {"roll": float(roll), "pitch": float(pitch), "yaw": float(yaw)}
+
+
+def heading_matrix(R: np.ndarray) -> np.ndarray:
+    """
+    Returns the yaw-only part of an orientation: a rotation about the vertical axis
+    that points forward in the same compass direction as `R`.
+    """
+    heading = np.arctan2(R[1, 0], R[0, 0])
+    c, s = np.cos(heading), np.sin(heading)
+    return np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+
+
+def quat_normalize(q: np.ndarray) -> np.ndarray:
+    """Scales quaternions to unit length."""
+    q = np.asarray(q, dtype=np.float64)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def quat_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Hamilton product `a * b` (apply `b`, then `a`)."""
+    aw, ax, ay, az = np.moveaxis(np.asarray(a, dtype=np.float64), -1, 0)
+    bw, bx, by, bz = np.moveaxis(np.asarray(b, dtype=np.float64), -1, 0)
+    return np.stack(
+        [
+            aw * bw - ax * bx - ay * by - az * bz,
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+        ],
+        axis=-1,
+    )
+
+
+def quat_from_rotvec(rotvec: np.ndarray) -> np.ndarray:
+    """Converts rotation vectors (axis * angle in radians) to unit quaternions."""
+    rotvec = np.asarray(rotvec, dtype=np.float64)
+    angle = np.linalg.norm(rotvec, axis=-1, keepdims=True)
+    half = angle / 2
+    # sin(half) / angle, with its limit of 1/2 for tiny angles.
+    scale = np.where(angle > 1e-12, np.sin(half) / np.maximum(angle, 1e-12), 0.5)
+    return np.concatenate([np.cos(half), rotvec * scale], axis=-1)
+
+
+def quat_to_matrix(q: np.ndarray) -> np.ndarray:
+    """Converts unit quaternions (..., 4) to rotation matrices (..., 3, 3)."""
+    w, x, y, z = np.moveaxis(quat_normalize(q), -1, 0)
+    return np.stack(
+        [
+            np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], -1),
+            np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], -1),
+            np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], -1),
+        ],
+        axis=-2,
+    )
+
+
+def matrix_to_quat(R: np.ndarray) -> np.ndarray:
+    """Converts a 3x3 rotation matrix to a unit quaternion."""
+    R = np.asarray(R, dtype=np.float64)
+    # Shepperd's method: pivot on the largest diagonal term for stability.
+    trace = np.trace(R)
+    if trace > 0:
+        s = 2 * np.sqrt(1 + trace)
+        q = [s / 4, (R[2, 1] - R[1, 2]) / s, (R[0, 2] - R[2, 0]) / s, (R[1, 0] - R[0, 1]) / s]
+    else:
+        i = int(np.argmax(np.diag(R)))
+        j, k = (i + 1) % 3, (i + 2) % 3
+        s = 2 * np.sqrt(1 + R[i, i] - R[j, j] - R[k, k])
+        q = [0.0] * 4
+        q[0] = (R[k, j] - R[j, k]) / s
+        q[1 + i] = s / 4
+        q[1 + j] = (R[j, i] + R[i, j]) / s
+        q[1 + k] = (R[k, i] + R[i, k]) / s
+    return quat_normalize(np.array(q))
+
+
+def quat_slerp(q0: np.ndarray, q1: np.ndarray, t: np.ndarray | float) -> np.ndarray:
+    """
+    Spherical linear interpolation between unit quaternions.
+
+    Args:
+        q0 (np.ndarray): Start quaternions (..., 4).
+        q1 (np.ndarray): End quaternions (..., 4).
+        t (np.ndarray | float): Interpolation factors in [0, 1], broadcast against
+            the leading dimensions.
+
+    Returns:
+        np.ndarray: The interpolated unit quaternions.
+    """
+    q0 = np.asarray(q0, dtype=np.float64)
+    q1 = np.asarray(q1, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., np.newaxis]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    # Take the short way round.
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.abs(dot)
+
+    angle = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_angle = np.sin(angle)
+    nearly_equal = sin_angle < 1e-6
+    safe = np.where(nearly_equal, 1.0, sin_angle)
+    w0 = np.where(nearly_equal, 1 - t, np.sin((1 - t) * angle) / safe)
+    w1 = np.where(nearly_equal, t, np.sin(t * angle) / safe)
+    return quat_normalize(w0 * q0 + w1 * q1)
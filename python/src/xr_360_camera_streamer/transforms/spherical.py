@@ -0,0 +1,63 @@
+"""
+Helpers for converting between 3D viewing rays and equirectangular pixel coordinates.
+
+The conventions follow `equilib`'s numpy backend: rays use +X forward, +Y right and
++Z down, so looking along +X lands in the horizontal centre of the equirectangular
+frame and the top row is straight up.
+"""
+
+import numpy as np
+
+
+def rays_to_equirect(
+    x: np.ndarray, y: np.ndarray, z: np.ndarray, equi_width: int, equi_height: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Projects viewing rays onto equirectangular pixel coordinates.
+
+    Args:
+        x (np.ndarray): X components of the ray directions (any shape).
+        y (np.ndarray): Y components of the ray directions.
+        z (np.ndarray): Z components of the ray directions. Rays do not need to be
+            normalized.
+        equi_width (int): Width of the equirectangular frame in pixels.
+        equi_height (int): Height of the equirectangular frame in pixels.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The (u, v) pixel coordinates as float32 arrays.
+            u is wrapped into [0, equi_width) and v is clamped to [0, equi_height - 1].
+    """
+    # Components are handled separately (rather than as an (..., 3) array) to keep
+    # every intermediate contiguous; this runs once per head pose for full frames.
+    phi = np.arctan2(z, np.hypot(x, y))
+    theta = np.arctan2(y, x)
+
+    # NOTE: matches `equilib.equi2pers.numpy.convert_grid` so that fused remaps
+    #       sample exactly where `Equi2Pers` would.
+    u = (theta - np.pi) * (equi_width / (2 * np.pi)) + 0.5
+    v = (phi + np.pi / 2) * (equi_height / np.pi) + 0.5
+    u %= equi_width
+    np.clip(v, 0, equi_height - 1, out=v)
+    return u.astype(np.float32, copy=False), v.astype(np.float32, copy=False)
+
+
+def equirect_to_rays(
+    u: np.ndarray, v: np.ndarray, equi_width: int, equi_height: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Inverse of `rays_to_equirect()`: turns equirectangular pixel coordinates into unit rays.
+
+    Args:
+        u (np.ndarray): Horizontal pixel coordinates.
+        v (np.ndarray): Vertical pixel coordinates.
+        equi_width (int): Width of the equirectangular frame in pixels.
+        equi_height (int): Height of the equirectangular frame in pixels.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The (x, y, z) components of the unit
+            ray directions.
+    """
+    theta = (u - 0.5) * (2 * np.pi / equi_width) + np.pi
+    phi = (v - 0.5) * (np.pi / equi_height) - np.pi / 2
+    cos_phi = np.cos(phi)
+    return cos_phi * np.cos(theta), cos_phi * np.sin(theta), np.sin(phi)
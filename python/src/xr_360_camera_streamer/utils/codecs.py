@@ -1,7 +1,73 @@
+import fractions
+import time
+
+import av
+import numpy as np
+from aiortc import RTCPeerConnection, RTCRtpCodecParameters, RTCRtpSender, RTCRtpTransceiver
 from aiortc.codecs import h264, vpx
+from aiortc.rtcrtpparameters import RTCRtpCodecCapability
 
 from .. import logger
 
+# RTP clock rate for video.
+VIDEO_CLOCK_RATE = 90000
+
+# libavcodec encoder per negotiated codec (lower-case mime subtype).
+ENCODER_NAMES = {
+    "h264": "libx264",
+    "vp8": "libvpx",
+}
+
+# All encoders that can produce each codec, hardware first.
+CODEC_ENCODERS = {
+    "h264": ["h264_nvenc", "h264_qsv", "h264_videotoolbox", "libx264"],
+    "vp8": ["libvpx"],
+}
+
+# Encoder options that spread intra refresh over the frames of each keyframe interval
+# instead of sending periodic keyframes. Encoders not listed do not support it.
+INTRA_REFRESH_OPTIONS = {
+    "libx264": {"intra-refresh": "1"},
+    "h264_nvenc": {"intra-refresh": "1"},
+}
+
+# Encoder options per tuning profile and encoder, from lowest latency to best quality.
+# None of them use B-frames or look-ahead across frames in a way that delays output
+# beyond the stated latency, since WebRTC peers decode frames as they arrive.
+ENCODER_PROFILES = {
+    # Every frame out as soon as possible: fastest presets, sliced threads (no frame
+    # delay), and H.264 slices that fit one RTP packet so a lost packet only damages
+    # a slice.
+    "ultra-low-latency": {
+        "libx264": {
+            "preset": "ultrafast",
+            "tune": "zerolatency",
+            "sliced-threads": "1",
+            "x264-params": "slice-max-size=1200",
+        },
+        "h264_nvenc": {"preset": "p1", "tune": "ull", "zerolatency": "1", "delay": "0"},
+        "h264_qsv": {"preset": "veryfast", "async_depth": "1", "low_delay_brc": "1"},
+        "h264_videotoolbox": {"realtime": "1", "prio_speed": "1"},
+        "libvpx": {"deadline": "realtime", "cpu-used": "8", "error-resilient": "1"},
+    },
+    # Real-time encoding at a reasonable quality.
+    "balanced": {
+        "libx264": {"preset": "veryfast", "tune": "zerolatency"},
+        "h264_nvenc": {"preset": "p4", "tune": "ll", "zerolatency": "1"},
+        "h264_qsv": {"preset": "medium", "async_depth": "1"},
+        "h264_videotoolbox": {"realtime": "1"},
+        "libvpx": {"deadline": "realtime", "cpu-used": "4"},
+    },
+    # Better compression per bit for stable networks, at a higher encode cost.
+    "quality": {
+        "libx264": {"preset": "medium", "tune": "zerolatency"},
+        "h264_nvenc": {"preset": "p6", "tune": "hq", "zerolatency": "1"},
+        "h264_qsv": {"preset": "slower", "async_depth": "1"},
+        "h264_videotoolbox": {"realtime": "0"},
+        "libvpx": {"deadline": "good", "cpu-used": "2", "lag-in-frames": "0"},
+    },
+}
+
 
 def maybe_enable_hardware_acceleration():
     """
@@ -11,6 +77,10 @@ def maybe_enable_hardware_acceleration():
     This function checks for the presence of NVIDIA, Intel Quick Sync (QSV),
     or macOS VideoToolbox hardware encoders and replaces the default software
     encoders in `aiortc` with the first one it finds for each codec.
+
+    This affects every encoder in the process and cannot be tuned; to choose the
+    encoder and its options per server, use `EncodedTrack` (`WebRTCServer`'s
+    `encoder_options`) with an encoder picked by `benchmark_encoders()`.
     """
     # H.264
     if hasattr(h264, "H264NvencEncoder"):
@@ -49,3 +119,399 @@ def get_video_codecs_from_sdp(sdp: str) -> str:
         if "rtx" not in line and "red" not in line and "ulpfec" not in line
     ]
     return "\n".join(codec_lines)
+
+
+def get_transceiver(pc: RTCPeerConnection, sender: RTCRtpSender) -> RTCRtpTransceiver | None:
+    """Returns the transceiver a sender belongs to."""
+    return next((t for t in pc.getTransceivers() if t.sender is sender), None)
+
+
+def get_negotiated_codec(
+    pc: RTCPeerConnection, sender: RTCRtpSender
+) -> RTCRtpCodecParameters | None:
+    """
+    Returns the codec a sender will encode with, once the offer/answer exchange has
+    set the remote description. This is the first non-RTX codec of its transceiver.
+    """
+    transceiver = get_transceiver(pc, sender)
+    if transceiver is None:
+        return None
+    return next((c for c in transceiver._codecs if codec_name(c) != "rtx"), None)
+
+
+def get_codec_preferences(
+    names: list[str], offered: list[RTCRtpCodecParameters]
+) -> list[RTCRtpCodecCapability]:
+    """
+    Returns the video capabilities for `RTCRtpTransceiver.setCodecPreferences()` that
+    make the peer negotiate the first of the given codecs it offered (e.g.
+    ["h264", "vp8"]: H.264 if the peer supports it, else VP8), plus RTX.
+
+    aiortc answers with the common codecs in the peer's order, so preferences can
+    only filter; the less preferred codecs are therefore left out. If none of them
+    was offered, the result is empty, meaning "no preference".
+    """
+    offered_names = {codec_name(c) for c in offered}
+    name = next((name for name in names if name in offered_names), None)
+    if name is None:
+        return []
+    capabilities = RTCRtpSender.getCapabilities("video").codecs
+    return [c for c in capabilities if codec_name(c) in (name, "rtx")]
+
+
+def get_video_bandwidth_from_sdp(sdp: str) -> int | None:
+    """
+    Returns the bandwidth limit of the first video section of an SDP (its `b=TIAS`
+    or `b=AS` line), in bits per second, or None if it has none.
+    """
+    in_video = False
+    limit = None
+    for line in sdp.splitlines():
+        if line.startswith("m="):
+            if in_video:
+                break
+            in_video = line.startswith("m=video")
+        elif in_video and line.startswith("b="):
+            modifier, _, value = line[2:].strip().partition(":")
+            try:
+                if modifier == "TIAS":
+                    return int(value)  # bits per second, without packet overhead
+                if modifier == "AS":
+                    limit = int(value) * 1000  # kilobits per second
+            except ValueError:
+                continue
+    return limit
+
+
+def set_video_bandwidth_in_sdp(sdp: str, bitrate: int) -> str:
+    """
+    Returns the SDP with `b=AS` and `b=TIAS` lines that limit the first video section
+    to `bitrate` (bits per second), replacing any existing ones.
+
+    aiortc writes its own description on every `setLocalDescription()`, so this is
+    applied to the SDP sent to the peer.
+    """
+    lines = sdp.splitlines()
+    start = next((i for i, line in enumerate(lines) if line.startswith("m=video")), None)
+    if start is None:
+        return sdp
+    end = next(
+        (i for i in range(start + 1, len(lines)) if lines[i].startswith("m=")), len(lines)
+    )
+    section = [line for line in lines[start:end] if not line.startswith("b=")]
+    # Bandwidth lines follow the connection line, or the media line if there is none.
+    position = 1 + next((i for i, line in enumerate(section) if line.startswith("c=")), 0)
+    section[position:position] = [f"b=AS:{max(1, bitrate // 1000)}", f"b=TIAS:{bitrate}"]
+    return "\r\n".join(lines[:start] + section + lines[end:]) + "\r\n"
+
+
+def has_h264_idr(data: bytes) -> bool:
+    """Whether an Annex B H.264 access unit contains an IDR slice (NAL unit type 5)."""
+    start = data.find(b"\x00\x00\x01")
+    while start != -1 and start + 3 < len(data):
+        if data[start + 3] & 0x1F == 5:
+            return True
+        start = data.find(b"\x00\x00\x01", start + 3)
+    return False
+
+
+def codec_name(codec: RTCRtpCodecParameters | RTCRtpCodecCapability | str) -> str:
+    """Returns the lower-case codec name, e.g. "h264" for "video/H264"."""
+    mime_type = codec if isinstance(codec, str) else codec.mimeType
+    return mime_type.split("/")[-1].lower()
+
+
+class VideoEncoder:
+    """
+    Encodes frames into `av.Packet`s once, so they can be handed to any number of
+    aiortc senders as pre-encoded data (a track's `recv()` may return packets
+    instead of frames; the sender then only packetizes them).
+
+    The defaults mirror aiortc's own H.264 and VP8 encoders, so peers see the same
+    stream they would get from a per-peer encode. A tuning `profile` (see
+    `ENCODER_PROFILES`) and a different libavcodec `encoder` (e.g. "h264_nvenc")
+    can be chosen instead; `benchmark_encoders()` measures which ones are fast
+    enough on the current machine.
+
+    Keyframes are sent every `keyframe_interval` and whenever `encode()` is asked
+    to force one (e.g. for a PLI/FIR or a new peer). With `intra_refresh`, the
+    periodic keyframes are replaced by a wave of intra-coded blocks that sweeps the
+    picture over each interval: the bitrate stays even, without the periodic
+    keyframe spikes that cause loss and latency on constrained links, while forced
+    keyframes still give new or recovering peers a clean start.
+
+    Args:
+        codec (str): "h264" or "vp8".
+        bitrate (int): Target bitrate in bits per second. Defaults to 2 Mbps.
+        framerate (int): Nominal frame rate, used by rate control. Defaults to 30.
+        options (dict, optional): Extra libavcodec options, overriding the defaults.
+        profile (str, optional): A key of `ENCODER_PROFILES`.
+        encoder (str, optional): The libavcodec encoder, one of `CODEC_ENCODERS[codec]`.
+            Defaults to the software encoder.
+        keyframe_interval (float, optional): Seconds between periodic keyframes (or
+            intra refresh waves). Defaults to the encoder's (about 8 s for x264,
+            100 s for VP8 as aiortc sets it).
+        intra_refresh (bool): Whether to use intra refresh instead of periodic
+            keyframes, if the encoder supports it (see `INTRA_REFRESH_OPTIONS`).
+            Defaults to False.
+    """
+
+    def __init__(
+        self,
+        codec: str = "h264",
+        bitrate: int = 2_000_000,
+        framerate: int = 30,
+        options: dict[str, str] | None = None,
+        profile: str | None = None,
+        encoder: str | None = None,
+        keyframe_interval: float | None = None,
+        intra_refresh: bool = False,
+    ):
+        self.codec = codec_name(codec)
+        if self.codec not in ENCODER_NAMES:
+            raise ValueError(
+                f"Unsupported video codec '{codec}'. Choose one of {list(ENCODER_NAMES)}."
+            )
+        if profile is not None and profile not in ENCODER_PROFILES:
+            raise ValueError(
+                f"Unknown encoder profile '{profile}'. Choose one of {list(ENCODER_PROFILES)}."
+            )
+        self.encoder = encoder or ENCODER_NAMES[self.codec]
+        if self.encoder not in CODEC_ENCODERS[self.codec]:
+            raise ValueError(
+                f"Encoder '{self.encoder}' does not produce {self.codec}. "
+                f"Choose one of {CODEC_ENCODERS[self.codec]}."
+            )
+        self.bitrate = bitrate
+        self.framerate = framerate
+        self.profile = profile
+        self.options = options or {}
+        self.keyframe_interval = keyframe_interval
+        self.intra_refresh = intra_refresh
+        if intra_refresh and self.encoder not in INTRA_REFRESH_OPTIONS:
+            logger.warning(
+                f"{self.encoder} does not support intra refresh, using periodic keyframes."
+            )
+        self._context = None
+
+    def set_bitrate(self, bitrate: int):
+        """
+        Changes the target bitrate. Like aiortc's encoders, the encoder is only
+        restarted (with a keyframe) once the change exceeds 10%.
+        """
+        self.bitrate = int(bitrate)
+        context = self._context
+        if context is not None and abs(self.bitrate - context.bit_rate) > 0.1 * context.bit_rate:
+            self._context = None
+
+    def _create_context(self, frame: av.VideoFrame):
+        context = av.CodecContext.create(self.encoder, "w")
+        context.width = frame.width
+        context.height = frame.height
+        context.bit_rate = self.bitrate
+        context.pix_fmt = "yuv420p"
+        context.framerate = fractions.Fraction(self.framerate, 1)
+        context.time_base = fractions.Fraction(1, VIDEO_CLOCK_RATE)
+        if self.encoder == "libx264":
+            # Same as `aiortc.codecs.h264.H264Encoder`: decodable by every browser.
+            options = {"level": "31", "tune": "zerolatency"}
+            context.profile = "Baseline"
+        elif self.codec == "h264":
+            options = {"profile": "baseline", "bf": "0"}
+        else:
+            # Same as `aiortc.codecs.vpx.Vp8Encoder`: real-time CBR.
+            context.gop_size = 3000
+            context.qmin = 2
+            context.qmax = 56
+            options = {
+                "bufsize": str(self.bitrate),
+                "cpu-used": "-6",
+                "deadline": "realtime",
+                "lag-in-frames": "0",
+                "minrate": str(self.bitrate),
+                "maxrate": str(self.bitrate),
+                "noise-sensitivity": "4",
+                "overshoot-pct": "15",
+                "partitions": "0",
+                "static-thresh": "1",
+                "undershoot-pct": "100",
+            }
+        if self.profile is not None:
+            options.update(ENCODER_PROFILES[self.profile].get(self.encoder, {}))
+        if self.keyframe_interval is not None:
+            context.gop_size = max(1, round(self.keyframe_interval * self.framerate))
+        if self.intra_refresh:
+            options.update(INTRA_REFRESH_OPTIONS.get(self.encoder, {}))
+        context.options = {**options, **self.options}
+        return context
+
+    def encode(self, frame: av.VideoFrame, force_keyframe: bool = False) -> av.Packet | None:
+        """
+        Encodes one frame.
+
+        Args:
+            frame (av.VideoFrame): The frame, with `pts` and `time_base` set.
+            force_keyframe (bool): Whether to force an IDR frame.
+
+        Returns:
+            av.Packet | None: The encoded frame (with `pts`, `time_base` and
+                `is_keyframe` set), or None if the encoder produced no output.
+        """
+        context = self._context
+        if context is not None and (frame.width, frame.height) != (context.width, context.height):
+            context = None
+        if context is None:
+            context = self._context = self._create_context(frame)
+            force_keyframe = True
+
+        frame.pict_type = (
+            av.video.frame.PictureType.I if force_keyframe else av.video.frame.PictureType.NONE
+        )
+        frame.time_base = frame.time_base or fractions.Fraction(1, VIDEO_CLOCK_RATE)
+
+        packets = context.encode(frame)
+        if not packets:
+            return None
+        if len(packets) == 1:
+            packet = packets[0]
+        else:
+            packet = av.Packet(b"".join(bytes(p) for p in packets))
+            packet.is_keyframe = any(p.is_keyframe for p in packets)
+        if packet.is_keyframe and self.intra_refresh and self.codec == "h264":
+            # x264 flags the start of every refresh wave as a keyframe, but peers can
+            # only start decoding at an IDR.
+            packet.is_keyframe = has_h264_idr(bytes(packet))
+        packet.pts = frame.pts
+        packet.time_base = frame.time_base
+        return packet
+
+
+class EncoderBenchmark:
+    """The result of benchmarking one encoder with one profile (see `benchmark_encoders()`)."""
+
+    def __init__(self, codec: str, encoder: str, profile: str):
+        self.codec = codec
+        self.encoder = encoder
+        self.profile = profile
+        self.times: list[float] = []  # Encode time per frame, in seconds
+        self.error: str | None = None  # Why the encoder could not be used
+
+    @property
+    def mean_ms(self) -> float:
+        return 1000 * float(np.mean(self.times)) if self.times else float("inf")
+
+    @property
+    def p95_ms(self) -> float:
+        return 1000 * float(np.percentile(self.times, 95)) if self.times else float("inf")
+
+    def __repr__(self) -> str:
+        result = self.error or f"mean={self.mean_ms:.1f}ms p95={self.p95_ms:.1f}ms"
+        return f"<EncoderBenchmark {self.encoder}/{self.profile}: {result}>"
+
+
+def _benchmark_frames(width: int, height: int, count: int) -> list[av.VideoFrame]:
+    """A moving, textured test pattern, already in the encoders' pixel format."""
+    y, x = np.mgrid[0:height, 0:width]
+    texture = np.random.default_rng(0).integers(0, 32, (height, width), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        shift = 8 * i
+        image = np.stack(
+            [
+                (x + shift) % 256,
+                (y + shift // 2) % 256,
+                ((x + y) // 2 + texture) % 256,
+            ],
+            axis=-1,
+        ).astype(np.uint8)
+        frame = av.VideoFrame.from_ndarray(image, format="rgb24").reformat(format="yuv420p")
+        frame.pts = i * VIDEO_CLOCK_RATE // 30
+        frame.time_base = fractions.Fraction(1, VIDEO_CLOCK_RATE)
+        frames.append(frame)
+    return frames
+
+
+def benchmark_encoders(
+    width: int = 1280,
+    height: int = 720,
+    frames: int = 60,
+    bitrate: int = 2_000_000,
+    codecs: tuple[str, ...] = ("h264", "vp8"),
+    profiles: tuple[str, ...] = tuple(ENCODER_PROFILES),
+) -> list[EncoderBenchmark]:
+    """
+    Measures the encode time per frame of every available encoder and profile on
+    this machine, with a synthetic moving pattern.
+
+    Encoders that are compiled into libavcodec but cannot run here (e.g. NVENC
+    without an NVIDIA GPU) are reported with an `error`.
+
+    Args:
+        width (int): Frame width. Defaults to 1280.
+        height (int): Frame height. Defaults to 720.
+        frames (int): Frames to encode per encoder and profile (the first keyframe
+            is not counted). Defaults to 60.
+        bitrate (int): Target bitrate in bits per second. Defaults to 2 Mbps.
+        codecs (tuple[str, ...]): Codecs to benchmark.
+        profiles (tuple[str, ...]): Profiles to benchmark.
+
+    Returns:
+        list[EncoderBenchmark]: One result per encoder and profile.
+    """
+    test_frames = _benchmark_frames(width, height, frames + 1)
+    results = []
+    for codec in codecs:
+        for encoder_name in CODEC_ENCODERS[codec]:
+            for profile in profiles:
+                result = EncoderBenchmark(codec, encoder_name, profile)
+                results.append(result)
+                try:
+                    av.codec.Codec(encoder_name, "w")
+                except (av.error.FFmpegError, ValueError):
+                    result.error = "not available in this libavcodec build"
+                    continue
+                encoder = VideoEncoder(
+                    codec, bitrate=bitrate, profile=profile, encoder=encoder_name
+                )
+                try:
+                    for i, frame in enumerate(test_frames):
+                        start = time.perf_counter()
+                        encoder.encode(frame)
+                        if i > 0:
+                            result.times.append(time.perf_counter() - start)
+                except (av.error.FFmpegError, ValueError) as e:
+                    # FFmpeg's message, without the option dump.
+                    result.error = f"failed to encode: {getattr(e, 'strerror', None) or e}"
+                    result.times.clear()
+                logger.info(f"{result}")
+    return results
+
+
+def select_encoder(
+    results: list[EncoderBenchmark], latency_budget_ms: float, codec: str
+) -> EncoderBenchmark | None:
+    """
+    Picks an encoder and profile for one codec from `benchmark_encoders()` results:
+    the fastest (by 95th-percentile encode time) that fits the latency budget, or the
+    fastest overall if none fits, with a warning. Ties go to the higher-quality
+    profile.
+
+    Args:
+        results (list[EncoderBenchmark]): The benchmark results (of any codecs).
+        latency_budget_ms (float): Encode time per frame to stay within.
+        codec (str): The codec to choose for, e.g. "h264".
+
+    Returns:
+        EncoderBenchmark | None: The choice, or None if no encoder of `codec` works.
+    """
+    working = [r for r in results if r.codec == codec and r.error is None and r.times]
+    if not working:
+        return None
+    quality = list(ENCODER_PROFILES)
+    best = min(working, key=lambda r: (r.p95_ms, -quality.index(r.profile)))
+    if best.p95_ms > latency_budget_ms:
+        logger.warning(
+            f"No {codec} encoder meets the {latency_budget_ms}ms latency budget; "
+            f"fastest is {best}."
+        )
+    return best
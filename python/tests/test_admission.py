@@ -0,0 +1,65 @@
+import subprocess
+import sys
+
+import pytest
+
+from xr_360_camera_streamer.streaming import AdmissionController, PipelineSpec
+from xr_360_camera_streamer.streaming.admission import SETTLE_TIME, get_cpu_time
+
+SPEC = PipelineSpec(1280, 720, fps=30)  # Cost ~27.6
+
+
+def _admitted(controller: AdmissionController, offers: int) -> int:
+    return sum(controller.admit([SPEC])[0] is not None for _ in range(offers))
+
+
+def test_burst_is_admitted_one_at_a_time_without_an_estimate():
+    controller = AdmissionController(max_cpu=0.8)
+    controller.cpu = 0.1
+    assert _admitted(controller, 50) == 1
+    reservation, reason = controller.admit([SPEC])
+    assert reservation is None and "waiting" in reason
+
+
+def test_burst_is_limited_by_the_prior_estimate():
+    # 10% of the cores per 1280x720@30 pipeline: 7 more fit under 80% at 10% idle.
+    controller = AdmissionController(max_cpu=0.8, cpu_per_cost=0.1 / SPEC.cost)
+    controller.cpu = 0.1
+    assert _admitted(controller, 50) == 7
+
+
+def test_settled_pipelines_give_the_estimate():
+    controller = AdmissionController(max_cpu=0.8)
+    controller.cpu = 0.1
+    first, _ = controller.admit([SPEC])
+    first.time -= SETTLE_TIME  # Its CPU use now shows in the measurement
+    controller.cpu = 0.2
+    # 20% per pipeline: three more fit under 80%.
+    assert _admitted(controller, 50) == 3
+    assert controller.cpu_per_cost is None  # Checking does not change the controller
+
+    controller._measured(0.2, lag=0.0)
+    assert controller.cpu_per_cost == pytest.approx(0.2 / SPEC.cost)
+    # Still known once the pipelines are gone.
+    for reservation in list(controller.reservations):
+        controller.release(reservation)
+    controller._measured(0.0, lag=0.0)
+    assert controller.cpu_per_cost == pytest.approx(0.2 / SPEC.cost)
+
+
+def test_capacity_and_peer_limits():
+    controller = AdmissionController(capacity=2.5 * SPEC.cost, max_peers=10)
+    small = PipelineSpec(640, 360, fps=30)
+    assert _admitted(controller, 5) == 2
+    reservation, reason = controller.admit([SPEC, small])
+    assert reservation.spec is small and "capacity" in reason
+    controller.release(reservation)
+    assert len(controller.reservations) == 2
+
+
+def test_cpu_time_includes_child_processes():
+    # E.g. the ffmpeg decoders of `FFmpegFileSource`.
+    busy = "import time\nend = time.process_time() + 0.3\nwhile time.process_time() < end: pass"
+    start = get_cpu_time()
+    subprocess.run([sys.executable, "-c", busy], check=True)
+    assert get_cpu_time() - start >= 0.3
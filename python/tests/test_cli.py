@@ -0,0 +1,70 @@
+import av
+import numpy as np
+
+from xr_360_camera_streamer.cli import main
+from xr_360_camera_streamer.streaming import RenditionLadder
+from xr_360_camera_streamer.streaming.passthrough import get_passthrough_codec
+
+
+def _write_video(path, frames=48):
+    with av.open(str(path), "w") as container:
+        stream = container.add_stream("libx264", rate=24)
+        stream.width, stream.height = 64, 48
+        stream.pix_fmt = "yuv420p"
+        for i in range(frames):
+            image = np.full((48, 64, 3), i * 5, dtype=np.uint8)
+            container.mux(stream.encode(av.VideoFrame.from_ndarray(image, format="rgb24")))
+        container.mux(stream.encode(None))
+
+
+def _keyframe_times(path):
+    with av.open(path) as container:
+        return [
+            float(packet.pts * packet.time_base)
+            for packet in container.demux(video=0)
+            if packet.pts is not None and packet.is_keyframe
+        ]
+
+
+def test_build_writes_an_aligned_ladder(tmp_path):
+    video = tmp_path / "video.mp4"
+    _write_video(video)
+    argv = ["build", str(video), "--heights", "48", "24", "96", "--codecs", "h264", "vp8"]
+    assert main([*argv, "--keyframe-interval", "0.5"]) == 0
+
+    ladder = RenditionLadder.load(str(video))  # Found next to the video
+    # 96 is above the source's height and skipped.
+    assert sorted((r.height, r.codec) for r in ladder.renditions) == [
+        (24, "h264"),
+        (24, "vp8"),
+        (48, "h264"),
+        (48, "vp8"),
+    ]
+    assert ladder.keyframe_interval == 0.5
+    keyframes = {r.name: _keyframe_times(r.path) for r in ladder.renditions}
+    assert keyframes["48p_h264"] == [0.0, 0.5, 1.0, 1.5]
+    assert all(times == keyframes["48p_h264"] for times in keyframes.values())
+
+    # Renditions are streamed as they are.
+    for rendition in ladder.renditions:
+        with av.open(rendition.path) as container:
+            assert get_passthrough_codec(container.streams.video[0]) == rendition.codec
+
+
+def test_ladder_selects_the_best_fitting_rendition(tmp_path):
+    video = tmp_path / "video.mp4"
+    _write_video(video, frames=12)
+    assert main(["build", str(video), "--heights", "48", "24"]) == 0
+    ladder = RenditionLadder.load(str(video))
+    low, high = ladder.renditions
+
+    assert ladder.select("h264", high.bitrate) is high
+    assert ladder.select("h264", high.bitrate - 1) is low
+    assert ladder.select("h264", 0) is low  # The lowest when nothing fits
+    assert ladder.select("vp8", high.bitrate) is high  # Transcoded from the h264 ones
+
+
+def test_build_reports_unreadable_videos(tmp_path):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"not a video")
+    assert main(["build", str(video)]) == 1
@@ -0,0 +1,38 @@
+from xr_360_camera_streamer.utils.codecs import EncoderBenchmark, select_encoder
+
+
+def _result(codec, encoder, profile, ms, error=None):
+    result = EncoderBenchmark(codec, encoder, profile)
+    result.times = [] if error else [ms / 1000] * 10
+    result.error = error
+    return result
+
+
+RESULTS = [
+    _result("h264", "h264_nvenc", "quality", 4.0),
+    _result("h264", "h264_nvenc", "balanced", 2.0),
+    _result("h264", "libx264", "quality", 30.0),
+    _result("h264", "libx264", "balanced", 8.0),
+    _result("h264", "h264_qsv", "quality", 0, error="not available"),
+    _result("vp8", "libvpx", "quality", 12.0),
+    _result("vp8", "libvpx", "balanced", 1.0),
+]
+
+
+def test_picks_the_fastest_encoder_within_the_codec():
+    choice = select_encoder(RESULTS, 10.0, "h264")
+    assert (choice.encoder, choice.profile) == ("h264_nvenc", "balanced")
+    # VP8 is judged on its own encoders, not against faster H.264 ones.
+    choice = select_encoder(RESULTS, 10.0, "vp8")
+    assert (choice.encoder, choice.profile) == ("libvpx", "balanced")
+
+
+def test_ties_go_to_the_higher_quality_profile():
+    results = [_result("vp8", "libvpx", "balanced", 3.0), _result("vp8", "libvpx", "quality", 3.0)]
+    assert select_encoder(results, 10.0, "vp8").profile == "quality"
+
+
+def test_falls_back_to_the_fastest_encoder_of_the_codec():
+    choice = select_encoder(RESULTS, 0.5, "vp8")
+    assert (choice.encoder, choice.profile) == ("libvpx", "balanced")
+    assert select_encoder(RESULTS, 10.0, "av1") is None
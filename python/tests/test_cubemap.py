@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from xr_360_camera_streamer.transforms import Equi2Cubemap, Equi2EAC
+from xr_360_camera_streamer.transforms.spherical import equirect_to_rays
+
+EQUI_WIDTH, EQUI_HEIGHT = 2048, 1024
+
+
+def _rays(transform, x, y):
+    """Unit viewing rays sampled at output pixels (x, y)."""
+    u, v = transform.source_coords(
+        np.asarray(x, dtype=np.float32), np.asarray(y, dtype=np.float32), EQUI_WIDTH, EQUI_HEIGHT
+    )
+    return np.stack(equirect_to_rays(u, v, EQUI_WIDTH, EQUI_HEIGHT), axis=-1)
+
+
+@pytest.mark.parametrize("layout", ["3x2", "6x1"])
+def test_face_centres_look_along_the_face_axes(layout):
+    transform = Equi2Cubemap(face_size=64, layout=layout)
+    info = transform.layout_info()
+    assert (info["width"], info["height"]) == (transform.output_width, transform.output_height)
+
+    for row, names in enumerate(info["layout"]):
+        for col, name in enumerate(names):
+            # Pixel centres straddle the face centre; average the four around it.
+            x = col * 64 + np.array([31, 32, 31, 32])
+            y = row * 64 + np.array([31, 31, 32, 32])
+            ray = _rays(transform, x, y).mean(axis=0)
+            forward = info["faces"][name]["forward"]
+            np.testing.assert_allclose(ray / np.linalg.norm(ray), forward, atol=1e-3)
+
+
+def test_eac_samples_evenly_in_angle():
+    size = 64
+    x = np.arange(size, dtype=np.float32) + size  # Across the front face of "3x2"
+    y = np.full(size, size // 2 - 0.5, dtype=np.float32)
+
+    def angles(transform):
+        ray = _rays(transform, x, y)
+        return np.degrees(np.arctan2(ray[:, 1], ray[:, 0]))
+
+    eac_steps = np.diff(angles(Equi2EAC(face_size=size)))
+    np.testing.assert_allclose(eac_steps, 90 / size, rtol=1e-3)
+    # A plain cubemap spends more pixels per degree near the face edges.
+    cube_steps = np.diff(angles(Equi2Cubemap(face_size=size)))
+    assert cube_steps[0] < cube_steps[size // 2] * 0.6
+
+
+def test_output_covers_the_layout():
+    frame = np.zeros((64, 128, 3), dtype=np.uint8)
+    assert Equi2EAC(face_size=16).transform(frame).shape == (32, 48, 3)
+    assert Equi2Cubemap(face_size=16, layout="6x1").transform(frame).shape == (16, 96, 3)
+
+
+def test_unknown_layout_is_rejected():
+    with pytest.raises(ValueError):
+        Equi2Cubemap(face_size=16, layout="4x3")
@@ -0,0 +1,96 @@
+import asyncio
+
+from xr_360_camera_streamer.streaming import Batch, DispatchPolicy, LatestValue
+
+
+async def _deliver(policy, messages, pause=0.0):
+    """Pushes `messages` at once, with a handler that takes `pause` seconds per call."""
+    calls = []
+
+    async def handler(message):
+        calls.append(message)
+        await asyncio.sleep(pause)
+
+    dispatcher = policy.dispatcher(handler, "test")
+    for message in messages:
+        dispatcher.push(message)
+    await asyncio.sleep(0.1)
+    dispatcher.close()
+    return calls, dispatcher
+
+
+def test_every_message_is_delivered_in_order():
+    calls, dispatcher = asyncio.run(_deliver(DispatchPolicy(), range(5), pause=0.01))
+    assert calls == [0, 1, 2, 3, 4]
+    assert dispatcher.dropped == 0
+
+
+def test_latest_value_drops_superseded_messages():
+    async def main():
+        calls = []
+        release = asyncio.Event()
+
+        async def handler(message):
+            calls.append(message)
+            await release.wait()
+
+        dispatcher = LatestValue().dispatcher(handler, "test")
+        dispatcher.push(0)
+        await asyncio.sleep(0.01)  # The handler is now busy with the first message
+        for message in range(1, 5):
+            dispatcher.push(message)
+        release.set()
+        await asyncio.sleep(0.05)
+        dispatcher.close()
+        return calls, dispatcher
+
+    calls, dispatcher = asyncio.run(main())
+    assert calls == [0, 4]
+    assert dispatcher.received == 5
+    assert dispatcher.dropped == 3
+
+
+def test_batch_delivers_lists_of_at_most_max_size():
+    calls, dispatcher = asyncio.run(_deliver(Batch(max_delay=0.01, max_size=2), range(5)))
+    assert calls == [[0, 1], [2, 3], [4]]
+    assert dispatcher.dropped == 0
+
+
+def test_max_rate_limits_handler_calls():
+    async def main():
+        calls = []
+
+        async def handler(message):
+            calls.append(message)
+
+        dispatcher = LatestValue(max_rate=20).dispatcher(handler, "test")
+        for message in range(20):
+            dispatcher.push(message)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        dispatcher.close()
+        return calls
+
+    calls = asyncio.run(main())
+    # 0.3s at 20 calls per second, and the newest message is always delivered last.
+    assert 3 <= len(calls) <= 8
+    assert calls[-1] == 19
+
+
+def test_handler_errors_do_not_stop_delivery():
+    async def main():
+        calls = []
+
+        async def handler(message):
+            calls.append(message)
+            if message == 0:
+                raise RuntimeError("boom")
+
+        dispatcher = DispatchPolicy().dispatcher(handler, "test")
+        dispatcher.push(0)
+        dispatcher.push(1)
+        await asyncio.sleep(0.05)
+        dispatcher.close()
+        return calls
+
+    assert asyncio.run(main()) == [0, 1]
@@ -0,0 +1,28 @@
+from aiortc import MediaStreamTrack
+
+from xr_360_camera_streamer.streaming import EncodedTrack
+
+
+class _Track(MediaStreamTrack):
+    kind = "video"
+
+    async def recv(self):
+        raise NotImplementedError
+
+
+def test_bitrate_stays_within_the_limit():
+    track = EncodedTrack(_Track(), bitrate=2_000_000, max_bitrate=1_000_000)
+    assert track.bitrate == 1_000_000
+    track.set_codec("video/H264")
+    assert track.encoder.bitrate == 1_000_000
+
+    track.set_bandwidth(3_000_000)  # E.g. from a RateController
+    assert track.encoder.bitrate == 1_000_000
+    track.set_bandwidth(500_000)
+    assert track.encoder.bitrate == 500_000
+
+
+def test_unknown_codec_is_left_to_aiortc():
+    track = EncodedTrack(_Track())
+    track.set_codec("video/AV1")
+    assert track.encoder is None
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from xr_360_camera_streamer.transforms import DualFisheye2Equi, Resize, TransformPipeline
+
+# One equirectangular pixel per degree.
+WIDTH, HEIGHT = 360, 180
+
+
+def _two_lenses(front=0, back=200):
+    """A side-by-side dual-fisheye frame with a flat colour per lens."""
+    frame = np.full((512, 1024, 3), back, dtype=np.uint8)
+    frame[:, :512] = front
+    return frame
+
+
+def test_lens_centres_map_to_the_front_and_back():
+    stitch = DualFisheye2Equi(WIDTH, HEIGHT)
+    # Straight ahead and behind, on the equator (see `equirect_to_rays()`).
+    x = np.array([WIDTH / 2 + 0.5, 0.5], dtype=np.float32)
+    y = np.full(2, HEIGHT / 2 + 0.5, dtype=np.float32)
+    map_x, map_y = stitch.source_coords(x, y, 1024, 512)
+    np.testing.assert_allclose(map_x, [255.5, 767.5], atol=0.5)
+    np.testing.assert_allclose(map_y, [255.5, 255.5], atol=0.5)
+
+
+def test_seam_is_cross_faded_over_the_blend_width():
+    blend_width = 10.0
+    equator = (
+        DualFisheye2Equi(WIDTH, HEIGHT, blend_width=blend_width)
+        .transform(_two_lenses())[HEIGHT // 2, :, 0]
+        .astype(int)
+    )
+
+    # The seams are 90 degrees either side of straight ahead (column 180).
+    for seam in (90, 270):
+        assert abs(equator[seam] - 100) <= 15  # An even mix on the seam
+        mixed = np.flatnonzero((equator > 5) & (equator < 195))
+        near = mixed[np.abs(mixed - seam) < 45]
+        assert near.size > 2
+        assert np.abs(near - seam).max() <= blend_width / 2 + 1
+    assert equator[180] == 0 and equator[0] == 200
+
+
+def test_no_blend_gives_a_hard_seam():
+    equator = DualFisheye2Equi(WIDTH, HEIGHT, blend_width=0).transform(_two_lenses())
+    values = set(np.unique(equator[HEIGHT // 2, :, 0]).tolist())
+    # Only bilinear taps straddling the seam may mix the lenses.
+    assert np.count_nonzero((equator > 5) & (equator < 195)) <= 2 * 3 * HEIGHT
+    assert {0, 200} <= values
+
+
+def test_fused_pipeline_keeps_the_seam_blend():
+    frame = _two_lenses()
+    stitch = DualFisheye2Equi(WIDTH, HEIGHT)
+    expected = Resize(180, 90).transform(stitch.transform(frame))
+    fused = TransformPipeline([stitch, Resize(180, 90)]).transform(frame)
+    assert np.abs(fused.astype(int) - expected.astype(int)).max() <= 12
+    assert np.mean(np.abs(fused.astype(int) - expected.astype(int))) < 1
+
+
+def test_negative_blend_width_is_rejected():
+    with pytest.raises(ValueError):
+        DualFisheye2Equi(WIDTH, HEIGHT, blend_width=-1)
@@ -0,0 +1,45 @@
+import math
+
+import numpy as np
+import pytest
+
+from xr_360_camera_streamer.transforms import FoveationWarp, Resize
+
+
+def test_zero_strength_is_a_plain_resize():
+    frame = np.random.default_rng(0).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    warped = FoveationWarp(40, 30, strength=0.0).transform(frame)
+    np.testing.assert_array_equal(warped, Resize(40, 30).transform(frame))
+
+
+def test_centre_is_sampled_more_densely_than_the_edges():
+    warp = FoveationWarp(100, 100, strength=0.5)
+    x = np.arange(100, dtype=np.float32)
+    source_x, _ = warp.source_coords(x, x, 1000, 1000)
+    steps = np.diff(source_x)
+    # Input pixels per output pixel: 10 for a uniform resize.
+    gain_x, _ = warp.centre_gain()
+    assert steps[49] == pytest.approx(10 / gain_x, rel=1e-2)
+    assert steps[0] > 10 > steps[49]
+    # The whole input is still covered, to within half an edge step.
+    assert source_x[0] == pytest.approx(0, abs=steps[0])
+    assert source_x[-1] == pytest.approx(999, abs=steps[0])
+
+
+def test_unwarp_params_invert_the_warp():
+    warp = FoveationWarp(64, 48, strength=0.6, strength_y=0.3)
+    params = warp.unwarp_params(display_width=128, display_height=96)
+    s = np.linspace(-0.9, 0.9, 7)
+    # The input position each encoded position samples, normalized to [-1, 1].
+    x = (s + 1) * 32 - 0.5
+    source_x, _ = warp.source_coords(x, np.zeros_like(x), 128, 96)
+    t = (source_x + 0.5) / 64 - 1
+
+    alpha = params["alpha_x"]
+    np.testing.assert_allclose(np.arctan(t * math.tan(alpha)) / alpha, s, atol=1e-5)
+    assert (params["encoded_width"], params["display_width"]) == (64, 128)
+
+
+def test_strength_must_be_below_one():
+    with pytest.raises(ValueError):
+        FoveationWarp(64, 48, strength=1.0)
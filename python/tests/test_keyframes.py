@@ -0,0 +1,143 @@
+import asyncio
+import time
+from fractions import Fraction
+
+import numpy as np
+from aiortc import MediaStreamTrack
+from aiortc.rtp import (
+    RTCP_PSFB_APP,
+    RTCP_PSFB_FIR,
+    RTCP_PSFB_PLI,
+    RtcpPsfbPacket,
+    RtcpRrPacket,
+)
+from av import VideoFrame
+
+from xr_360_camera_streamer.streaming import EncodedTrack
+from xr_360_camera_streamer.streaming.relay import BroadcastRelay
+from xr_360_camera_streamer.streaming.rtcp import RecoveryStats, is_keyframe_request
+from xr_360_camera_streamer.utils.codecs import VideoEncoder
+
+
+def _frame(index: int, fps: int = 30) -> VideoFrame:
+    # A moving line: small changes that never look like a scene cut to the encoder.
+    image = np.zeros((64, 96, 3), np.uint8)
+    image[:, index * 3 % 96] = 255
+    frame = VideoFrame.from_ndarray(image, format="rgb24")
+    frame.pts, frame.time_base = index, Fraction(1, fps)
+    return frame
+
+
+class _FrameTrack(MediaStreamTrack):
+    kind = "video"
+
+    def __init__(self, fps: int = 30, realtime: bool = False):
+        super().__init__()
+        self.fps = fps
+        self.realtime = realtime
+        self.index = 0
+
+    async def recv(self) -> VideoFrame:
+        if self.realtime:
+            await asyncio.sleep(1 / self.fps)
+        frame = _frame(self.index, self.fps)
+        self.index += 1
+        return frame
+
+
+def _pli() -> RtcpPsfbPacket:
+    return RtcpPsfbPacket(fmt=RTCP_PSFB_PLI, ssrc=2, media_ssrc=1)
+
+
+def test_keyframe_requests_are_pli_and_fir_only():
+    assert is_keyframe_request(_pli())
+    assert is_keyframe_request(RtcpPsfbPacket(fmt=RTCP_PSFB_FIR, ssrc=2, media_ssrc=1))
+    assert not is_keyframe_request(RtcpPsfbPacket(fmt=RTCP_PSFB_APP, ssrc=2, media_ssrc=0))
+    assert not is_keyframe_request(RtcpRrPacket(ssrc=2))
+
+
+def test_recovery_stats_time_the_first_frame_and_each_recovery():
+    stats = RecoveryStats()
+    stats.joined()
+    stats.request()  # Before the first keyframe: part of the time to first frame
+    time.sleep(0.02)
+    stats.keyframe_sent()
+    assert stats.first_frame_time >= 0.02
+    assert not stats.recovery_times
+
+    stats.keyframe_sent()  # Periodic keyframe, nothing was pending
+    assert not stats.recovery_times
+
+    stats.request()
+    time.sleep(0.02)
+    stats.request()  # Served by the same keyframe
+    stats.keyframe_sent()
+    assert len(stats.recovery_times) == 1
+    assert stats.recovery_times[0] >= 0.02
+    assert stats.to_dict()["requests"] == 3
+    assert stats.to_dict()["recoveries"] == 1
+
+
+def test_periodic_keyframes_follow_the_keyframe_interval():
+    for codec in ("h264", "vp8"):
+        encoder = VideoEncoder(codec, framerate=10, keyframe_interval=0.5)
+        packets = [encoder.encode(_frame(i, fps=10)) for i in range(20)]
+        keyframes = [i for i, p in enumerate(packets) if p is not None and p.is_keyframe]
+        assert keyframes == [0, 5, 10, 15], codec
+
+
+def test_pli_forces_an_idr_on_the_next_frame():
+    async def main():
+        track = EncodedTrack(_FrameTrack(), framerate=30, keyframe_interval=100)
+        track.set_codec("video/VP8")
+        assert (await track.recv()).is_keyframe
+        assert track.recovery.first_frame_time is not None
+        assert not any([(await track.recv()).is_keyframe for _ in range(5)])
+
+        track.handle_rtcp(_pli())
+        assert (await track.recv()).is_keyframe
+        assert len(track.recovery.recovery_times) == 1
+        assert not (await track.recv()).is_keyframe
+        track.stop()
+
+    asyncio.run(main())
+
+
+def test_forced_keyframes_are_rate_limited():
+    relay = BroadcastRelay(_FrameTrack(), min_keyframe_interval=60, keyframe_interval=100)
+    relay.request_keyframe("vp8")
+    [packet] = relay._encode(["vp8"], _frame(0))
+    assert packet.is_keyframe
+
+    relay.request_keyframe("vp8")
+    [packet] = relay._encode(["vp8"], _frame(1))
+    assert not packet.is_keyframe  # Too soon after the last one...
+    assert relay._keyframe_requests == {"vp8"}  # ...but remembered
+
+    relay.min_keyframe_interval = 0
+    [packet] = relay._encode(["vp8"], _frame(2))
+    assert packet.is_keyframe
+    assert not relay._keyframe_requests
+
+
+def test_late_subscriber_starts_at_a_keyframe():
+    async def main():
+        relay = BroadcastRelay(
+            _FrameTrack(realtime=True), pace=False, min_keyframe_interval=0, keyframe_interval=100
+        )
+        first = relay.subscribe()
+        first.set_codec("video/VP8")
+        assert (await first.recv()).is_keyframe
+        assert not any([(await first.recv()).is_keyframe for _ in range(5)])
+
+        late = relay.subscribe()
+        late.set_codec("video/VP8")
+        assert (await late.recv()).is_keyframe
+        assert late.recovery.first_frame_time is not None
+        # The shared encoder's IDR also reaches the existing subscriber.
+        packets = [await first.recv() for _ in range(first._queue.qsize())]
+        assert any(p.is_keyframe for p in packets)
+        assert relay.stats() == {"vp8": 2}
+        await relay.close()
+
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+import pytest
+
+from xr_360_camera_streamer.metrics import Histogram, Metrics
+
+
+def test_quantiles_interpolate_within_buckets():
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.mean == pytest.approx(1.625)
+    assert histogram.max == 3.0
+    # The median is the 2nd of 4 observations: halfway into the (1, 2] bucket.
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(0.25) == pytest.approx(1.0)
+    # Never above the largest observation, although its bucket goes up to 4.
+    assert histogram.quantile(0.99) == pytest.approx(3.0)
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_observations_above_the_last_bucket():
+    histogram = Histogram(buckets=(1.0,))
+    histogram.observe(5.0)
+    assert histogram.counts == [0, 1]
+    assert histogram.quantile(0.5) == pytest.approx(3.0)
+    assert histogram.quantile(1.0) == 5.0
+
+
+def test_merge_adds_observations():
+    a, b = Histogram(buckets=(1.0, 2.0)), Histogram(buckets=(1.0, 2.0))
+    a.observe(0.5)
+    b.observe(1.5)
+    b.observe(3.0)
+    a.merge(b)
+    assert (a.counts, a.count, a.sum, a.max) == ([1, 1, 1], 3, 5.0, 3.0)
+
+
+def test_render_prometheus():
+    metrics = Metrics(prefix="test", buckets=(0.01, 0.1))
+    metrics.observe_stage("encode", 0.005, peer="a")
+    metrics.observe_stage("encode", 0.05, peer="a")
+    metrics.inc("frames_dropped_total", 2, peer="a", reason="rate_control")
+    metrics.set("peers", 1)
+
+    lines = metrics.render_prometheus().splitlines()
+    assert "# TYPE test_stage_seconds histogram" in lines
+    assert 'test_stage_seconds_bucket{stage="encode",peer="a",le="0.01"} 1' in lines
+    assert 'test_stage_seconds_bucket{stage="encode",peer="a",le="0.1"} 2' in lines
+    assert 'test_stage_seconds_bucket{stage="encode",peer="a",le="+Inf"} 2' in lines
+    assert 'test_stage_seconds_count{stage="encode",peer="a"} 2' in lines
+    assert "# TYPE test_frames_dropped_total counter" in lines
+    assert 'test_frames_dropped_total{peer="a",reason="rate_control"} 2' in lines
+    assert "# TYPE test_peers gauge" in lines
+    assert "test_peers 1" in lines
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics(prefix="test")
+    metrics.inc("errors_total", peer='a"b\\c')
+    assert 'test_errors_total{peer="a\\"b\\\\c"} 1' in metrics.render_prometheus()
+
+
+def test_remove_peer_forgets_its_series():
+    metrics = Metrics()
+    metrics.observe_stage("encode", 0.01, peer="a")
+    metrics.observe_stage("encode", 0.02, peer="b")
+    metrics.inc("frames_dropped_total", peer="a")
+    metrics.remove_peer("a")
+
+    summary = metrics.to_dict()
+    assert list(summary["by_peer"]) == ["b"]
+    assert summary["stages"]["encode"]["count"] == 1
+    assert summary["counters"] == []
@@ -0,0 +1,98 @@
+import struct
+
+import numpy as np
+import pytest
+from equilib.numpy_utils import create_rotation_matrix
+
+from xr_360_camera_streamer.sources import OrientationTrack
+from xr_360_camera_streamer.sources.gopro_source import parse_gpmf_stream
+from xr_360_camera_streamer.transforms import EquilibEqui2Pers
+from xr_360_camera_streamer.transforms.remap import output_grid
+from xr_360_camera_streamer.transforms.rotation import (
+    matrix_to_quat,
+    matrix_to_rotation,
+    quat_to_matrix,
+    rotation_matrix,
+)
+
+ANGLES = {"roll": 0.2, "pitch": -0.3, "yaw": 1.1}
+
+
+def test_rotation_matrix_matches_equilib_and_round_trips():
+    R = rotation_matrix(**ANGLES)
+    expected = create_rotation_matrix(**ANGLES, z_down=False, dtype=np.float64)
+    np.testing.assert_allclose(R, expected, atol=1e-12)
+    assert matrix_to_rotation(R) == pytest.approx(ANGLES)
+    np.testing.assert_allclose(quat_to_matrix(matrix_to_quat(R)), R, atol=1e-12)
+
+
+def test_orientation_is_slerped_between_samples():
+    track = OrientationTrack.from_euler([0.0, 1.0], [0, 0], [0, 0], [0.0, np.pi / 2])
+    assert matrix_to_rotation(track.matrix(0.5))["yaw"] == pytest.approx(np.pi / 4)
+    # Outside the track the ends are held.
+    assert matrix_to_rotation(track.matrix(5.0))["yaw"] == pytest.approx(np.pi / 2)
+
+
+def test_gyro_rates_are_integrated():
+    t = np.linspace(0, 1, 11)
+    rates = np.tile([0.0, 0.0, np.pi / 2], (11, 1))  # A quarter turn about +Z per second
+    R = OrientationTrack.from_gyro(t, rates).matrix(1.0)
+    np.testing.assert_allclose(R, rotation_matrix(0, 0, -np.pi / 2), atol=1e-9)
+
+
+def test_corrections_undo_the_camera_rotation():
+    R = rotation_matrix(**ANGLES)
+    track = OrientationTrack([0.0], matrix_to_quat(R)[np.newaxis])
+    np.testing.assert_allclose(R @ track.correction(0.0, mode="full"), np.eye(3), atol=1e-9)
+    # Leveling keeps the heading: the result is a turn about the vertical axis only.
+    levelled = R @ track.correction(0.0, mode="level")
+    np.testing.assert_allclose(levelled[2], [0, 0, 1], atol=1e-9)
+    assert matrix_to_rotation(levelled)["yaw"] == pytest.approx(
+        matrix_to_rotation(R)["yaw"], abs=0.2
+    )
+    with pytest.raises(ValueError):
+        track.correction(0.0, mode="tilt")
+
+
+def test_csv_sidecar_with_euler_angles(tmp_path):
+    path = tmp_path / "orientation.csv"
+    path.write_text("time,roll,pitch,yaw\n0,0,0,0\n2,0,0,90\n")
+    track = OrientationTrack.load(str(path), time_offset=1.0)
+    # Looked up at 0s + 1s offset: halfway.
+    assert matrix_to_rotation(track.matrix(0.0))["yaw"] == pytest.approx(np.pi / 4)
+
+
+def _klv(key: bytes, type_: bytes, size: int, data: bytes) -> bytes:
+    repeat = len(data) // size if size else 0
+    padding = -len(data) % 4
+    return struct.pack(">4scBH", key, type_, size, repeat) + data + b"\0" * padding
+
+
+def test_gpmf_orientation_samples_are_scaled():
+    samples = np.array([[32767, 0, 0, 0], [0, 0, 0, 32767]], dtype=">i2")
+    stream = _klv(b"SCAL", b"s", 2, np.array([32767], dtype=">i2").tobytes())
+    stream += _klv(b"CORI", b"s", 8, samples.tobytes())
+    payload = _klv(b"DEVC", b"\0", 1, _klv(b"STRM", b"\0", 1, stream))
+
+    np.testing.assert_allclose(parse_gpmf_stream(payload, "CORI"), [[1, 0, 0, 0], [0, 0, 0, 1]])
+    assert parse_gpmf_stream(payload, "GYRO") is None
+
+
+def test_world_rotation_is_folded_into_the_view():
+    reprojection = EquilibEqui2Pers(output_width=32, output_height=24, fov_x=90.0)
+    x, y = output_grid(32, 24)
+    zero = {"roll": 0.0, "pitch": 0.0, "yaw": 0.0}
+    # A camera turned 0.3 rad to the right, fully stabilized, looks 0.3 rad to the left.
+    camera = OrientationTrack([0.0], matrix_to_quat(rotation_matrix(0, 0, 0.3))[np.newaxis])
+    corrected = reprojection.source_coords(
+        x, y, 512, 256, rot=zero, world_rot=camera.correction(0.0, mode="full")
+    )
+    expected = reprojection.source_coords(x, y, 512, 256, rot={**zero, "yaw": -0.3})
+    np.testing.assert_allclose(corrected, expected, atol=0.1)
+
+    # The equilib path folds the correction into its Euler angles the same way.
+    frame = np.random.default_rng(0).integers(0, 256, (256, 512, 3), dtype=np.uint8)
+    np.testing.assert_array_equal(
+        reprojection.transform(frame, rot=zero, world_rot=camera.correction(0.0, mode="full")),
+        reprojection.transform(frame, rot={**zero, "yaw": -0.3}),
+    )
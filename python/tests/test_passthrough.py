@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import av
+import numpy as np
+
+from xr_360_camera_streamer.streaming.passthrough import (
+    FileReader,
+    PassthroughTrack,
+    get_passthrough_codec,
+)
+
+FRAMES = 24
+
+
+def _write_video(path, codec="libx264", options=None):
+    with av.open(str(path), "w") as container:
+        stream = container.add_stream(codec, rate=24, options=options)
+        stream.width, stream.height = 64, 48
+        stream.pix_fmt = "yuv420p"
+        for i in range(FRAMES):
+            image = np.full((48, 64, 3), i * 10, dtype=np.uint8)
+            frame = av.VideoFrame.from_ndarray(image, format="rgb24")
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode(None))
+
+
+def _read_all(reader, passthrough):
+    items = []
+    while (item := reader.read(passthrough)) is not None:
+        items.append(item)
+    return items
+
+
+def test_decoding_returns_every_frame(tmp_path):
+    # B-frames and frame threading make the decoder hold frames back until the end.
+    path = tmp_path / "video.mp4"
+    _write_video(path)
+    reader = FileReader(str(path), loop=False)
+    frames = _read_all(reader, passthrough=False)
+    assert len(frames) == FRAMES
+    pts = [frame.pts for frame in frames]
+    assert pts == sorted(pts)
+    assert reader.read(passthrough=False) is None  # Stays at the end
+    reader.close()
+
+
+def test_looping_continues_the_timeline(tmp_path):
+    path = tmp_path / "video.mp4"
+    _write_video(path)
+    reader = FileReader(str(path), loop=True)
+    frames = [reader.read(passthrough=False) for _ in range(FRAMES * 2)]
+    times = [float(frame.pts * frame.time_base) for frame in frames]
+    assert times == sorted(times)
+    assert times[FRAMES] >= times[FRAMES - 1]
+    reader.close()
+
+
+def test_passthrough_returns_every_packet(tmp_path):
+    path = tmp_path / "video.webm"
+    _write_video(path, codec="libvpx")
+    reader = FileReader(str(path), loop=False)
+    assert reader.passthrough_codec == "vp8"
+    packets = _read_all(reader, passthrough=True)
+    assert len(packets) == FRAMES
+    assert packets[0].is_keyframe
+    reader.close()
+
+
+def test_only_baseline_h264_is_passed_through(tmp_path):
+    for profile, expected in (("baseline", "h264"), ("main", None), ("high", None)):
+        path = tmp_path / f"{profile}.mp4"
+        _write_video(path, options={"profile": profile, "bf": "0"})
+        with av.open(str(path)) as container:
+            assert get_passthrough_codec(container.streams.video[0]) == expected, profile
+
+
+def test_resumed_track_restarts_pacing_at_a_keyframe(tmp_path):
+    path = tmp_path / "video.webm"
+    _write_video(path, codec="libvpx", options={"g": "8"})
+
+    async def main():
+        track = PassthroughTrack(str(path))
+        track.set_codec("video/VP8")
+        packets = [await track.recv() for _ in range(3)]
+        assert packets[0].is_keyframe
+
+        await asyncio.sleep(0.6)  # Disconnected, then resumed on a new connection
+        track.set_codec("video/VP8")
+        start = time.monotonic()
+        packet = await track.recv()
+        assert packet.is_keyframe
+        assert packet.pts > packets[-1].pts
+        # The frames missed during the gap are not sent in a burst.
+        for _ in range(2):
+            await track.recv()
+        assert time.monotonic() - start >= 1.5 / 24
+        track.stop()
+
+    asyncio.run(main())
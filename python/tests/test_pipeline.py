@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from xr_360_camera_streamer.transforms import (
+    ColorConvert,
+    Crop,
+    EquilibEqui2Pers,
+    Resize,
+    TransformPipeline,
+)
+from xr_360_camera_streamer.transforms.pipeline import _FusedRemap
+
+ROT = {"pitch": 0.2, "yaw": 0.5, "roll": 0.0}
+
+
+def _equirect(width=256, height=128):
+    # Smooth, so sampling positions that differ by a fraction of a pixel agree.
+    u, v = np.meshgrid(np.linspace(0, 2 * np.pi, width), np.linspace(0, np.pi, height))
+    channels = [np.sin(u) * np.sin(v), np.cos(u) * np.sin(v), np.cos(v)]
+    return ((np.stack(channels, axis=-1) + 1) * 127.5).astype(np.uint8)
+
+
+def test_geometric_stages_are_fused_and_colour_conversion_deferred():
+    pipeline = TransformPipeline(
+        [
+            ColorConvert("RGB2BGR"),
+            EquilibEqui2Pers(output_width=64, output_height=48, fov_x=90.0),
+            Resize(32, 24),
+        ]
+    )
+    steps = pipeline.steps
+    assert len(steps) == 2
+    assert isinstance(steps[0], _FusedRemap)
+    assert isinstance(steps[1], ColorConvert)
+    assert (pipeline.output_width, pipeline.output_height) == (32, 24)
+
+
+def test_fused_reprojection_matches_equilib():
+    frame = _equirect()
+    reprojection = EquilibEqui2Pers(output_width=64, output_height=48, fov_x=90.0)
+    expected = reprojection.transform(frame, rot=ROT)
+    fused = TransformPipeline([reprojection, ColorConvert("RGB2BGR")]).transform(frame, rot=ROT)
+
+    difference = np.abs(fused[..., ::-1].astype(int) - expected.astype(int))
+    # Borders aside, the single remap samples where equilib does.
+    assert np.median(difference) <= 1
+    assert np.percentile(difference[4:-4, 4:-4], 99) <= 3
+
+
+def test_fused_chain_matches_the_stages_one_by_one():
+    frame = np.random.default_rng(0).integers(0, 256, (40, 60, 3), dtype=np.uint8)
+    stages = [Crop(10, 5, 40, 30), Resize(20, 15, interpolation="nearest")]
+    expected = frame
+    for stage in stages:
+        expected = stage.transform(expected)
+
+    np.testing.assert_array_equal(TransformPipeline(stages).transform(frame), expected)
+
+
+def test_never_writes_into_the_input_frame():
+    frame = np.random.default_rng(1).integers(0, 256, (40, 60, 3), dtype=np.uint8)
+    original = frame.copy()
+    out = TransformPipeline([Crop(0, 0, 30, 20), ColorConvert("RGB2BGR")]).transform(frame)
+    np.testing.assert_array_equal(frame, original)
+    np.testing.assert_array_equal(out, original[:20, :30, ::-1])
+
+
+def test_yuv_i420_output_has_the_planar_layout():
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    out = TransformPipeline([Resize(32, 24), ColorConvert("RGB2YUV_I420")]).transform(frame)
+    assert out.shape == (36, 32)
+
+
+def test_empty_pipeline_is_rejected():
+    with pytest.raises(ValueError):
+        TransformPipeline([])
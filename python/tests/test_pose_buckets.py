@@ -0,0 +1,82 @@
+import asyncio
+
+import numpy as np
+
+from xr_360_camera_streamer.streaming.pose_buckets import PoseBucketHub, PoseBuckets
+
+
+class _SlowSource:
+    fps = 30.0
+
+    def __init__(self):
+        self.reads = 0
+        self.started = asyncio.Event()
+
+    async def read(self, index):
+        self.reads += 1
+        self.started.set()
+        await asyncio.sleep(0.05)
+        return np.full((4, 4, 3), index, dtype=np.uint8)
+
+
+class _Identity:
+    def transform(self, frame, rot):
+        return frame
+
+
+def _hub():
+    return PoseBucketHub(_SlowSource(), _Identity(), PoseBuckets())
+
+
+def test_peers_in_a_bucket_share_a_render():
+    async def main():
+        hub = _hub()
+        key = (0, 0, 0)
+        first, second = await asyncio.gather(hub.render(key, 3), hub.render(key, 3))
+        assert first is second
+        assert hub.source.reads == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_render_does_not_strand_waiters():
+    async def main():
+        hub = _hub()
+        key = (0, 0, 0)
+        owner = asyncio.create_task(hub.render(key, 3))
+        await hub.source.started.wait()
+        waiter = asyncio.create_task(hub.render(key, 3))
+        await asyncio.sleep(0)
+        owner.cancel()
+
+        image = await asyncio.wait_for(waiter, timeout=1.0)
+        assert owner.cancelled()
+        assert image[0, 0, 0] == 3
+        assert hub.source.reads == 2  # The waiter rendered the frame itself
+        # Later peers get the finished render instead of the cancelled attempt.
+        assert await hub.render(key, 3) is image
+
+    asyncio.run(main())
+
+
+def test_failed_render_is_retried():
+    async def main():
+        hub = _hub()
+        key = (0, 0, 0)
+        read = hub.source.read
+
+        async def fail(index):
+            raise OSError("decoder gone")
+
+        hub.source.read = fail
+        try:
+            await hub.render(key, 1)
+        except OSError:
+            pass
+        else:
+            raise AssertionError("expected the read error")
+        hub.source.read = read
+        image = await hub.render(key, 1)
+        assert image[0, 0, 0] == 1
+
+    asyncio.run(main())
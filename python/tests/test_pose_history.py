@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from xr_360_camera_streamer.pose import PoseHistory
+
+# A quarter turn about +Z, as an (x, y, z, w) quaternion.
+QUARTER_TURN = (0.0, 0.0, np.sqrt(0.5), np.sqrt(0.5))
+IDENTITY = (0.0, 0.0, 0.0, 1.0)
+
+
+def _add(history, t, x, rotation=IDENTITY):
+    return history.add(t, np.array([[x, 0.0, 0.0]]), np.array([rotation]))
+
+
+def test_interpolates_between_samples():
+    history = PoseHistory()
+    _add(history, 1.0, 0.0)
+    _add(history, 2.0, 10.0, QUARTER_TURN)
+
+    positions, rotations, valid = history.at(1.5)
+    np.testing.assert_allclose(positions[0], [5.0, 0.0, 0.0], atol=1e-6)
+    # Halfway through a quarter turn is an eighth turn.
+    np.testing.assert_allclose(
+        rotations[0], [0.0, 0.0, np.sin(np.pi / 8), np.cos(np.pi / 8)], atol=1e-6
+    )
+    assert valid.all()
+
+
+def test_holds_the_first_and_last_sample_outside_the_history():
+    history = PoseHistory()
+    _add(history, 1.0, 1.0)
+    _add(history, 2.0, 2.0)
+    assert history.at(0.0)[0][0, 0] == 1.0
+    assert history.at(5.0)[0][0, 0] == 2.0
+
+
+def test_ignores_older_samples():
+    history = PoseHistory()
+    assert _add(history, 2.0, 2.0)
+    assert not _add(history, 1.0, 1.0)
+    assert len(history) == 1
+    assert history.latest_timestamp == 2.0
+
+
+def test_wraps_around_keeping_the_newest_samples():
+    history = PoseHistory(capacity=4)
+    for t in range(10):
+        _add(history, float(t), float(t))
+    assert len(history) == 4
+    # Samples 6..9 are kept, spanning the end and start of the ring buffer.
+    assert history.at(6.0)[0][0, 0] == 6.0
+    np.testing.assert_allclose(history.at(7.25)[0][0, 0], 7.25)
+    np.testing.assert_allclose(history.at(8.5)[0][0, 0], 8.5)
+    assert history.at(0.0)[0][0, 0] == 6.0
+
+
+def test_bones_missing_from_a_sample_are_invalid():
+    history = PoseHistory(bones=3)
+    positions = np.zeros((2, 3))
+    rotations = np.tile(IDENTITY, (2, 1))
+    history.add(1.0, positions, rotations, ids=np.array([0, 1]))
+    history.add(2.0, positions, rotations, ids=np.array([1, 7]))  # 7 is out of range
+    assert history.at(1.5)[2].tolist() == [False, True, False]
+    assert history.latest()[2].tolist() == [False, True, False]
+
+
+def test_empty_history_raises():
+    with pytest.raises(LookupError):
+        PoseHistory().at(0.0)
+
+
+def test_restarts_after_a_clock_reset():
+    history = PoseHistory(reset_after=1.0)
+    _add(history, 100.0, 1.0)
+    assert not _add(history, 99.5, 2.0)  # Out of order
+    assert _add(history, 0.5, 3.0)  # The client's clock restarted
+    assert len(history) == 1
+    assert history.latest_timestamp == 0.5
+    assert history.at(100.0)[0][0, 0] == 3.0
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from xr_360_camera_streamer.pose import (
+    BONE_DTYPE,
+    HEAD_DTYPE,
+    PoseKind,
+    convert_unity,
+    decode_pose,
+    encode_pose,
+)
+
+
+def _bones(count):
+    bones = np.zeros(count, dtype=BONE_DTYPE)
+    bones["id"] = np.arange(count) * 2
+    bones["position"] = np.arange(count * 3, dtype=np.float32).reshape(count, 3)
+    bones["rotation"] = (0.0, 0.0, 0.0, 1.0)
+    return bones
+
+
+def test_head_round_trip():
+    head = np.array([((1.0, 2.0, 3.0), (0.0, 0.7071, 0.0, 0.7071), 90.0)], dtype=HEAD_DTYPE)
+    data = encode_pose(PoseKind.HEAD, head, sequence=7, timestamp=12.5)
+    message = decode_pose(data)
+
+    assert message.kind is PoseKind.HEAD
+    assert (message.sequence, message.timestamp, message.skeleton_type) == (7, 12.5, -1)
+    np.testing.assert_array_equal(message.positions, head["position"])
+    np.testing.assert_array_equal(message.rotations, head["rotation"])
+    assert message.fov_x == 90.0
+
+
+def test_skeleton_round_trip():
+    bones = _bones(4)
+    message = decode_pose(encode_pose(PoseKind.SKELETON, bones, sequence=3, skeleton_type=1))
+
+    assert message.kind is PoseKind.SKELETON
+    assert len(message) == 4
+    assert message.skeleton_type == 1
+    np.testing.assert_array_equal(message.ids, bones["id"])
+    np.testing.assert_array_equal(message.positions, bones["position"])
+
+
+def test_unversioned_skeleton_messages_are_decoded():
+    bones = _bones(3)
+    message = decode_pose(np.int32(3).tobytes() + bones.tobytes())
+
+    assert message.version == 0
+    assert message.kind is PoseKind.SKELETON
+    np.testing.assert_array_equal(message.ids, bones["id"])
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"XP\x01",  # Truncated header
+        encode_pose(PoseKind.SKELETON, _bones(2))[:-1],  # Truncated records
+        b"XP\x02" + encode_pose(PoseKind.SKELETON, _bones(1))[3:],  # Unknown version
+        b"XP\x01\x09" + encode_pose(PoseKind.SKELETON, _bones(1))[4:],  # Unknown kind
+        encode_pose(PoseKind.HEAD, np.zeros(2, dtype=HEAD_DTYPE)),  # Two heads
+    ],
+)
+def test_malformed_messages_are_rejected(data):
+    with pytest.raises(ValueError):
+        decode_pose(data)
+
+
+def test_unity_forward_is_flu_forward():
+    positions, rotations = convert_unity(
+        np.array([[0.0, 0.0, 1.0]], dtype=np.float32),
+        np.array([[0.0, 0.0, 0.0, 1.0]], dtype=np.float32),
+    )
+    np.testing.assert_allclose(positions, [[1.0, 0.0, 0.0]])
+    np.testing.assert_allclose(rotations, [[0.0, 0.0, 0.0, 1.0]])
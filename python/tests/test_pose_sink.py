@@ -0,0 +1,69 @@
+import threading
+import time
+
+from xr_360_camera_streamer.pose import VisualizationSink
+
+
+def test_snapshots_are_written_in_the_sink_thread():
+    written = []
+    sink = VisualizationSink(
+        lambda s: written.append((s, threading.current_thread().name)), rate=None
+    )
+    assert all(sink.submit(i) for i in range(2))
+    sink.close()
+    assert written == [(0, "viz"), (1, "viz")]
+    assert not sink.due()
+    assert not sink.submit(2)  # Closed
+
+
+def test_snapshots_are_decimated_to_the_rate():
+    written = []
+    sink = VisualizationSink(written.append, rate=20)
+    assert sink.due() and sink.submit(0)
+    assert not sink.due()
+    assert not sink.submit(1)
+    time.sleep(0.06)
+    assert sink.due() and sink.submit(2)
+    sink.close()
+    assert written == [0, 2]
+    assert (sink.submitted, sink.decimated, sink.dropped) == (2, 1, 0)
+
+
+def test_snapshots_are_dropped_while_the_writer_is_behind():
+    writing, release = threading.Event(), threading.Event()
+    written = []
+
+    def write(snapshot):
+        writing.set()
+        release.wait(1.0)
+        written.append(snapshot)
+
+    sink = VisualizationSink(write, rate=None, max_queue=1)
+    start = time.monotonic()
+    assert sink.submit(0)
+    assert writing.wait(1.0)
+    assert sink.submit(1)  # Waits for the writer
+    assert not sink.submit(2)  # Queue full
+    assert time.monotonic() - start < 0.5  # `submit()` never blocked
+    release.set()
+    deadline = time.monotonic() + 1.0
+    while len(written) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sink.close()
+    assert written == [0, 1]
+    assert sink.dropped == 1
+
+
+def test_writer_errors_do_not_stop_the_sink():
+    written = []
+
+    def write(snapshot):
+        if snapshot == 0:
+            raise ValueError("bad snapshot")
+        written.append(snapshot)
+
+    sink = VisualizationSink(write, rate=None)
+    sink.submit(0)
+    sink.submit(1)
+    sink.close()
+    assert written == [1]
@@ -0,0 +1,25 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from xr_360_camera_streamer.profiling import MIN_INTERVAL, SamplingProfiler
+from xr_360_camera_streamer.streaming import WebRTCServer
+
+
+@pytest.mark.parametrize("interval", [0.0, -1.0, MIN_INTERVAL / 10, float("nan")])
+def test_intervals_below_the_minimum_are_rejected(interval):
+    with pytest.raises(ValueError):
+        SamplingProfiler(interval=interval)
+
+
+def test_profile_endpoint_rejects_short_intervals():
+    with TestClient(WebRTCServer(profiling=True).app) as client:
+        response = client.get("/profile", params={"duration": 0.1, "interval": 1e-6})
+        assert response.status_code == 400
+
+
+def test_profile_endpoint_samples():
+    with TestClient(WebRTCServer(profiling=True).app) as client:
+        params = {"duration": 0.1, "interval": MIN_INTERVAL, "format": "collapsed", "idle": True}
+        response = client.get("/profile", params=params)
+        assert response.status_code == 200
+        assert response.text.startswith("thread:")
@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+from fractions import Fraction
+
+import numpy as np
+from aiortc import MediaStreamTrack, RTCPeerConnection
+from aiortc.mediastreams import MediaStreamError
+from aiortc.rtp import (
+    RTCP_PSFB_APP,
+    RtcpPsfbPacket,
+    RtcpReceiverInfo,
+    RtcpRrPacket,
+    pack_remb_fci,
+)
+from av import VideoFrame
+
+from xr_360_camera_streamer.streaming import AdaptiveTrack, EncodedTrack, RateController
+from xr_360_camera_streamer.utils.codecs import get_negotiated_codec
+
+
+def _report(fraction_lost: int) -> RtcpRrPacket:
+    info = RtcpReceiverInfo(
+        ssrc=1, fraction_lost=fraction_lost, packets_lost=0, highest_sequence=0, jitter=0,
+        lsr=0, dlsr=0,
+    )  # fmt: skip
+    return RtcpRrPacket(ssrc=2, reports=[info])
+
+
+def _remb(bitrate: int) -> RtcpPsfbPacket:
+    return RtcpPsfbPacket(fmt=RTCP_PSFB_APP, ssrc=2, media_ssrc=0, fci=pack_remb_fci(bitrate, [1]))
+
+
+class _FrameTrack(MediaStreamTrack):
+    kind = "video"
+
+    def __init__(self, fps: int = 30):
+        super().__init__()
+        self.fps = fps
+        self.index = 0
+
+    async def recv(self) -> VideoFrame:
+        frame = VideoFrame.from_ndarray(np.zeros((720, 1280, 3), np.uint8), format="rgb24")
+        frame.pts, frame.time_base = self.index, Fraction(1, self.fps)
+        self.index += 1
+        return frame
+
+
+def test_backs_off_on_loss_and_grows_without():
+    controller = RateController(start_bitrate=1_000_000)
+    controller.handle_rtcp(_report(fraction_lost=64))  # 25% loss
+    assert controller.loss == 0.25
+    assert controller.bitrate == 1_000_000 * (1 - 0.5 * 0.25)
+
+    bitrate = controller.bitrate
+    controller.handle_rtcp(_report(fraction_lost=0))
+    assert controller.bitrate == bitrate * 1.08
+
+
+def test_stays_within_limits_and_remb():
+    controller = RateController(start_bitrate=1_000_000, min_bitrate=500_000, max_bitrate=1_050_000)
+    controller.handle_rtcp(_report(fraction_lost=0))
+    assert controller.bitrate == 1_050_000
+    for _ in range(10):
+        controller.handle_rtcp(_report(fraction_lost=255))
+    assert controller.bitrate == 500_000
+
+    controller = RateController(start_bitrate=1_000_000)
+    controller.handle_rtcp(_remb(600_000))
+    assert controller.remb == 600_000
+    assert controller.bitrate == 600_000
+    controller.handle_rtcp(_report(fraction_lost=0))
+    assert controller.bitrate == 600_000  # Growth stops at the receiver's estimate
+
+
+def test_lowers_resolution_then_frame_rate():
+    controller = RateController(start_bitrate=8_000_000, min_bitrate=100_000, min_scale=0.5)
+    controller.set_format(1280, 720, 30)
+    assert (controller.scale, controller.framerate) == (1.0, None)
+
+    controller.handle_rtcp(_remb(700_000))
+    assert (controller.scale, controller.framerate) == (0.75, None)
+    controller.handle_rtcp(_remb(150_000))  # Too little even for the smallest scale
+    assert controller.scale == 0.5
+    assert controller.framerate is not None and 10 <= controller.framerate < 30
+
+
+def test_adaptive_track_applies_scale_and_frame_rate():
+    async def main():
+        controller = RateController(start_bitrate=100_000, min_bitrate=100_000, min_scale=0.5)
+        track = AdaptiveTrack(_FrameTrack(fps=30), controller)
+        frames = [await track.recv() for _ in range(20)]
+        # The source rate is known after a couple of frames; then both requests apply.
+        assert controller.scale == 0.5
+        assert (frames[-1].width, frames[-1].height) == (640, 360)
+        intervals = np.diff([float(f.pts * f.time_base) for f in frames[-5:]])
+        assert min(intervals) > 1 / 30  # Frames were dropped
+        assert 1 / np.mean(intervals) <= controller.framerate + 1
+
+    asyncio.run(main())
+
+
+def test_bitrate_reaches_the_encoder_through_the_sent_track():
+    async def main():
+        pc = RTCPeerConnection()
+        track = EncodedTrack(_FrameTrack(), bitrate=2_000_000)
+        sender = pc.addTrack(track)
+        track.set_codec("video/VP8")
+
+        controller = RateController(start_bitrate=1_000_000)
+        controller.attach(sender)
+        assert track.bitrate == 1_000_000
+        assert track.encoder.bitrate == 1_000_000
+
+        controller.handle_rtcp(_remb(400_000))
+        assert track.encoder.bitrate == 400_000
+        await pc.close()
+
+    asyncio.run(main())
+
+
+class _PacedPattern(_FrameTrack):
+    """A moving pattern at `fps`, in real time, so the encoder has work to do."""
+
+    def __init__(self, fps: int = 15):
+        super().__init__(fps)
+        y, x = np.mgrid[0:240, 0:576]
+        texture = np.random.default_rng(0).integers(0, 64, (240, 576))
+        image = np.stack([96 + 80 * np.sin(x / 20) + texture] * 3, axis=-1)
+        self.image = np.clip(image, 0, 255).astype(np.uint8)
+        self.start = None
+
+    async def recv(self) -> VideoFrame:
+        loop = asyncio.get_running_loop()
+        if self.start is None:
+            self.start = loop.time()
+        await asyncio.sleep(max(0.0, self.start + self.index / self.fps - loop.time()))
+        shift = (self.index * 8) % 256
+        image = np.ascontiguousarray(self.image[:, shift : shift + 320])
+        frame = VideoFrame.from_ndarray(image, format="rgb24")
+        frame.pts, frame.time_base = self.index, Fraction(1, self.fps)
+        self.index += 1
+        return frame
+
+
+def _lossy(transport, link: dict):
+    """Drops outgoing RTP packets (not RTCP) of a DTLS transport with `link["loss"]`."""
+    send_rtp = transport._send_rtp
+    rng = np.random.default_rng(1)
+
+    async def lossy_send_rtp(data: bytes):
+        if not 192 <= data[1] <= 223 and rng.random() < link["loss"]:
+            return
+        await send_rtp(data)
+
+    transport._send_rtp = lossy_send_rtp
+
+
+def test_bitrate_drops_under_loss_and_recovers_between_connected_peers():
+    async def main():
+        sender_pc, receiver_pc = RTCPeerConnection(), RTCPeerConnection()
+        controller = RateController(start_bitrate=600_000, min_bitrate=100_000)
+        # Wired as `WebRTCServer(rate_control=True)` does.
+        track = EncodedTrack(AdaptiveTrack(_PacedPattern(), controller), bitrate=600_000)
+        sender = sender_pc.addTrack(track)
+
+        @receiver_pc.on("track")
+        def on_track(remote):
+            async def consume():
+                with contextlib.suppress(MediaStreamError):
+                    while True:
+                        await remote.recv()
+
+            asyncio.ensure_future(consume())
+
+        await sender_pc.setLocalDescription(await sender_pc.createOffer())
+        await receiver_pc.setRemoteDescription(sender_pc.localDescription)
+        await receiver_pc.setLocalDescription(await receiver_pc.createAnswer())
+        await sender_pc.setRemoteDescription(receiver_pc.localDescription)
+        track.set_codec(get_negotiated_codec(sender_pc, sender))
+        controller.attach(sender)
+        link = {"loss": 0.4}
+        _lossy(sender.transport, link)
+        bitrates = []
+        controller.add_listener(lambda c: bitrates.append(c.bitrate))
+        try:
+            await asyncio.sleep(5)
+            link["loss"] = 0.0
+            await asyncio.sleep(7)
+        finally:
+            await sender_pc.close()
+            await receiver_pc.close()
+        return bitrates, track
+
+    bitrates, track = asyncio.run(main())
+    # Receiver reports (about one per second) saw the loss and backed off ...
+    lowest = min(bitrates)
+    assert lowest < 600_000 * 0.7
+    # ... and the bitrate grew again once packets went through, at the encoder too.
+    after = bitrates[bitrates.index(lowest) :]
+    assert after == sorted(after)
+    assert bitrates[-1] > lowest * 1.2
+    assert track.encoder.bitrate == int(bitrates[-1])
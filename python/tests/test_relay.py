@@ -0,0 +1,45 @@
+import asyncio
+
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+from xr_360_camera_streamer.streaming.peer import close_resource
+from xr_360_camera_streamer.streaming.relay import BroadcastRelay
+
+
+class _BrokenSource(MediaStreamTrack):
+    kind = "video"
+
+    async def recv(self):
+        raise RuntimeError("decoder crashed")
+
+
+def test_pending_track_is_detached_when_its_peer_is_cleaned_up():
+    async def main():
+        relay = BroadcastRelay(_BrokenSource())
+        track = relay.subscribe()
+        # E.g. the offer failed before the codec was negotiated.
+        await close_resource(track)
+        assert not relay._pending
+        assert relay._task is None
+
+    asyncio.run(main())
+
+
+def test_source_error_ends_every_subscriber():
+    async def main():
+        relay = BroadcastRelay(_BrokenSource())
+        tracks = [relay.subscribe() for _ in range(2)]
+        for track in tracks:
+            track.set_codec("video/VP8")
+        for track in tracks:
+            try:
+                await asyncio.wait_for(track.recv(), timeout=1.0)
+            except MediaStreamError:
+                pass
+            else:
+                raise AssertionError("expected the stream to end")
+            assert track.readyState == "ended"
+        assert relay.stats() == {}
+
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import asyncio
+
+import av
+import numpy as np
+
+from xr_360_camera_streamer.streaming import RenditionTrack, build_renditions
+
+
+def _write_video(path, frames=48):
+    with av.open(str(path), "w") as container:
+        stream = container.add_stream("libx264", rate=24)
+        stream.width, stream.height = 64, 48
+        stream.pix_fmt = "yuv420p"
+        for i in range(frames):
+            image = np.full((48, 64, 3), i * 5, dtype=np.uint8)
+            container.mux(stream.encode(av.VideoFrame.from_ndarray(image, format="rgb24")))
+        container.mux(stream.encode(None))
+
+
+def test_resumed_track_continues_where_it_was(tmp_path):
+    video = tmp_path / "video.mp4"
+    _write_video(video)
+    ladder = build_renditions(str(video), heights=(48,), codecs=("vp8",), keyframe_interval=0.5)
+
+    async def main():
+        track = RenditionTrack(ladder)
+        track.set_codec("video/VP8")
+        assert track.passthrough
+        reader = track._reader
+        packets = [await track.recv() for _ in range(4)]
+
+        track.set_codec("video/VP8")  # A resumed session on a new connection
+        assert track._reader is reader
+        packet = await track.recv()
+        assert packet.is_keyframe
+        assert float(packet.pts * packet.time_base) == 0.5  # Not back to the start
+        assert packet.pts > packets[-1].pts
+        assert len(track.recovery.recovery_times) == 1
+        track.stop()
+
+    asyncio.run(main())
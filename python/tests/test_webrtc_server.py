@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+from aiortc import RTCPeerConnection
+from fastapi.testclient import TestClient
+
+from xr_360_camera_streamer.streaming import AdmissionController, WebRTCServer
+
+
+async def _offer(video: bool = False) -> dict:
+    pc = RTCPeerConnection()
+    pc.createDataChannel("control")
+    if video:
+        pc.addTransceiver("video", direction="recvonly")
+    await pc.setLocalDescription(await pc.createOffer())
+    offer = {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+    await pc.close()
+    return offer
+
+
+def _answer(server: WebRTCServer) -> dict:
+    offer = asyncio.run(_offer())
+    with TestClient(server.app) as client:
+        response = client.post("/offer", json=offer)
+        assert response.status_code == 200
+        return response.json()
+
+
+def test_answer_has_the_peer_id_only_with_trickle_ice():
+    assert "id" not in _answer(WebRTCServer())
+    answer = _answer(WebRTCServer(trickle_ice=True))
+    assert answer["id"].startswith("PeerConnection(")
+
+
+def test_invalid_reoffer_keeps_the_session():
+    offer = asyncio.run(_offer())
+    with TestClient(WebRTCServer(session_grace=10.0).app) as client:
+        session = client.post("/offer", json=offer).json()["session"]
+
+        bad = {"sdp": "v=0\r\nm=video x UDP\r\n", "type": "offer", "session": session}
+        assert client.post("/offer", json=bad).status_code == 400
+
+        answer = client.post("/offer", json={**offer, "session": session}).json()
+        assert answer["session"] == session
+
+
+def test_failed_setup_releases_the_admission_reservation():
+    def broken_state():
+        raise RuntimeError("no state")
+
+    admission = AdmissionController(max_peers=1)
+    server = WebRTCServer(
+        video_track_factory=lambda: None, state_factory=broken_state, admission=admission
+    )
+    offer = asyncio.run(_offer(video=True))
+    with TestClient(server.app, raise_server_exceptions=False) as client:
+        assert client.post("/offer", json=offer).status_code == 500
+        assert admission.reservations == []
+
+
+def test_serial_executors_are_shut_down_with_the_server():
+    def factory():
+        return None
+
+    server = WebRTCServer(video_track_factory=factory, execution={"video_track_factory": "serial"})
+    assert len(server._serial_executors) == 1
+    with TestClient(server.app):
+        pass
+    assert all(executor._shutdown for executor in server._serial_executors)
+
+
+def test_factory_runs_on_the_event_loop_unless_configured():
+    def factory():
+        return threading.current_thread()
+
+    async def call(server: WebRTCServer):
+        return await server._video_track_factory(state=None, spec=None)
+
+    assert asyncio.run(call(WebRTCServer(video_track_factory=factory))) is threading.main_thread()
+    server = WebRTCServer(video_track_factory=factory, execution={"video_track_factory": "thread"})
+    assert asyncio.run(call(server)) is not threading.main_thread()